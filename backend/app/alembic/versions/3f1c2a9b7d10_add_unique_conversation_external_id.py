@@ -0,0 +1,60 @@
+"""add unique (wechat_bot_id, external_id) to conversations
+
+Revision ID: 3f1c2a9b7d10
+Revises: 06120868a754
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = '06120868a754'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 合并并发上报产生的重复会话：保留ID最小的会话，迁移消息和参与者后删除其余会话
+    op.execute("""
+        CREATE TEMP TABLE conversation_duplicates ON COMMIT DROP AS
+        SELECT id, MIN(id) OVER (PARTITION BY wechat_bot_id, external_id) AS keep_id
+        FROM conversations
+    """)
+    op.execute("DELETE FROM conversation_duplicates WHERE id = keep_id")
+    op.execute("""
+        UPDATE messages m SET conversation_id = d.keep_id
+        FROM conversation_duplicates d WHERE m.conversation_id = d.id
+    """)
+    op.execute("""
+        INSERT INTO conversation_participants (conversation_id, contact_id)
+        SELECT d.keep_id, cp.contact_id
+        FROM conversation_participants cp JOIN conversation_duplicates d ON cp.conversation_id = d.id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("DELETE FROM conversations c USING conversation_duplicates d WHERE c.id = d.id")
+
+    # 建表脚本中已有同样的唯一约束时跳过
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conrelid = 'conversations'::regclass AND contype = 'u'
+                  AND conkey = ARRAY[
+                      (SELECT attnum FROM pg_attribute WHERE attrelid = 'conversations'::regclass AND attname = 'wechat_bot_id'),
+                      (SELECT attnum FROM pg_attribute WHERE attrelid = 'conversations'::regclass AND attname = 'external_id')
+                  ]::int2[]
+            ) THEN
+                ALTER TABLE conversations
+                    ADD CONSTRAINT uq_conversations_bot_external UNIQUE (wechat_bot_id, external_id);
+            END IF;
+        END $$;
+    """)
+
+
+def downgrade():
+    op.execute("ALTER TABLE conversations DROP CONSTRAINT IF EXISTS uq_conversations_bot_external")
@@ -0,0 +1,26 @@
+"""add participants_hash to conversations
+
+Revision ID: 5a8e4c2d9f31
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5a8e4c2d9f31'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新库由 doc 中的建表脚本初始化时已有该列
+    op.execute("ALTER TABLE conversations ADD COLUMN IF NOT EXISTS participants_hash VARCHAR(64)")
+
+
+def downgrade():
+    op.execute("ALTER TABLE conversations DROP COLUMN IF EXISTS participants_hash")
@@ -0,0 +1,57 @@
+"""make message ingestion idempotent
+
+Revision ID: 7b2d9e4f1a63
+Revises: 5a8e4c2d9f31
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2d9e4f1a63'
+down_revision = '5a8e4c2d9f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新库由 doc 中的建表脚本初始化时已有该列、约束和索引，以下步骤均可重复执行
+    op.execute("ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+
+    # 删除历史上重复上报的消息，同一会话同一原始消息ID只保留最早写入的一条
+    op.execute("""
+        CREATE TEMP TABLE message_duplicates ON COMMIT DROP AS
+        SELECT id FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY conversation_id, external_message_id) AS keep_id
+            FROM messages
+            WHERE external_message_id IS NOT NULL
+        ) ranked
+        WHERE id <> keep_id
+    """)
+    op.execute("DELETE FROM messages m USING message_duplicates d WHERE m.id = d.id")
+
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint WHERE conname = 'uq_messages_conversation_external'
+            ) THEN
+                ALTER TABLE messages
+                    ADD CONSTRAINT uq_messages_conversation_external UNIQUE (conversation_id, external_message_id);
+            END IF;
+        END $$;
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_content_hash
+        ON messages (conversation_id, content_hash)
+        WHERE external_message_id IS NULL
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_messages_content_hash")
+    op.execute("ALTER TABLE messages DROP CONSTRAINT IF EXISTS uq_messages_conversation_external")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS content_hash")
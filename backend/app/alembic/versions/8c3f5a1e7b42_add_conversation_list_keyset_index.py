@@ -0,0 +1,29 @@
+"""add keyset index for conversation list
+
+Revision ID: 8c3f5a1e7b42
+Revises: 7b2d9e4f1a63
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3f5a1e7b42'
+down_revision = '7b2d9e4f1a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 会话列表按 (last_message_at DESC NULLS LAST, id DESC) 排序和游标分页
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_bot_last_message
+        ON conversations (wechat_bot_id, last_message_at DESC NULLS LAST, id DESC)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_conversations_bot_last_message")
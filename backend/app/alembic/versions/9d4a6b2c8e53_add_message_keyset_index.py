@@ -0,0 +1,29 @@
+"""add keyset index for message list
+
+Revision ID: 9d4a6b2c8e53
+Revises: 8c3f5a1e7b42
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4a6b2c8e53'
+down_revision = '8c3f5a1e7b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 消息列表按 (created_at, id) 排序和游标分页
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_id
+        ON messages (conversation_id, created_at, id)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_messages_conversation_created_id")
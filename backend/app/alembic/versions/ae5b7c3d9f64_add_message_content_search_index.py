@@ -0,0 +1,32 @@
+"""add trigram index for message content search
+
+Revision ID: ae5b7c3d9f64
+Revises: 9d4a6b2c8e53
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'ae5b7c3d9f64'
+down_revision = '9d4a6b2c8e53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 消息内容子串搜索（ILIKE '%词%'）使用 pg_trgm 三元组 GIN 索引；
+    # 数据库的 LC_CTYPE 需为 UTF-8 区域（如 en_US.UTF-8），中文字符才会被计入三元组
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_content_trgm
+        ON messages USING gin (content gin_trgm_ops)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_messages_content_trgm")
+    op.execute("DROP EXTENSION IF EXISTS pg_trgm")
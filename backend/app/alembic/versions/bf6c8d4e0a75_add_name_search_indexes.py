@@ -0,0 +1,41 @@
+"""add trigram indexes and pinyin keys for conversation and contact name search
+
+Revision ID: bf6c8d4e0a75
+Revises: ae5b7c3d9f64
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'bf6c8d4e0a75'
+down_revision = 'ae5b7c3d9f64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 拼音检索键（全拼和首字母），由应用写入；已有数据用 scripts.backfill_pinyin 回填
+    op.execute("ALTER TABLE conversations ADD COLUMN IF NOT EXISTS topic_pinyin TEXT")
+    op.execute("ALTER TABLE contacts ADD COLUMN IF NOT EXISTS name_pinyin TEXT")
+
+    # 会话标题、联系人昵称/备注名及其拼音的子串搜索
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_topic_trgm
+        ON conversations USING gin (topic gin_trgm_ops, topic_pinyin gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_contacts_name_trgm
+        ON contacts USING gin (wx_name gin_trgm_ops, remark_name gin_trgm_ops, name_pinyin gin_trgm_ops)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_contacts_name_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_conversations_topic_trgm")
+    op.execute("ALTER TABLE contacts DROP COLUMN IF EXISTS name_pinyin")
+    op.execute("ALTER TABLE conversations DROP COLUMN IF EXISTS topic_pinyin")
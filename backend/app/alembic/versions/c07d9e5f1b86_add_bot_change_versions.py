@@ -0,0 +1,32 @@
+"""add bot change versions for etags
+
+Revision ID: c07d9e5f1b86
+Revises: bf6c8d4e0a75
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c07d9e5f1b86'
+down_revision = 'bf6c8d4e0a75'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 每个机器人的数据版本，没有记录的机器人版本为 0，首次递增时插入
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS bot_change_versions (
+            bot_id BIGINT PRIMARY KEY REFERENCES wechat_bots(id) ON DELETE CASCADE,
+            conversations_version BIGINT NOT NULL DEFAULT 0,
+            config_version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS bot_change_versions")
@@ -71,6 +71,17 @@ class Settings(BaseSettings):
         )
         return f"{url}?options=-csearch_path={self.POSTGRES_SCHEMA}"
 
+    # 消息上报写入方式：sync 在请求内写库；queue 入队后返回 202，由后台线程批量写库
+    MESSAGE_INGEST_MODE: Literal["sync", "queue"] = "sync"
+    MESSAGE_INGEST_QUEUE_SIZE: int = 10000
+    MESSAGE_INGEST_BATCH_SIZE: int = 500
+    MESSAGE_INGEST_FLUSH_INTERVAL: float = 0.2
+    # 消息上报身份缓存（机器人、联系人、会话）每类的最大条目数
+    IDENTITY_CACHE_SIZE: int = 10000
+    # 实时推送的跨进程分发：local 仅本进程；postgres 通过 LISTEN/NOTIFY 分发到所有 worker
+    LIVE_FANOUT: Literal["local", "postgres"] = "local"
+    LIVE_FANOUT_CHANNEL: str = "wxbot_live_events"
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
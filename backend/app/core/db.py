@@ -1,3 +1,4 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
@@ -5,6 +6,8 @@ from app.core.config import settings
 from app.models import User, UserCreate, UserRole
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# 异步引擎（psycopg 异步驱动），供 async 路由使用；脚本和后台线程仍使用同步引擎
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
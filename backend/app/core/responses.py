@@ -0,0 +1,70 @@
+"""
+接口响应的快速 JSON 序列化
+
+接口统一返回 {"error", "body", "message"} 信封。FastAPI 默认对返回值先做一遍
+按字段的校验和转换，再用标准库 json 编码；消息列表这类大响应在这两步上的
+开销明显。这里提供：
+
+- FastJSONResponse：用 orjson 编码，datetime、UUID、枚举等由 orjson 原生处理，
+  输出格式与原先一致（datetime 为 isoformat）
+- dump_models：整列模型通过缓存的 TypeAdapter 一次转换，代替逐个 model_dump()
+- envelope：直接构造信封响应，路由返回它时跳过 FastAPI 的返回值校验与转换
+
+序列化耗时可用 `python -m scripts.bench_response_serialization` 对比。
+"""
+from functools import cache
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Type
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(obj: Any) -> Any:
+    # 信封中零散的单个模型（列表应先经 dump_models 转换）
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """编码为 JSON 字节串，非字符串的字典键（如联系人ID）转为字符串"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson 编码的 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@cache
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def dump_models(items: Sequence[BaseModel]) -> List[Dict[str, Any]]:
+    """
+    把同一类型的模型列表一次转换为字典列表
+
+    datetime 等保留原类型，交给 orjson 编码
+    """
+    if not items:
+        return []
+    return _list_adapter(type(items[0])).dump_python(list(items))
+
+
+def dump_model_map(items: Mapping[Any, BaseModel]) -> Dict[Any, Dict[str, Any]]:
+    """按键映射的模型（如 {联系人ID: ContactPublic}）一次转换"""
+    return dict(zip(items.keys(), dump_models(list(items.values())), strict=True))
+
+
+def envelope(
+    body: Any = None,
+    message: str = "成功",
+    error: int = 0,
+    headers: Optional[Mapping[str, str]] = None
+) -> FastJSONResponse:
+    """构造 {"error", "body", "message"} 信封响应"""
+    return FastJSONResponse({"error": error, "body": body, "message": message}, headers=headers)
@@ -1,10 +1,16 @@
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import async_engine
+from modules.conversations.fanout import start_fanout, stop_fanout
+from modules.conversations.service import message_ingest_queue
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,8 +20,22 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # 多 worker 部署时监听其他 worker 写入的消息事件
+    start_fanout()
+    yield
+    await run_in_threadpool(stop_fanout)
+    # 退出前写完异步上报队列中剩余的消息
+    await run_in_threadpool(message_ingest_queue.stop)
+    # 异步连接池中的连接绑定在当前事件循环上，退出时关闭
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -28,6 +48,8 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # 前端跨域读取 ETag 以发送条件请求
+        expose_headers=["ETag"],
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -0,0 +1,181 @@
+"""
+会话与消息列表的异步服务层
+
+会话列表和消息列表是前端轮询最频繁的接口，这里使用异步引擎查询，
+不占用事件循环也不占用线程池。查询语句和响应构建与同步的
+ConversationService 共用，同步路径继续供脚本和后台线程使用。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.db import async_engine
+from modules.conversations.models import (
+    Contact,
+    ContactPublic,
+    ConversationPublic,
+    Message,
+)
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts import change_versions
+
+
+class AsyncConversationService:
+    """会话与消息列表的异步查询，参数和返回值与 ConversationService 的同名方法一致"""
+    
+    @staticmethod
+    async def get_conversations_version(wechat_account_id: int) -> int:
+        """会话数据版本（用于会话列表的 ETag）"""
+        async with AsyncSession(async_engine) as session:
+            stmt = change_versions.version_statement(wechat_account_id, change_versions.CONVERSATIONS)
+            return (await session.exec(stmt)).first() or 0
+    
+    @staticmethod
+    async def get_conversations(
+        wechat_account_id: int,
+        query: Optional[str] = None,
+        current_user_id: UUID = None
+    ) -> List[ConversationPublic]:
+        """获取会话列表"""
+        async with AsyncSession(async_engine) as session:
+            stmt = ConversationService._conversation_list_statement(wechat_account_id, query)
+            rows = (await session.exec(stmt)).all()
+            return [ConversationService._to_conversation_public(conv, avatar) for conv, avatar in rows]
+    
+    @staticmethod
+    async def get_conversations_page(
+        wechat_account_id: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        query: Optional[str] = None,
+        current_user_id: UUID = None
+    ) -> Dict[str, Any]:
+        """按游标分页获取会话列表"""
+        async with AsyncSession(async_engine) as session:
+            stmt = ConversationService._conversation_page_statement(wechat_account_id, limit, cursor, query)
+            rows = (await session.exec(stmt)).all()
+            return ConversationService._to_conversation_page(rows, limit)
+    
+    @staticmethod
+    async def _hydrate_senders(session: AsyncSession, senders: List[Contact]) -> Dict[int, ContactPublic]:
+        contacts = {contact.id: contact for contact in senders}
+        if not contacts:
+            return {}
+        tag_rows = (await session.exec(ConversationService._sender_tags_statement(list(contacts)))).all()
+        return ConversationService._build_senders(contacts, tag_rows)
+    
+    @staticmethod
+    async def _to_message_page(
+        session: AsyncSession,
+        messages: List[Message],
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        senders = await AsyncConversationService._hydrate_senders(session, [msg.sender for msg in messages])
+        return ConversationService._build_message_page(messages, senders, compact)
+    
+    @staticmethod
+    async def get_messages(
+        conversation_id: int,
+        page: int = 1,
+        page_size: int = 20,
+        current_user_id: UUID = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """获取会话消息列表（按页码分页）"""
+        async with AsyncSession(async_engine) as session:
+            offset = (page - 1) * page_size
+            total = (await session.exec(ConversationService._message_count_statement(conversation_id))).one()
+            messages = (await session.exec(
+                ConversationService._message_offset_statement(conversation_id, offset, page_size)
+            )).all()
+            
+            return {
+                # 反转顺序，让最新的消息在底部
+                **await AsyncConversationService._to_message_page(session, list(reversed(messages)), compact),
+                "total": total,
+                "has_more": offset + len(messages) < total
+            }
+    
+    @staticmethod
+    async def get_messages_keyset(
+        conversation_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 20,
+        current_user_id: UUID = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """按消息ID游标获取会话消息，语义见 ConversationService.get_messages_keyset"""
+        if before_id is not None and after_id is not None:
+            raise ValueError("before_id 与 after_id 不能同时指定")
+        
+        async with AsyncSession(async_engine) as session:
+            anchor = None
+            anchor_id = before_id if before_id is not None else after_id
+            if anchor_id is not None:
+                anchor = (await session.exec(
+                    ConversationService._message_anchor_statement(conversation_id, anchor_id)
+                )).first()
+                if not anchor:
+                    raise ValueError("消息不存在")
+            
+            after = after_id is not None
+            messages, has_more = ConversationService._trim_keyset_page(
+                list((await session.exec(
+                    ConversationService._message_keyset_statement(conversation_id, anchor, after, limit)
+                )).all()),
+                limit,
+                after
+            )
+            
+            return {
+                **await AsyncConversationService._to_message_page(session, messages, compact),
+                "has_more": has_more
+            }
+    
+    @staticmethod
+    async def search_conversations(wechat_account_id: int, query: str, limit: int = 10) -> Dict[str, Any]:
+        """边输入边搜索会话与联系人，语义见 ConversationService.search_conversations"""
+        query = query.strip()
+        if not query:
+            raise ValueError("搜索关键词不能为空")
+        
+        async with AsyncSession(async_engine) as session:
+            conversation_rows = (await session.exec(
+                ConversationService._conversation_list_statement(wechat_account_id, query).limit(limit)
+            )).all()
+            contact_rows = (await session.exec(
+                ConversationService._contact_search_statement(wechat_account_id, query, limit)
+            )).all()
+            return {
+                "conversations": [
+                    ConversationService._to_conversation_public(conv, avatar) for conv, avatar in conversation_rows
+                ],
+                "contacts": [
+                    ConversationService._to_contact_search_hit(contact, conversation_id)
+                    for contact, conversation_id in contact_rows
+                ]
+            }
+    
+    @staticmethod
+    async def search_messages(
+        bot_ids: List[int],
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[int] = None,
+        sender_id: Optional[int] = None,
+        start_at: Optional[datetime] = None,
+        end_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """搜索消息，语义见 ConversationService.search_messages"""
+        terms = ConversationService._message_search_terms(query, bot_ids, conversation_id, sender_id)
+        
+        async with AsyncSession(async_engine) as session:
+            stmt = ConversationService._message_search_statement(
+                bot_ids, terms, limit, cursor, conversation_id, sender_id, start_at, end_at
+            )
+            rows = (await session.exec(stmt)).all()
+            return ConversationService._to_search_page(rows, terms, limit)
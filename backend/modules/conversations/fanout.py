@@ -0,0 +1,156 @@
+"""
+实时事件的跨进程分发
+
+多个 uvicorn worker 时，消息可能由任意 worker 写入，而订阅者分散在各个
+worker 上。LIVE_FANOUT=postgres 时，写入事务在提交前把待发布的事件合并为
+一条 pg_notify 语句发出（Postgres 只在事务提交后投递通知），每个 worker
+的监听线程 LISTEN 同一频道并转发给本进程的订阅者。
+
+LIVE_FANOUT=local（默认，也用于测试）时事件只在本进程内分发，
+由 live 模块在事务提交后直接发布。
+"""
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import psycopg
+from psycopg import sql
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from sqlalchemy.types import Text
+
+from app.core.config import settings
+from modules.conversations.live import RESYNC_EVENT, LiveHub, live_hub, take_pending
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY 的负载上限为 8000 字节，超出时截断消息内容
+MAX_PAYLOAD_BYTES = 7500
+
+NOTIFY_STATEMENT = text(
+    "SELECT pg_notify(:channel, payload) "
+    "FROM unnest(:payloads) WITH ORDINALITY AS t(payload, n) ORDER BY n"
+).bindparams(bindparam("payloads", type_=ARRAY(Text)))
+
+
+def encode_payload(bot_id: int, live_event: Dict[str, Any]) -> Optional[str]:
+    """
+    编码为通知负载
+
+    超出长度时截断消息内容并标记 truncated；仍然放不下时返回 None（丢弃该事件，
+    避免 pg_notify 报错导致消息写入事务失败）
+    """
+    payload = json.dumps({"bot_id": bot_id, "event": live_event}, ensure_ascii=False)
+    content = live_event.get("data", {}).get("content") or ""
+    while len(payload.encode("utf-8")) > MAX_PAYLOAD_BYTES and content:
+        overflow = len(payload.encode("utf-8")) - MAX_PAYLOAD_BYTES
+        raw = content.encode("utf-8")
+        content = raw[:max(0, len(raw) - overflow - 16)].decode("utf-8", "ignore")
+        data = {**live_event["data"], "content": content, "truncated": True}
+        payload = json.dumps({"bot_id": bot_id, "event": {**live_event, "data": data}}, ensure_ascii=False)
+    if len(payload.encode("utf-8")) > MAX_PAYLOAD_BYTES:
+        logger.warning("实时推送事件过大，已丢弃: bot_id=%s type=%s", bot_id, live_event.get("type"))
+        return None
+    return payload
+
+
+def decode_payload(payload: str) -> Tuple[int, Dict[str, Any]]:
+    message = json.loads(payload)
+    return message["bot_id"], message["event"]
+
+
+def notify_pending(session: Session, channel: str) -> int:
+    """把会话上待发布的事件合并为一条 pg_notify 语句，返回事件数"""
+    payloads = [
+        payload for payload in (encode_payload(bot_id, e) for bot_id, e in take_pending(session))
+        if payload is not None
+    ]
+    if not payloads:
+        return 0
+    session.execute(NOTIFY_STATEMENT, {"channel": channel, "payloads": payloads})
+    return len(payloads)
+
+
+class PostgresListener:
+    """后台线程：LISTEN 通知频道并转发给本进程的订阅者，断线自动重连"""
+
+    def __init__(self, conninfo: str, channel: str, hub: LiveHub, poll_interval: float = 1.0):
+        self.conninfo = conninfo
+        self.channel = channel
+        self.hub = hub
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.received = 0
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-fanout-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _listen_once(self) -> None:
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+            logger.info("实时推送监听已连接，频道 %s", self.channel)
+            while not self._stop.is_set():
+                for notify in conn.notifies(timeout=self.poll_interval):
+                    try:
+                        bot_id, live_event = decode_payload(notify.payload)
+                    except (ValueError, KeyError):
+                        logger.warning("忽略无法解析的实时推送通知: %.200s", notify.payload)
+                        continue
+                    self.received += 1
+                    self.hub.publish(bot_id, live_event)
+                    if self._stop.is_set():
+                        break
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._listen_once()
+                backoff = 1.0
+            except Exception:
+                logger.exception("实时推送监听断开，%.0f 秒后重连", backoff)
+                # 断线期间的通知会丢失，通知订阅者重新拉取
+                self.hub.publish_all(RESYNC_EVENT)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+def listener_conninfo() -> str:
+    """SQLAlchemy 连接串转换为 psycopg 可用的连接串"""
+    return str(settings.SQLALCHEMY_DATABASE_URI).replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+fanout_listener: Optional[PostgresListener] = None
+
+
+def start_fanout() -> None:
+    """启动本进程的通知监听（仅 LIVE_FANOUT=postgres）"""
+    global fanout_listener
+    if settings.LIVE_FANOUT != "postgres":
+        return
+    if fanout_listener is None:
+        fanout_listener = PostgresListener(listener_conninfo(), settings.LIVE_FANOUT_CHANNEL, live_hub)
+    fanout_listener.start()
+
+
+def stop_fanout() -> None:
+    if fanout_listener is not None:
+        fanout_listener.stop()
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_before_commit(session: Session) -> None:
+    if settings.LIVE_FANOUT == "postgres":
+        notify_pending(session, settings.LIVE_FANOUT_CHANNEL)
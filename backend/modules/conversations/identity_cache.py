@@ -0,0 +1,157 @@
+"""
+消息上报使用的进程内身份缓存
+
+缓存 wxid -> 机器人ID、wxid -> 联系人、(机器人ID, 会话外部ID) -> 会话，
+热点上报无需每条消息都查询这三张表。
+
+写入缓存的条目先记在数据库会话上，事务提交后才生效、回滚则丢弃，
+避免缓存指向未提交成功的行。机器人、联系人、会话被修改或删除时由
+对应的服务调用 invalidate_* 使缓存失效。
+
+invalidate_* 只清除当前进程的缓存。多 worker 部署时其他进程可能仍缓存着
+已删除的ID，写入时触发外键约束错误；上报写入遇到 IntegrityError 时会清空
+本进程缓存并重新解析一次（见 ConversationService.process_message_reports）。
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+_PENDING_KEY = "identity_cache_pending"
+
+
+class LRUCache:
+    """线程安全的有界 LRU 缓存，带命中率统计"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """批量读取，只返回命中的键"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                try:
+                    found[key] = self._data[key]
+                except KeyError:
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+        return found
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate) -> int:
+        """删除 predicate(键, 值) 为真的条目，返回删除的数量"""
+        with self._lock:
+            keys = [key for key, value in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class IdentityCaches:
+    """机器人、联系人、会话三类身份缓存"""
+
+    def __init__(self, max_size: int):
+        # wxid -> 机器人ID
+        self.bots = LRUCache(max_size)
+        # wxid -> (联系人ID, 昵称)
+        self.contacts = LRUCache(max_size)
+        # (机器人ID, 会话外部ID) -> (会话ID, 成员名单指纹)
+        self.conversations = LRUCache(max_size)
+
+    def remember(self, session: Session, cache_name: str, key: Hashable, value: Any) -> None:
+        """记录待写入缓存的条目，事务提交后生效"""
+        session.info.setdefault(_PENDING_KEY, []).append((cache_name, key, value))
+
+    def invalidate_bot(self, wxid: Optional[str] = None, bot_id: Optional[int] = None) -> None:
+        """机器人被修改或删除：清除机器人及其会话的缓存"""
+        if wxid is not None:
+            self.bots.pop(wxid)
+        if bot_id is not None:
+            self.bots.pop_where(lambda _, cached_id: cached_id == bot_id)
+            self.conversations.pop_where(lambda key, _: key[0] == bot_id)
+
+    def invalidate_contact(self, wxid: str) -> None:
+        self.contacts.pop(wxid)
+
+    def invalidate_conversation(self, bot_id: int, external_id: str) -> None:
+        self.conversations.pop((bot_id, external_id))
+
+    def invalidate_all(self) -> None:
+        """清除全部缓存条目（保留命中率统计）"""
+        for cache in (self.bots, self.contacts, self.conversations):
+            cache.pop_where(lambda *_: True)
+
+    def clear(self) -> None:
+        self.bots.clear()
+        self.contacts.clear()
+        self.conversations.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bots": self.bots.stats(),
+            "contacts": self.contacts.stats(),
+            "conversations": self.conversations.stats(),
+        }
+
+
+identity_caches = IdentityCaches(settings.IDENTITY_CACHE_SIZE)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    for cache_name, key, value in session.info.pop(_PENDING_KEY, []):
+        getattr(identity_caches, cache_name).put(key, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,451 @@
+"""
+消息上报的批量写入
+
+按集合一次性解析机器人、联系人、会话，使用多行 INSERT ... ON CONFLICT
+写入联系人、会话与会话参与者，消息使用多行插入，整批只提交一次。
+各表的写入都按主键/唯一键排序，避免并发上报之间相互死锁。
+
+群聊上报携带的成员名单按指纹（participants_hash）比对，名单未变化时
+不再处理成员，稳定状态下每条群消息的查询次数与群人数无关。
+
+机器人、联系人、会话先查进程内身份缓存（identity_cache），只有未命中
+的部分才访问数据库。
+
+事务提交后，本次写入的新消息与会话摘要更新会推送给实时订阅者（live）。
+有新消息的机器人在同一事务中递增会话数据版本（会话列表的 ETag）。
+会话的最后消息只向前推进，乱序到达的较旧消息不会改动它。
+
+消息写入是幂等的：带原始消息ID的按 (会话ID, 原始消息ID) 唯一约束
+ON CONFLICT DO NOTHING；没有原始消息ID的按内容指纹在时间窗口内去重。
+
+字段不合法的上报（未知的消息类型、缺少时间戳或发送者ID等）按下标逐条
+拒绝，不影响同批的其他上报。多行写入按绑定参数上限分段执行，大群名单
+也不会超出单条语句的参数个数限制。
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+
+from modules.conversations import (
+    # 未直接使用：导入时注册提交前发送跨进程通知的监听（LIVE_FANOUT=postgres）
+    fanout,  # noqa: F401
+    search,
+)
+from modules.conversations.identity_cache import identity_caches
+from modules.conversations.live import live_hub
+from modules.conversations.models import (
+    Contact,
+    Conversation,
+    ConversationType,
+    Message,
+    MessageReportRequest,
+    MessageType,
+    conversation_participants_table,
+)
+from modules.wechat_accounts import change_versions
+from modules.wechat_accounts.models import WechatBot
+
+# 无原始消息ID时，同一会话内容指纹相同且时间相差不超过该窗口的消息视为重复上报
+CONTENT_HASH_WINDOW = timedelta(seconds=120)
+# 单条语句的绑定参数上限（PostgreSQL 协议限制为 65535）
+MAX_BIND_PARAMS = 65535
+
+_CONVERSATION_TYPES = {conversation_type.value for conversation_type in ConversationType}
+_MESSAGE_TYPES = {message_type.value for message_type in MessageType}
+
+
+def chunked(rows: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
+    """按每行的列数切分多行写入，每段的绑定参数不超过 MAX_BIND_PARAMS"""
+    if not rows:
+        return
+    size = max(1, MAX_BIND_PARAMS // len(rows[0]))
+    for offset in range(0, len(rows), size):
+        yield rows[offset:offset + size]
+
+
+def validate_report(report: MessageReportRequest) -> Optional[str]:
+    """
+    检查上报中写入时会用到的字段
+
+    Returns:
+        不合法时返回原因，合法时返回 None
+    """
+    if report.conversation_type not in _CONVERSATION_TYPES:
+        return f"未知的会话类型 {report.conversation_type}"
+    sender_id = report.sender.get("id")
+    if not isinstance(sender_id, str) or not sender_id:
+        return "缺少发送者ID"
+    message_type = report.message.get("type", "text")
+    if message_type not in _MESSAGE_TYPES:
+        return f"未知的消息类型 {message_type}"
+    content = report.message.get("content")
+    if content is not None and not isinstance(content, str):
+        return "消息内容必须是字符串"
+    timestamp = report.message.get("timestamp")
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+        return "缺少消息时间戳"
+    try:
+        datetime.fromtimestamp(timestamp)
+    except (OverflowError, OSError, ValueError):
+        return f"消息时间戳无效 {timestamp}"
+    for participant in report.participants or []:
+        participant_id = participant.get("id") if isinstance(participant, dict) else None
+        if not isinstance(participant_id, str) or not participant_id:
+            return "群成员缺少ID"
+    return None
+
+
+def resolve_bots(session: Session, bot_wxids: Iterable[str]) -> Dict[str, int]:
+    """wxid -> 机器人ID（缓存未命中的部分一次查询）"""
+    wxids = set(bot_wxids)
+    found = identity_caches.bots.get_many(wxids)
+    missing = wxids - found.keys()
+    if not missing:
+        return found
+    rows = session.exec(
+        select(WechatBot.wxid, WechatBot.id).where(WechatBot.wxid.in_(missing))
+    ).all()
+    for wxid, bot_id in rows:
+        found[wxid] = bot_id
+        identity_caches.remember(session, "bots", wxid, bot_id)
+    return found
+
+
+def upsert_contacts(session: Session, contacts: Dict[str, str]) -> Dict[str, Tuple[int, str]]:
+    """
+    批量写入联系人（已存在的忽略）
+
+    Args:
+        contacts: wxid -> 昵称
+
+    Returns:
+        wxid -> (联系人ID, 数据库中的昵称)
+    """
+    found = identity_caches.contacts.get_many(contacts.keys())
+    missing = sorted(wxid for wxid in contacts if wxid not in found)
+    if not missing:
+        return found
+    now = datetime.utcnow()
+    values = [
+        {
+            "wxid": wxid,
+            "wx_name": contacts[wxid],
+            "name_pinyin": search.pinyin_keys(contacts[wxid]),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for wxid in missing
+    ]
+    for batch in chunked(values):
+        session.exec(pg_insert(Contact).values(batch).on_conflict_do_nothing(index_elements=["wxid"]))
+        rows = session.exec(
+            select(Contact.wxid, Contact.id, Contact.wx_name).where(
+                Contact.wxid.in_([row["wxid"] for row in batch])
+            )
+        ).all()
+        for wxid, contact_id, wx_name in rows:
+            found[wxid] = (contact_id, wx_name)
+            identity_caches.remember(session, "contacts", wxid, (contact_id, wx_name))
+    return found
+
+
+def roster_hash(participants: List[dict]) -> str:
+    """群成员名单指纹：与顺序、重复项无关"""
+    wxids = sorted({participant["id"] for participant in participants})
+    return hashlib.sha256("\n".join(wxids).encode("utf-8")).hexdigest()
+
+
+def resolve_conversations(
+    session: Session,
+    conversations: Dict[Tuple[int, str], MessageReportRequest]
+) -> Dict[Tuple[int, str], Tuple[int, Optional[str]]]:
+    """
+    批量查找或创建会话
+
+    依赖 (wechat_bot_id, external_id) 唯一约束使用 INSERT ... ON CONFLICT DO NOTHING，
+    并发上报同一个新会话时不会产生重复会话
+
+    Args:
+        conversations: (机器人ID, 会话外部ID) -> 该会话的任意一条上报（用于新建会话的类型和标题）
+
+    Returns:
+        (机器人ID, 会话外部ID) -> (会话ID, 成员名单指纹)
+    """
+    found = identity_caches.conversations.get_many(conversations.keys())
+    missing = sorted(key for key in conversations if key not in found)
+    if not missing:
+        return found
+    now = datetime.utcnow()
+    values = [
+        {
+            "wechat_bot_id": bot_id,
+            "external_id": external_id,
+            "type": ConversationType(conversations[(bot_id, external_id)].conversation_type),
+            "topic": conversations[(bot_id, external_id)].conversation_topic,
+            "topic_pinyin": search.pinyin_keys(conversations[(bot_id, external_id)].conversation_topic),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for bot_id, external_id in missing
+    ]
+    for batch in chunked(values):
+        session.exec(
+            pg_insert(Conversation)
+            .values(batch)
+            .on_conflict_do_nothing(index_elements=["wechat_bot_id", "external_id"])
+        )
+        rows = session.exec(
+            select(
+                Conversation.wechat_bot_id,
+                Conversation.external_id,
+                Conversation.id,
+                Conversation.participants_hash,
+            ).where(
+                tuple_(Conversation.wechat_bot_id, Conversation.external_id).in_(
+                    [(row["wechat_bot_id"], row["external_id"]) for row in batch]
+                )
+            )
+        ).all()
+        for bot_id, external_id, conv_id, participants_hash in rows:
+            found[(bot_id, external_id)] = (conv_id, participants_hash)
+            identity_caches.remember(
+                session, "conversations", (bot_id, external_id), (conv_id, participants_hash)
+            )
+    return found
+
+
+def add_participants(session: Session, pairs: Iterable[Tuple[int, int]]) -> None:
+    """批量写入会话参与者 (会话ID, 联系人ID)，已存在的忽略"""
+    rows = [{"conversation_id": conv_id, "contact_id": contact_id} for conv_id, contact_id in sorted(set(pairs))]
+    for batch in chunked(rows):
+        session.exec(
+            pg_insert(conversation_participants_table)
+            .values(batch)
+            .on_conflict_do_nothing(index_elements=["conversation_id", "contact_id"])
+        )
+
+
+def content_hash(sender_wxid: str, message_type: str, content: Optional[str]) -> str:
+    """没有原始消息ID时用于去重的消息内容指纹"""
+    raw = "\n".join([sender_wxid, message_type, content or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def drop_recent_duplicates(session: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    过滤没有原始消息ID、且在时间窗口内已写入过相同内容的消息
+
+    对涉及的会话加事务级咨询锁（按会话ID排序），并发的重复上报会串行判断，
+    不会同时写入。
+    """
+    hashed = [row for row in rows if row["external_message_id"] is None]
+    if not hashed:
+        return rows
+
+    for conv_id in sorted({row["conversation_id"] for row in hashed}):
+        session.exec(select(func.pg_advisory_xact_lock(conv_id)))
+
+    seen: Dict[Tuple[int, str], List[datetime]] = {}
+    existing = session.exec(
+        select(Message.conversation_id, Message.content_hash, Message.created_at).where(
+            Message.external_message_id.is_(None),
+            tuple_(Message.conversation_id, Message.content_hash).in_(
+                list({(row["conversation_id"], row["content_hash"]) for row in hashed})
+            ),
+            Message.created_at >= min(row["created_at"] for row in hashed) - CONTENT_HASH_WINDOW,
+            Message.created_at <= max(row["created_at"] for row in hashed) + CONTENT_HASH_WINDOW,
+        )
+    ).all()
+    for conv_id, digest, created_at in existing:
+        seen.setdefault((conv_id, digest), []).append(created_at)
+
+    kept = []
+    for row in rows:
+        if row["external_message_id"] is None:
+            times = seen.setdefault((row["conversation_id"], row["content_hash"]), [])
+            if any(abs(row["created_at"] - t) <= CONTENT_HASH_WINDOW for t in times):
+                continue
+            times.append(row["created_at"])
+        kept.append(row)
+    return kept
+
+
+def process_reports(session: Session, reports: List[MessageReportRequest]) -> Dict[str, Any]:
+    """
+    在当前事务中批量处理消息上报（调用方负责提交）
+
+    Returns:
+        {
+            "received": 成功写入的条数,
+            "duplicates": 已写入过而被忽略的条数,
+            "rejected": [{"index": 下标, "reason": 原因}]
+        }
+    """
+    bot_ids = resolve_bots(session, (report.bot_id for report in reports))
+
+    rejected = []
+    accepted: List[Tuple[int, int, MessageReportRequest]] = []
+    for index, report in enumerate(reports):
+        if report.bot_id not in bot_ids:
+            rejected.append({"index": index, "reason": f"机器人 {report.bot_id} 不存在"})
+            continue
+        reason = validate_report(report)
+        if reason is not None:
+            rejected.append({"index": index, "reason": reason})
+            continue
+        accepted.append((index, bot_ids[report.bot_id], report))
+
+    if not accepted:
+        return {"received": 0, "duplicates": 0, "rejected": rejected}
+
+    # 1. 会话
+    conversation_reports: Dict[Tuple[int, str], MessageReportRequest] = {}
+    for _, bot_id, report in accepted:
+        conversation_reports.setdefault((bot_id, report.conversation_id), report)
+    conversations = resolve_conversations(session, conversation_reports)
+
+    # 2. 名单指纹有变化的群聊才需要处理成员，同一会话以批内最后一份名单为准
+    changed_rosters: Dict[int, Dict[str, str]] = {}
+    roster_hashes: Dict[int, str] = {}
+    for _, bot_id, report in accepted:
+        if report.conversation_type != "group" or not report.participants:
+            continue
+        conv_key = (bot_id, report.conversation_id)
+        conv_id, stored_hash = conversations[conv_key]
+        submitted_hash = roster_hash(report.participants)
+        if submitted_hash == stored_hash:
+            continue
+        roster = changed_rosters.setdefault(conv_id, {})
+        for participant in report.participants:
+            roster.setdefault(participant["id"], participant.get("name"))
+        roster_hashes[conv_id] = submitted_hash
+        identity_caches.remember(session, "conversations", conv_key, (conv_id, submitted_hash))
+
+    # 3. 联系人：发送者 + 名单有变化的群聊成员
+    contact_names: Dict[str, str] = {}
+    for _, _, report in accepted:
+        contact_names.setdefault(report.sender["id"], report.sender.get("name"))
+    for roster in changed_rosters.values():
+        for wxid, name in roster.items():
+            contact_names.setdefault(wxid, name)
+    contacts = upsert_contacts(session, contact_names)
+
+    # 4. 参与者、消息与会话最后消息
+    participant_pairs = [
+        (conv_id, contacts[wxid][0])
+        for conv_id, roster in changed_rosters.items()
+        for wxid in roster
+    ]
+    message_rows = []
+    for _, bot_id, report in accepted:
+        conv_id, _ = conversations[(bot_id, report.conversation_id)]
+        sender_id, _ = contacts[report.sender["id"]]
+        participant_pairs.append((conv_id, sender_id))
+
+        content = report.message.get("content")
+        message_type = MessageType(report.message.get("type", "text"))
+        external_message_id = report.message.get("id") or None
+        message_rows.append({
+            "conversation_id": conv_id,
+            "sender_id": sender_id,
+            "external_message_id": external_message_id,
+            "type": message_type,
+            "content": content,
+            "content_hash": (
+                None if external_message_id
+                else content_hash(report.sender["id"], message_type.value, content)
+            ),
+            "created_at": datetime.fromtimestamp(report.message["timestamp"]),
+        })
+
+    add_participants(session, participant_pairs)
+    new_rows = drop_recent_duplicates(session, message_rows)
+    inserted = []
+    for batch in chunked(new_rows):
+        inserted.extend(session.exec(
+            pg_insert(Message)
+            .values(batch)
+            .on_conflict_do_nothing(index_elements=["conversation_id", "external_message_id"])
+            .returning(
+                Message.id,
+                Message.conversation_id,
+                Message.sender_id,
+                Message.external_message_id,
+                Message.type,
+                Message.content,
+                Message.created_at,
+            )
+        ).all())
+
+    # 会话最后消息只取本次真正写入的消息，重复上报不会改动会话
+    senders = {contact_id: (wxid, wx_name) for wxid, (contact_id, wx_name) in contacts.items()}
+    sender_names = {contact_id: wx_name for contact_id, (_, wx_name) in senders.items()}
+    conversation_keys = {conv_id: key for key, (conv_id, _) in conversations.items()}
+    last_messages: Dict[int, Dict[str, Any]] = {}
+    for message_id, conv_id, sender_id, external_message_id, message_type, content, created_at in inserted:
+        bot_id = conversation_keys[conv_id][0]
+        sender_wxid, sender_name = senders[sender_id]
+        live_hub.stage(session, bot_id, {
+            "type": "message",
+            "data": {
+                "id": message_id,
+                "conversation_id": conv_id,
+                "wechat_bot_id": bot_id,
+                "external_message_id": external_message_id,
+                "type": MessageType(message_type).value,
+                "content": content,
+                "created_at": created_at.isoformat(),
+                "sender": {"id": sender_id, "wxid": sender_wxid, "wx_name": sender_name},
+            },
+        })
+
+        last = last_messages.get(conv_id)
+        if last is None or created_at >= last["last_message_at"]:
+            last_messages[conv_id] = {
+                "id": conv_id,
+                "last_message_summary": f"{sender_names[sender_id]}: {(content or '')[:50]}",
+                "last_message_at": created_at,
+            }
+    if last_messages:
+        # 乱序到达的较旧批次不回退会话的最后消息；按会话ID顺序加行锁，与并发写入串行比较
+        stored = dict(session.exec(
+            select(Conversation.id, Conversation.last_message_at)
+            .where(Conversation.id.in_(sorted(last_messages)))
+            .order_by(Conversation.id)
+            .with_for_update()
+        ).all())
+        last_messages = {
+            conv_id: last for conv_id, last in last_messages.items()
+            if stored.get(conv_id) is None or last["last_message_at"] >= stored[conv_id]
+        }
+    if last_messages:
+        session.exec(update(Conversation), params=[last_messages[conv_id] for conv_id in sorted(last_messages)])
+        change_versions.bump(
+            session, {conversation_keys[conv_id][0] for conv_id in last_messages}, change_versions.CONVERSATIONS
+        )
+        for conv_id, last in last_messages.items():
+            bot_id, external_id = conversation_keys[conv_id]
+            report = conversation_reports[(bot_id, external_id)]
+            live_hub.stage(session, bot_id, {
+                "type": "conversation",
+                "data": {
+                    "id": conv_id,
+                    "wechat_bot_id": bot_id,
+                    "external_id": external_id,
+                    "type": report.conversation_type,
+                    "topic": report.conversation_topic,
+                    "last_message_summary": last["last_message_summary"],
+                    "last_message_at": last["last_message_at"].isoformat(),
+                },
+            })
+    if roster_hashes:
+        session.exec(update(Conversation), params=[
+            {"id": conv_id, "participants_hash": roster_hashes[conv_id]}
+            for conv_id in sorted(roster_hashes)
+        ])
+
+    return {"received": len(inserted), "duplicates": len(message_rows) - len(inserted), "rejected": rejected}
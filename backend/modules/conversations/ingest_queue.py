@@ -0,0 +1,206 @@
+"""
+消息上报的异步写入队列
+
+路由只做校验并把上报放入进程内有界队列，立即返回 202；后台写入线程
+按批取出上报，交给批量写入逻辑（多行 INSERT，一批一个事务）落库。
+队列已满时拒绝入队，路由返回 429 并通过 Retry-After 提示机器人稍后重试。
+
+字段不合法的上报在入队前由路由拒绝（422）。整批写入重试后仍失败时改为
+逐条写入，只丢弃写不进去的那几条，不连累同批的其他上报。
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from modules.conversations.models import MessageReportRequest
+
+logger = logging.getLogger(__name__)
+
+BatchWriter = Callable[[List[MessageReportRequest]], Dict[str, Any]]
+
+
+class IngestQueueFull(Exception):
+    """队列已满，上报需要稍后重试"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"消息队列已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class IngestQueue:
+    """有界上报队列 + 后台批量写入线程"""
+
+    def __init__(
+        self,
+        writer: BatchWriter,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        max_retries: int = 3,
+    ):
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._in_flight = 0
+        # 最近一批的写入速度（条/秒），用于估算 Retry-After
+        self._write_rate = 0.0
+        self._stats = {
+            "accepted": 0,
+            "throttled": 0,
+            "written": 0,
+            "duplicates": 0,
+            "rejected": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+
+    def start(self) -> None:
+        """启动后台写入线程（重复调用无副作用）"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="message-ingest-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, reports: List[MessageReportRequest]) -> int:
+        """
+        入队一组上报（整组要么全部入队，要么全部拒绝）
+
+        Returns:
+            入队后的队列长度
+
+        Raises:
+            IngestQueueFull: 队列剩余空间不足
+        """
+        self.start()
+        with self._cond:
+            if len(self._items) + len(reports) > self.max_size:
+                self._stats["throttled"] += len(reports)
+                raise IngestQueueFull(self._retry_after_locked())
+            self._items.extend(reports)
+            self._stats["accepted"] += len(reports)
+            self._cond.notify()
+            return len(self._items)
+
+    def pending(self) -> int:
+        """队列中等待写入以及正在写入的上报数"""
+        with self._cond:
+            return len(self._items) + self._in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                "pending": len(self._items) + self._in_flight,
+                "max_size": self.max_size,
+            }
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待队列写空，返回是否在超时前完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._items or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """写完剩余上报后停止后台线程"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _retry_after_locked(self) -> int:
+        backlog = len(self._items) + self._in_flight
+        if self._write_rate <= 0:
+            return 1
+        return max(1, min(60, math.ceil(backlog / self._write_rate)))
+
+    def _take_batch(self) -> List[MessageReportRequest]:
+        """取出一批：队列攒满一批或等待 flush_interval 后取出已有的"""
+        with self._cond:
+            while not self._items and not self._stopping:
+                self._cond.wait()
+            if not self._items:
+                return []
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._items) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(self.batch_size, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            self._in_flight = count
+            return batch
+
+    def _try_write(self, batch: List[MessageReportRequest]) -> bool:
+        """写入一批并记录指标，返回是否成功"""
+        started = time.monotonic()
+        try:
+            result = self.writer(batch)
+        except Exception:
+            logger.exception("批量写入 %d 条上报失败", len(batch))
+            return False
+        elapsed = max(time.monotonic() - started, 1e-6)
+        with self._cond:
+            self._write_rate = len(batch) / elapsed
+            self._stats["batches"] += 1
+            self._stats["written"] += result.get("received", 0)
+            self._stats["duplicates"] += result.get("duplicates", 0)
+            self._stats["rejected"] += len(result.get("rejected", []))
+        for item in result.get("rejected", []):
+            logger.warning("上报被拒绝: %s", item["reason"])
+        return True
+
+    def _write(self, batch: List[MessageReportRequest]) -> None:
+        for attempt in range(1, self.max_retries + 1):
+            if self._try_write(batch):
+                return
+            if attempt < self.max_retries:
+                time.sleep(min(2 ** attempt * 0.1, 2))
+        if len(batch) > 1:
+            # 整批持续失败多半是个别上报导致的，逐条写入找出并只丢弃这些上报
+            logger.warning("%d 条上报重试 %d 次后仍写入失败，改为逐条写入", len(batch), self.max_retries)
+            for report in batch:
+                if not self._try_write([report]):
+                    self._drop([report])
+            return
+        self._drop(batch)
+
+    def _drop(self, batch: List[MessageReportRequest]) -> None:
+        with self._cond:
+            self._stats["failed"] += len(batch)
+        for report in batch:
+            logger.error(
+                "丢弃上报：写入失败（机器人 %s，会话 %s，消息 %s）",
+                report.bot_id, report.conversation_id, report.message.get("id")
+            )
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
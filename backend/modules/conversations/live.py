@@ -0,0 +1,138 @@
+"""
+新消息实时推送
+
+消息写入事务提交后，把新消息和会话摘要更新事件推送给订阅了对应微信
+账号的连接（SSE）。事件先记在数据库会话上，提交后才发布、回滚则丢弃。
+
+写入可能发生在线程池或后台写入线程中，订阅者则是各自事件循环里的
+asyncio.Queue，因此发布时通过 call_soon_threadsafe 投递。订阅者处理
+不过来、队列已满时丢弃事件并标记，订阅者随后会收到 resync 事件，
+提示前端重新拉取列表。
+
+多 worker 部署时由 fanout 模块在提交前把事件经 Postgres NOTIFY 发给
+所有 worker。
+"""
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_PENDING_KEY = "live_events_pending"
+
+RESYNC_EVENT = {"type": "resync", "data": {}}
+
+
+@dataclass(eq=False)
+class Subscription:
+    """一个实时连接的订阅"""
+    bot_ids: Set[int]
+    queue: asyncio.Queue
+    loop: asyncio.AbstractEventLoop
+    lagged: bool = field(default=False)
+
+    def _deliver(self, live_event: Dict[str, Any]) -> None:
+        # 在订阅者自己的事件循环中执行
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(live_event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def next_event(self, timeout: float) -> Dict[str, Any]:
+        """
+        等待下一个事件，超时抛出 asyncio.TimeoutError
+
+        丢过事件的订阅会先清空积压并收到一次 resync
+        """
+        if self.lagged:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagged = False
+            return RESYNC_EVENT
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LiveHub:
+    """进程内的实时事件分发中心，按机器人（微信账号）ID 路由"""
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, bot_ids: Iterable[int]) -> Subscription:
+        """在当前事件循环中创建订阅"""
+        subscription = Subscription(
+            bot_ids=set(bot_ids),
+            queue=asyncio.Queue(self.max_queue),
+            loop=asyncio.get_running_loop(),
+        )
+        with self._lock:
+            for bot_id in subscription.bot_ids:
+                self._subscriptions.setdefault(bot_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for bot_id in subscription.bot_ids:
+                subscribers = self._subscriptions.get(bot_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[bot_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({sub for subs in self._subscriptions.values() for sub in subs})
+
+    def publish(self, bot_id: int, live_event: Dict[str, Any]) -> None:
+        """向订阅了该机器人的连接投递事件（可在任意线程调用）"""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(bot_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, live_event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                self.unsubscribe(subscription)
+
+    def publish_all(self, live_event: Dict[str, Any]) -> None:
+        """向本进程的全部订阅者投递事件"""
+        with self._lock:
+            subscribers = {sub for subs in self._subscriptions.values() for sub in subs}
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, live_event)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def stage(self, session: Session, bot_id: int, live_event: Dict[str, Any]) -> None:
+        """记录待发布的事件，数据库事务提交后发布"""
+        session.info.setdefault(_PENDING_KEY, []).append((bot_id, live_event))
+
+    def publish_pending(self, session: Session) -> None:
+        for bot_id, live_event in take_pending(session):
+            self.publish(bot_id, live_event)
+
+
+def take_pending(session: Session) -> List[Tuple[int, Dict[str, Any]]]:
+    """取出会话上待发布的事件"""
+    return session.info.pop(_PENDING_KEY, [])
+
+
+live_hub = LiveHub()
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session: Session) -> None:
+    live_hub.publish_pending(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
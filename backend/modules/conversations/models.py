@@ -4,10 +4,10 @@
 import uuid
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 from sqlmodel import Field as SQLField, SQLModel, Column, Relationship
-from sqlalchemy import Enum as SQLAlchemyEnum, BigInteger, Text, ForeignKey, Table
+from sqlalchemy import Enum as SQLAlchemyEnum, BigInteger, Text, ForeignKey, Table, UniqueConstraint
 from sqlalchemy import MetaData
 
 
@@ -117,6 +117,8 @@ class Contact(ContactBase, table=True):
     __tablename__ = "contacts"
     
     id: int = SQLField(sa_column=Column(BigInteger, primary_key=True, autoincrement=True))
+    # 备注名和昵称的拼音检索键（全拼|首字母），未安装 pypinyin 时为空
+    name_pinyin: Optional[str] = SQLField(default=None, sa_column=Column(Text))
     created_at: datetime = SQLField(default_factory=datetime.utcnow)
     updated_at: datetime = SQLField(default_factory=datetime.utcnow)
     
@@ -127,6 +129,9 @@ class Contact(ContactBase, table=True):
 class Conversation(ConversationBase, table=True):
     """会话数据库模型"""
     __tablename__ = "conversations"
+    __table_args__ = (
+        UniqueConstraint("wechat_bot_id", "external_id", name="uq_conversations_bot_external"),
+    )
     
     id: int = SQLField(sa_column=Column(BigInteger, primary_key=True, autoincrement=True))
     wechat_bot_id: int = SQLField(foreign_key="wechat_bots.id")
@@ -141,6 +146,10 @@ class Conversation(ConversationBase, table=True):
             nullable=False
         )
     )
+    # 最近一次写入的群成员名单指纹，名单未变化时跳过成员比对
+    participants_hash: Optional[str] = SQLField(default=None, max_length=64)
+    # 标题的拼音检索键（全拼|首字母），未安装 pypinyin 时为空
+    topic_pinyin: Optional[str] = SQLField(default=None, sa_column=Column(Text))
     created_at: datetime = SQLField(default_factory=datetime.utcnow)
     updated_at: datetime = SQLField(default_factory=datetime.utcnow)
     
@@ -151,6 +160,9 @@ class Conversation(ConversationBase, table=True):
 class Message(MessageBase, table=True):
     """消息数据库模型"""
     __tablename__ = "messages"
+    __table_args__ = (
+        UniqueConstraint("conversation_id", "external_message_id", name="uq_messages_conversation_external"),
+    )
     
     id: int = SQLField(sa_column=Column(BigInteger, primary_key=True, autoincrement=True))
     conversation_id: int = SQLField(foreign_key="conversations.id")
@@ -167,6 +179,8 @@ class Message(MessageBase, table=True):
         )
     )
     content: Optional[str] = SQLField(sa_column=Column(Text))
+    # 无原始消息ID时用于去重的内容指纹
+    content_hash: Optional[str] = SQLField(default=None, max_length=64)
     
     # 关系
     conversation: Conversation = Relationship(back_populates="messages")
@@ -250,6 +264,11 @@ class MessageReportRequest(BaseModel):
     participants: Optional[List[dict]] = None  # 群聊参与者列表
 
 
+class MessageReportBatchRequest(BaseModel):
+    """批量消息上报请求模型"""
+    reports: List[MessageReportRequest] = Field(min_length=1, max_length=1000)
+
+
 # 公开API响应模型
 class TagPublic(TagBase):
     """公开的标签信息模型"""
@@ -281,6 +300,11 @@ class MessagePublic(MessageBase):
     sender: ContactPublic
 
 
+class MessageCompactPublic(MessageBase):
+    """精简的消息信息模型：只通过 sender_id 引用发送者"""
+    id: int
+
+
 class ContactMemoryPublic(ContactMemoryBase):
     """公开的联系人记忆信息模型"""
     id: int
@@ -293,9 +317,55 @@ class ConversationListResponse(BaseModel):
 
 
 class MessageListResponse(BaseModel):
-    """消息列表响应模型"""
+    """消息列表响应模型（游标分页时不返回 total）"""
     messages: List[MessagePublic]
-    total: int
+    total: Optional[int] = None
+    has_more: bool = False
+
+
+class MessageCompactListResponse(BaseModel):
+    """精简的消息列表响应模型：发送者统一放在 senders 中，每人只出现一次"""
+    messages: List[MessageCompactPublic]
+    senders: Dict[int, ContactPublic]
+    total: Optional[int] = None
+    has_more: bool = False
+
+
+class MessageSearchHit(BaseModel):
+    """消息搜索命中：snippet 为命中附近的片段，highlights 为片段中命中的 [起, 止) 字符偏移"""
+    id: int
+    conversation_id: int
+    wechat_bot_id: int
+    conversation_topic: Optional[str] = None
+    sender_id: int
+    sender_name: Optional[str] = None
+    type: MessageType
+    created_at: datetime
+    snippet: str
+    highlights: List[List[int]] = []
+
+
+class MessageSearchResponse(BaseModel):
+    """消息搜索响应模型"""
+    hits: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+class ContactSearchHit(BaseModel):
+    """联系人搜索命中：conversation_id 为该联系人与机器人的私聊会话（没有私聊时为空）"""
+    id: int
+    wxid: str
+    wx_name: Optional[str] = None
+    remark_name: Optional[str] = None
+    avatar: Optional[str] = None
+    conversation_id: Optional[int] = None
+
+
+class ConversationSearchResponse(BaseModel):
+    """会话与联系人搜索响应模型"""
+    conversations: List[ConversationPublic]
+    contacts: List[ContactSearchHit]
 
 
 class ConversationDetailResponse(BaseModel):
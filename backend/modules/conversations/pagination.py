@@ -0,0 +1,26 @@
+"""
+列表分页使用的游标
+
+游标是对排序键的不透明编码（URL 安全的 base64 JSON），前端原样回传即可。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def encode_cursor(sort_at: Optional[datetime], row_id: int) -> str:
+    """把 (排序时间, ID) 编码为游标"""
+    raw = json.dumps({"t": sort_at.isoformat() if sort_at else None, "id": row_id})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        sort_at = datetime.fromisoformat(data["t"]) if data["t"] is not None else None
+        return sort_at, int(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("无效的分页游标") from e
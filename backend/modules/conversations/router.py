@@ -1,14 +1,31 @@
 """
 会话与消息管理模块的路由层
 """
-from typing import Dict, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from pydantic import BaseModel
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from sqlmodel import Session
 
-from modules.auth.deps import CurrentUser
-from modules.conversations.service import ConversationService
+from app.core.config import settings
+from app.core.db import engine
+from app.core.responses import FastJSONResponse, dump_model_map, dump_models, envelope
+from modules.auth.deps import CurrentUser, TokenDep
+from modules.auth.service import get_current_user_from_token
+from modules.users.models import User
+from modules.conversations import ingest
+from modules.conversations.live import Subscription, live_hub
+from modules.conversations.service import ConversationService, message_ingest_queue
+from modules.conversations.async_service import AsyncConversationService
+from modules.conversations.ingest_queue import IngestQueueFull
+from modules.wechat_accounts import change_versions
 from modules.conversations.models import (
     MessageReportRequest,
+    MessageReportBatchRequest,
     ConversationListResponse,
     MessageListResponse,
     ConversationDetailResponse,
@@ -20,21 +37,46 @@ from modules.conversations.models import (
     TagUpdate
 )
 
-router = APIRouter(prefix="/conversations", tags=["conversations"])
+router = APIRouter(prefix="/conversations", tags=["conversations"], default_response_class=FastJSONResponse)
 
 
 # 请求模型定义
 class ConversationListRequest(BaseModel):
-    """获取会话列表请求"""
+    """获取会话列表请求（传入 limit 时按游标分页）"""
     wechat_account_id: int
     query: Optional[str] = None
+    limit: Optional[int] = Field(default=None, ge=1, le=200)
+    cursor: Optional[str] = None
+
+
+class ConversationSearchRequest(BaseModel):
+    """边输入边搜索会话与联系人请求"""
+    wechat_account_id: int
+    query: str = Field(min_length=1, max_length=50)
+    limit: int = Field(default=10, ge=1, le=50)
 
 
 class MessageListRequest(BaseModel):
-    """获取消息列表请求"""
+    """获取消息列表请求（传入 before_id 或 after_id 时按消息ID游标分页，忽略 page）"""
     conversation_id: int
     page: int = 1
     page_size: int = 20
+    before_id: Optional[int] = None
+    after_id: Optional[int] = None
+    # 精简格式：消息只带 sender_id，发送者统一放在 senders 中
+    compact: bool = False
+
+
+class MessageSearchRequest(BaseModel):
+    """搜索消息请求（空格分隔的多个关键词需全部命中；不指定微信账号时搜索有权访问的全部账号）"""
+    query: str = Field(min_length=1, max_length=100)
+    wechat_account_id: Optional[int] = None
+    conversation_id: Optional[int] = None
+    sender_id: Optional[int] = None
+    start_at: Optional[datetime] = None
+    end_at: Optional[datetime] = None
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None
 
 
 class ConversationDetailRequest(BaseModel):
@@ -57,6 +99,49 @@ class AISuggestionRequest(BaseModel):
     contact_id: int
 
 
+def enqueue_reports(reports: List[MessageReportRequest]) -> JSONResponse:
+    """
+    异步上报模式：入队后返回 202，队列已满返回 429 + Retry-After
+
+    入队前校验写入所需的字段，有不合法的上报时整组不入队，返回 422 和不合法上报的下标
+    """
+    rejected = []
+    for index, report in enumerate(reports):
+        reason = ingest.validate_report(report)
+        if reason is not None:
+            rejected.append({"index": index, "reason": reason})
+    if rejected:
+        return JSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={
+                "error": 422,
+                "body": {"rejected": rejected},
+                "message": "上报字段不合法"
+            }
+        )
+    
+    try:
+        pending = message_ingest_queue.submit(reports)
+    except IngestQueueFull as e:
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(e.retry_after)},
+            content={
+                "error": 429,
+                "body": None,
+                "message": str(e)
+            }
+        )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "error": 0,
+            "body": {"status": "accepted", "accepted": len(reports), "pending": pending},
+            "message": "成功"
+        }
+    )
+
+
 # 内部API路由
 @router.post("/internal/message/report")
 async def report_message(
@@ -74,8 +159,11 @@ async def report_message(
             "message": "未授权"
         }
     
+    if settings.MESSAGE_INGEST_MODE == "queue":
+        return enqueue_reports([request_data])
+    
     try:
-        result = ConversationService.process_message_report(request_data)
+        result = await run_in_threadpool(ConversationService.process_message_report, request_data)
         return {
             "error": 0,
             "body": result,
@@ -95,76 +183,341 @@ async def report_message(
         }
 
 
-# 公开API路由
-@router.post("/list")
-async def list_conversations(
-    request_data: ConversationListRequest,
-    current_user: CurrentUser
+@router.get("/internal/ingest/stats")
+async def get_ingest_stats(
+    authorization: str = Header(None)
+) -> Dict[str, Any]:
+    """
+    消息上报运行指标（内部API）：身份缓存命中率、写入队列长度等
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return {
+            "error": 401,
+            "body": None,
+            "message": "未授权"
+        }
+    
+    return {
+        "error": 0,
+        "body": ConversationService.get_ingest_stats(),
+        "message": "成功"
+    }
+
+
+@router.post("/internal/message/report/batch")
+async def report_messages_batch(
+    request_data: MessageReportBatchRequest,
+    authorization: str = Header(None)
 ) -> Dict[str, Any]:
     """
-    获取会话列表
+    批量上报消息（内部API，供机器人调用）
     """
+    # 简单的token验证
+    if not authorization or not authorization.startswith("Bearer "):
+        return {
+            "error": 401,
+            "body": None,
+            "message": "未授权"
+        }
+    
+    if settings.MESSAGE_INGEST_MODE == "queue":
+        return enqueue_reports(request_data.reports)
+    
     try:
-        conversations = ConversationService.get_conversations(
-            wechat_account_id=request_data.wechat_account_id,
-            query=request_data.query,
-            current_user_id=current_user.id
-        )
-        
+        result = await run_in_threadpool(ConversationService.process_message_reports, request_data.reports)
         return {
             "error": 0,
-            "body": {
-                "conversations": [conv.model_dump() for conv in conversations]
-            },
+            "body": result,
             "message": "成功"
         }
+    except ValueError as e:
+        return {
+            "error": 1,
+            "body": None,
+            "message": str(e)
+        }
     except Exception as e:
         return {
             "error": 1,
             "body": None,
-            "message": f"获取失败: {str(e)}"
+            "message": f"处理失败: {str(e)}"
         }
 
 
+# 公开API路由
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def user_from_token(token: Optional[str]) -> Optional[User]:
+    """按令牌查找当前用户（同步查询，在线程池中调用）"""
+    with Session(engine) as session:
+        return get_current_user_from_token(session=session, token=token)
+
+
+async def live_event_stream(request: Request, subscription: Subscription) -> AsyncIterator[str]:
+    """把订阅到的事件编码为 SSE，空闲时发送心跳注释保持连接"""
+    try:
+        yield f"event: ready\ndata: {json.dumps({'wechat_account_ids': sorted(subscription.bot_ids)})}\n\n"
+        while not await request.is_disconnected():
+            try:
+                live_event = await subscription.next_event(STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            data = json.dumps(live_event["data"], ensure_ascii=False)
+            yield f"event: {live_event['type']}\ndata: {data}\n\n"
+    finally:
+        live_hub.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_conversations(
+    request: Request,
+    token: TokenDep,
+    wechat_account_id: Optional[List[int]] = Query(None),
+    access_token: Optional[str] = Query(None)
+):
+    """
+    实时推送新消息与会话摘要更新（Server-Sent Events）
+    
+    认证使用 Authorization: Bearer 头；浏览器 EventSource 无法设置请求头时可改用 access_token 查询参数。
+    不指定 wechat_account_id 时订阅当前用户有权访问的全部微信账号。
+    
+    事件类型：ready（订阅成功）、message（新消息）、conversation（会话摘要更新）、
+    resync（推送积压被丢弃，需要重新拉取列表）
+    """
+    current_user = await run_in_threadpool(user_from_token, token or access_token)
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    try:
+        bot_ids = await run_in_threadpool(
+            ConversationService.get_accessible_bot_ids, current_user, wechat_account_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    
+    subscription = live_hub.subscribe(bot_ids)
+    return StreamingResponse(
+        live_event_stream(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def conversation_list_response(
+    request_data: ConversationListRequest,
+    current_user: CurrentUser,
+    if_none_match: Optional[str] = None,
+    conditional: bool = False
+) -> Response:
+    """
+    会话列表响应；conditional 为 True 时带 ETag，If-None-Match 命中则返回 304
+    """
+    try:
+        etag = None
+        if conditional:
+            # 先检查权限：无权访问的账号不能通过 304 探测其版本号
+            await run_in_threadpool(
+                ConversationService.get_accessible_bot_ids, current_user, [request_data.wechat_account_id]
+            )
+            # 先读版本再查询：返回的数据不会比 ETag 对应的版本旧
+            version = await AsyncConversationService.get_conversations_version(request_data.wechat_account_id)
+            etag = change_versions.make_etag(
+                change_versions.CONVERSATIONS,
+                request_data.wechat_account_id,
+                version,
+                request_data.query,
+                request_data.limit,
+                request_data.cursor
+            )
+            if change_versions.etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        headers = {"ETag": etag} if etag else None
+        
+        if request_data.limit is not None:
+            page = await AsyncConversationService.get_conversations_page(
+                wechat_account_id=request_data.wechat_account_id,
+                limit=request_data.limit,
+                cursor=request_data.cursor,
+                query=request_data.query,
+                current_user_id=current_user.id
+            )
+            return envelope(
+                {
+                    "conversations": dump_models(page["conversations"]),
+                    "next_cursor": page["next_cursor"],
+                    "has_more": page["has_more"]
+                },
+                headers=headers
+            )
+        
+        conversations = await AsyncConversationService.get_conversations(
+            wechat_account_id=request_data.wechat_account_id,
+            query=request_data.query,
+            current_user_id=current_user.id
+        )
+        
+        return envelope({"conversations": dump_models(conversations)}, headers=headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        return envelope(error=1, message=str(e))
+    except Exception as e:
+        return envelope(error=1, message=f"获取失败: {str(e)}")
+
+
+@router.get("/list")
+async def get_conversation_list(
+    current_user: CurrentUser,
+    wechat_account_id: int,
+    query: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
+    """
+    获取会话列表（条件请求）
+    
+    参数同 POST /list。成功的响应带 ETag（随该微信账号的会话数据版本和请求参数变化）；
+    客户端保存 ETag，下次请求带 If-None-Match，会话数据未变化时返回 304 且不执行列表查询
+    """
+    return await conversation_list_response(
+        ConversationListRequest(wechat_account_id=wechat_account_id, query=query, limit=limit, cursor=cursor),
+        current_user,
+        if_none_match=if_none_match,
+        conditional=True
+    )
+
+
+@router.post("/list")
+async def list_conversations(
+    request_data: ConversationListRequest,
+    current_user: CurrentUser
+) -> Response:
+    """
+    获取会话列表（需要条件请求时使用 GET /list）
+    """
+    return await conversation_list_response(request_data, current_user)
+
+
+@router.post("/search")
+async def search_conversations(
+    request_data: ConversationSearchRequest,
+    current_user: CurrentUser
+) -> Response:
+    """
+    边输入边搜索：按标题匹配会话，按备注名/昵称匹配联系人（支持拼音和首字母）
+    """
+    try:
+        await run_in_threadpool(
+            ConversationService.get_accessible_bot_ids, current_user, [request_data.wechat_account_id]
+        )
+        result = await AsyncConversationService.search_conversations(
+            wechat_account_id=request_data.wechat_account_id,
+            query=request_data.query,
+            limit=request_data.limit
+        )
+        
+        return envelope({
+            "conversations": dump_models(result["conversations"]),
+            "contacts": dump_models(result["contacts"])
+        })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        return envelope(error=1, message=str(e))
+    except Exception as e:
+        return envelope(error=1, message=f"搜索失败: {str(e)}")
+
+
 @router.post("/messages/list")
 async def list_messages(
     request_data: MessageListRequest,
     current_user: CurrentUser
-) -> Dict[str, Any]:
+) -> Response:
     """
     获取指定会话的消息列表
     """
     try:
-        result = ConversationService.get_messages(
-            conversation_id=request_data.conversation_id,
-            page=request_data.page,
-            page_size=request_data.page_size,
-            current_user_id=current_user.id
+        if request_data.before_id is not None or request_data.after_id is not None:
+            result = await AsyncConversationService.get_messages_keyset(
+                conversation_id=request_data.conversation_id,
+                before_id=request_data.before_id,
+                after_id=request_data.after_id,
+                limit=request_data.page_size,
+                current_user_id=current_user.id,
+                compact=request_data.compact
+            )
+        else:
+            result = await AsyncConversationService.get_messages(
+                conversation_id=request_data.conversation_id,
+                page=request_data.page,
+                page_size=request_data.page_size,
+                current_user_id=current_user.id,
+                compact=request_data.compact
+            )
+        
+        # 整页消息一次转换，时间等字段由 orjson 编码
+        body = {
+            "messages": dump_models(result["messages"]),
+            "has_more": result["has_more"]
+        }
+        if "senders" in result:
+            body["senders"] = dump_model_map(result["senders"])
+        if "total" in result:
+            body["total"] = result["total"]
+        
+        return envelope(body)
+    except ValueError as e:
+        return envelope(error=1, message=str(e))
+    except Exception as e:
+        return envelope(error=1, message=f"获取失败: {str(e)}")
+
+
+@router.post("/messages/search")
+async def search_messages(
+    request_data: MessageSearchRequest,
+    current_user: CurrentUser
+) -> Response:
+    """
+    搜索消息内容，按时间倒序返回带高亮片段的命中
+    """
+    try:
+        bot_ids = await run_in_threadpool(
+            ConversationService.get_accessible_bot_ids,
+            current_user,
+            [request_data.wechat_account_id] if request_data.wechat_account_id is not None else None
         )
+        if not bot_ids:
+            return envelope({"hits": [], "next_cursor": None, "has_more": False})
         
-        # 转换消息列表为字典格式
-        messages_dict = []
-        for msg in result["messages"]:
-            msg_dict = msg.model_dump()
-            # 确保时间格式正确
-            if msg_dict.get("created_at"):
-                msg_dict["created_at"] = msg_dict["created_at"].isoformat()
-            messages_dict.append(msg_dict)
+        result = await AsyncConversationService.search_messages(
+            bot_ids=bot_ids,
+            query=request_data.query,
+            limit=request_data.limit,
+            cursor=request_data.cursor,
+            conversation_id=request_data.conversation_id,
+            sender_id=request_data.sender_id,
+            start_at=request_data.start_at,
+            end_at=request_data.end_at
+        )
         
-        return {
-            "error": 0,
-            "body": {
-                "messages": messages_dict,
-                "total": result["total"]
-            },
-            "message": "成功"
-        }
+        return envelope({
+            "hits": dump_models(result["hits"]),
+            "next_cursor": result["next_cursor"],
+            "has_more": result["has_more"]
+        })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        return envelope(error=1, message=str(e))
     except Exception as e:
-        return {
-            "error": 1,
-            "body": None,
-            "message": f"获取失败: {str(e)}"
-        }
+        return envelope(error=1, message=f"搜索失败: {str(e)}")
 
 
 @router.post("/details/get")
@@ -176,7 +529,8 @@ async def get_details(
     获取联系人/会话详情
     """
     try:
-        result = ConversationService.get_conversation_details(
+        result = await run_in_threadpool(
+            ConversationService.get_conversation_details,
             conversation_id=request_data.conversation_id,
             contact_id=request_data.contact_id,
             current_user_id=current_user.id
@@ -214,7 +568,8 @@ async def update_contact(
         tag_ids = []
         if request_data.tags is not None:
             # 获取现有标签
-            existing_tags = ConversationService.get_tags(
+            existing_tags = await run_in_threadpool(
+                ConversationService.get_tags,
                 owner_id=current_user.id,
                 include_public=True
             )
@@ -227,7 +582,8 @@ async def update_contact(
                     tag_ids.append(existing_tag_names[tag_name])
                 else:
                     # 创建新标签
-                    new_tag = ConversationService.create_tag(
+                    new_tag = await run_in_threadpool(
+                        ConversationService.create_tag,
                         TagCreate(name=tag_name, owner_id=current_user.id),
                         current_user_id=current_user.id
                     )
@@ -240,7 +596,8 @@ async def update_contact(
             tag_ids=tag_ids if request_data.tags is not None else None
         )
         
-        updated_contact = ConversationService.update_contact(
+        updated_contact = await run_in_threadpool(
+            ConversationService.update_contact,
             contact_id=request_data.contact_id,
             update_data=update_data,
             current_user_id=current_user.id
@@ -274,7 +631,8 @@ async def get_ai_suggestion(
     获取AI回复建议
     """
     try:
-        result = ConversationService.get_ai_suggestion(
+        result = await run_in_threadpool(
+            ConversationService.get_ai_suggestion,
             conversation_id=request_data.conversation_id,
             contact_id=request_data.contact_id,
             current_user_id=current_user.id
@@ -313,7 +671,8 @@ async def create_tag(
         if not tag_data.owner_id:
             tag_data.owner_id = current_user.id
             
-        tag = ConversationService.create_tag(
+        tag = await run_in_threadpool(
+            ConversationService.create_tag,
             tag_data=tag_data,
             current_user_id=current_user.id
         )
@@ -345,7 +704,8 @@ async def list_tags(
     获取标签列表
     """
     try:
-        tags = ConversationService.get_tags(
+        tags = await run_in_threadpool(
+            ConversationService.get_tags,
             owner_id=current_user.id,
             include_public=True
         )
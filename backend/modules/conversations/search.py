@@ -0,0 +1,127 @@
+"""
+消息与会话搜索的公共工具
+
+中文没有空格分词，搜索按子串匹配：关键词按空白拆分，每个关键词生成一个
+ILIKE '%词%' 条件，由 pg_trgm 的 GIN 三元组索引加速。关键词至少 3 个字时
+才能用上索引；全部关键词都不足 3 个字的消息搜索会退化为扫描，必须限定到
+单个机器人、会话或发送者（见 requires_scope）。
+
+命中高亮在返回结果时计算：截取首个命中附近的片段，并给出片段中每个命中的
+[起, 止) 字符偏移，由前端渲染，避免在服务端拼接 HTML。
+
+会话标题和联系人名称另存拼音检索键（全拼和首字母），输入 "zhangsan" 或 "zs"
+即可找到“张三”。拼音转换依赖可选的 pypinyin（uv sync --extra pinyin），
+未安装时检索键为空，只按原文匹配。
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 单次搜索最多使用的关键词数
+MAX_TERMS = 5
+# pg_trgm 索引能覆盖的最短关键词长度
+MIN_INDEXED_TERM_LENGTH = 3
+# 片段中命中位置前后保留的字符数
+SNIPPET_CONTEXT = 30
+ELLIPSIS = "…"
+
+
+def split_terms(query: str) -> List[str]:
+    """按空白拆分关键词，去重并保持顺序"""
+    terms = list(dict.fromkeys(term for term in query.split() if term))
+    return terms[:MAX_TERMS]
+
+
+def requires_scope(terms: List[str]) -> bool:
+    """全部关键词都短于 MIN_INDEXED_TERM_LENGTH 时三元组索引无法使用，搜索需限定范围"""
+    return all(len(term) < MIN_INDEXED_TERM_LENGTH for term in terms)
+
+
+def escape_like(term: str) -> str:
+    """转义 LIKE 通配符，关键词按字面匹配"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contains(column, term: str):
+    """列中包含关键词（不区分大小写）"""
+    return column.ilike(f"%{escape_like(term)}%", escape="\\")
+
+
+def starts_with(column, term: str):
+    """列以关键词开头（不区分大小写）"""
+    return column.ilike(f"{escape_like(term)}%", escape="\\")
+
+
+def contains_all(column, terms: List[str]):
+    """列中包含全部关键词（不区分大小写）"""
+    return and_(*(contains(column, term) for term in terms))
+
+
+def pinyin_enabled() -> bool:
+    return lazy_pinyin is not None
+
+
+def pinyin_keys(*names: Optional[str]) -> Optional[str]:
+    """
+    名称的拼音检索键：每个含中文的名称生成全拼和首字母，以 | 分隔
+
+    例如 ("张三", "Zhang San") -> "zhangsan|zs"；未安装 pypinyin 或没有中文名称时返回 None
+    """
+    if lazy_pinyin is None:
+        return None
+    keys = []
+    for name in names:
+        if not name or name.isascii():
+            # 纯 ASCII 的名称按原文即可匹配
+            continue
+        keys.append("".join(lazy_pinyin(name)).lower().replace(" ", ""))
+        keys.append("".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower().replace(" ", ""))
+    keys = [key for key in dict.fromkeys(keys) if key]
+    return "|".join(keys) or None
+
+
+def find_spans(text: str, terms: List[str]) -> List[Tuple[int, int]]:
+    """关键词在文本中的全部命中位置，重叠或相邻的合并"""
+    spans = sorted(
+        (match.start(), match.end())
+        for term in terms
+        for match in re.finditer(re.escape(term), text, re.IGNORECASE)
+    )
+    merged: List[Tuple[int, int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def highlight(text: str, terms: List[str], context: int = SNIPPET_CONTEXT) -> Tuple[str, List[List[int]]]:
+    """
+    截取首个命中附近的片段并标出命中位置
+
+    Returns:
+        (片段, 片段内的命中偏移 [[起, 止), ...])；片段被截断的一侧带省略号
+    """
+    spans = find_spans(text, terms)
+    if not spans:
+        return text[:context * 2], []
+
+    window_start = max(0, spans[0][0] - context)
+    window_end = min(len(text), spans[0][1] + context * 2)
+    prefix = ELLIPSIS if window_start > 0 else ""
+    suffix = ELLIPSIS if window_end < len(text) else ""
+    shift = len(prefix) - window_start
+
+    highlights = [
+        [max(start, window_start) + shift, min(end, window_end) + shift]
+        for start, end in spans
+        if start < window_end and end > window_start
+    ]
+    return prefix + text[window_start:window_end] + suffix, highlights
@@ -5,20 +5,34 @@ from datetime import datetime
 from typing import List, Optional, Dict, Any
 from sqlmodel import Session, select, and_, or_, func
 from sqlalchemy.orm import selectinload
-from sqlalchemy import text
+from sqlalchemy import case, text, tuple_
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
 
+from app.core.config import settings
 from app.core.db import engine
-from modules.wechat_accounts.models import WechatBot
+from modules.users.models import User
+from modules.wechat_accounts import change_versions
+from modules.wechat_accounts.service import WechatAccountService
 from modules.conversations.models import (
     Contact, ContactCreate, ContactUpdate, ContactPublic,
     Tag, TagCreate, TagPublic,
     Conversation, ConversationCreate, ConversationPublic,
-    Message, MessageCreate, MessagePublic,
+    Message, MessageCreate, MessagePublic, MessageCompactPublic, MessageSearchHit,
+    ContactSearchHit,
     ContactMemory, ContactMemoryCreate, ContactMemoryPublic,
-    ConversationType, MessageType, ContactMemoryContextType,
-    MessageReportRequest
+    ConversationType, ContactMemoryContextType,
+    MessageReportRequest,
+    contact_tags_table,
+    conversation_participants_table
 )
+from modules.conversations import ingest
+from modules.conversations import fanout
+from modules.conversations import search
+from modules.conversations.identity_cache import identity_caches
+from modules.conversations.live import live_hub
+from modules.conversations.pagination import decode_cursor, encode_cursor
+from modules.conversations.ingest_queue import IngestQueue
 
 
 class ConversationService:
@@ -26,106 +40,155 @@ class ConversationService:
     
     @staticmethod
     def process_message_report(data: MessageReportRequest) -> dict:
-        """处理消息上报"""
+        """处理消息上报（联系人、会话、参与者均使用 upsert，整条上报在一个事务中提交）"""
+        result = ConversationService.process_message_reports([data])
+        if result["rejected"]:
+            raise ValueError(result["rejected"][0]["reason"])
+        return {"status": "received"}
+    
+    @staticmethod
+    def process_message_reports(reports: List[MessageReportRequest]) -> dict:
+        """
+        批量处理消息上报，整批在一个事务中写入
+        
+        其他进程删除了机器人、会话或联系人时，本进程缓存的ID会触发外键约束错误：
+        此时回滚、清空身份缓存并重新解析一次，已删除机器人的上报按下标拒绝
+        """
         with Session(engine) as session:
-            # 1. 查找机器人
-            bot = session.exec(
-                select(WechatBot).where(WechatBot.wxid == data.bot_id)
-            ).first()
-            if not bot:
-                raise ValueError(f"机器人 {data.bot_id} 不存在")
-            
-            # 2. 查找或创建发送者联系人
-            sender = session.exec(
-                select(Contact).where(Contact.wxid == data.sender["id"])
-            ).first()
-            if not sender:
-                sender = Contact(
-                    wxid=data.sender["id"],
-                    wx_name=data.sender["name"]
-                )
-                session.add(sender)
+            try:
+                result = ingest.process_reports(session, reports)
                 session.commit()
-                session.refresh(sender)
-            
-            # 3. 查找或创建会话
-            conversation = session.exec(
-                select(Conversation).where(
-                    and_(
-                        Conversation.wechat_bot_id == bot.id,
-                        Conversation.external_id == data.conversation_id
-                    )
-                )
-            ).first()
-            
-            if not conversation:
-                conversation = Conversation(
-                    wechat_bot_id=bot.id,
-                    external_id=data.conversation_id,
-                    type=ConversationType(data.conversation_type),
-                    topic=data.conversation_topic
-                )
-                session.add(conversation)
+            except IntegrityError:
+                session.rollback()
+                identity_caches.invalidate_all()
+                result = ingest.process_reports(session, reports)
                 session.commit()
-                session.refresh(conversation)
-            
-            # 4. 更新会话参与者（如果是群聊）
-            if data.conversation_type == "group" and data.participants:
-                for participant_data in data.participants:
-                    participant = session.exec(
-                        select(Contact).where(Contact.wxid == participant_data["id"])
-                    ).first()
-                    if not participant:
-                        participant = Contact(
-                            wxid=participant_data["id"],
-                            wx_name=participant_data["name"]
-                        )
-                        session.add(participant)
-                        session.commit()
-                        session.refresh(participant)
-                    
-                    # 检查是否已经是参与者
-                    existing = session.exec(
-                        text("SELECT 1 FROM conversation_participants WHERE conversation_id = :conv_id AND contact_id = :contact_id"),
-                        {"conv_id": conversation.id, "contact_id": participant.id}
-                    ).first()
-                    
-                    if not existing:
-                        session.exec(
-                            text("INSERT INTO conversation_participants (conversation_id, contact_id) VALUES (:conv_id, :contact_id)"),
-                            {"conv_id": conversation.id, "contact_id": participant.id}
-                        )
-            
-            # 确保发送者在参与者列表中
-            sender_exists = session.exec(
-                text("SELECT 1 FROM conversation_participants WHERE conversation_id = :conv_id AND contact_id = :contact_id"),
-                {"conv_id": conversation.id, "contact_id": sender.id}
-            ).first()
-            
-            if not sender_exists:
-                session.exec(
-                    text("INSERT INTO conversation_participants (conversation_id, contact_id) VALUES (:conv_id, :contact_id)"),
-                    {"conv_id": conversation.id, "contact_id": sender.id}
-                )
+            return {"status": "received", **result}
+    
+    @staticmethod
+    def get_accessible_bot_ids(current_user: User, wechat_account_ids: Optional[List[int]] = None) -> List[int]:
+        """
+        获取用户可订阅的微信账号ID
+        
+        指定了账号时逐个做权限检查（无权限抛出 HTTPException 403，不存在抛出 ValueError），
+        未指定时返回用户有权访问的全部账号
+        """
+        with Session(engine) as session:
+            if not wechat_account_ids:
+                bots = WechatAccountService.get_bots_by_user(session, current_user, limit=10000)
+                return [bot.id for bot in bots]
             
-            # 5. 创建消息
-            message = Message(
-                conversation_id=conversation.id,
-                sender_id=sender.id,
-                external_message_id=data.message.get("id"),
-                type=MessageType(data.message.get("type", "text")),
-                content=data.message.get("content"),
-                created_at=datetime.fromtimestamp(data.message["timestamp"])
+            bot_ids = []
+            for bot_id in dict.fromkeys(wechat_account_ids):
+                bot = WechatAccountService.get_bot_by_id(session, bot_id, current_user)
+                if not bot:
+                    raise ValueError(f"微信账号 {bot_id} 不存在")
+                bot_ids.append(bot.id)
+            return bot_ids
+    
+    @staticmethod
+    def get_ingest_stats() -> dict:
+        """消息上报的运行指标：身份缓存命中率、异步写入队列与实时推送状态"""
+        return {
+            "identity_cache": identity_caches.stats(),
+            "queue": message_ingest_queue.stats(),
+            "live": {
+                "fanout": settings.LIVE_FANOUT,
+                "subscribers": live_hub.subscriber_count(),
+                "notifications_received": fanout.fanout_listener.received if fanout.fanout_listener else 0,
+            },
+        }
+    
+    @staticmethod
+    def _conversation_list_statement(wechat_account_id: int, query: Optional[str] = None):
+        """
+        会话列表查询（单条SQL）
+        
+        私聊头像通过关联子查询取对方联系人的头像，不再逐个会话查询；
+        按 (last_message_at DESC NULLS LAST, id DESC) 排序，与游标分页的排序键一致
+        """
+        avatar = (
+            select(Contact.avatar)
+            .join(
+                conversation_participants_table,
+                conversation_participants_table.c.contact_id == Contact.id
             )
-            session.add(message)
-            
-            # 6. 更新会话的最后消息信息
-            conversation.last_message_summary = f"{sender.wx_name}: {message.content[:50]}"
-            conversation.last_message_at = message.created_at
-            
-            session.commit()
-            
-            return {"status": "received"}
+            .where(conversation_participants_table.c.conversation_id == Conversation.id)
+            .limit(1)
+            .correlate(Conversation)
+            .scalar_subquery()
+        )
+        stmt = select(
+            Conversation,
+            case((Conversation.type == ConversationType.PRIVATE, avatar), else_=None).label("avatar")
+        ).where(
+            Conversation.wechat_bot_id == wechat_account_id
+        )
+        
+        # 应用搜索条件（标题或标题拼音包含关键词，由 idx_conversations_topic_trgm 加速）
+        if query:
+            stmt = stmt.where(or_(
+                search.contains(Conversation.topic, query),
+                search.contains(Conversation.topic_pinyin, query)
+            ))
+        
+        return stmt.order_by(Conversation.last_message_at.desc().nulls_last(), Conversation.id.desc())
+    
+    @staticmethod
+    def _conversation_page_statement(
+        wechat_account_id: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        query: Optional[str] = None
+    ):
+        """会话列表的游标分页查询，多取一条用于判断是否还有下一页"""
+        stmt = ConversationService._conversation_list_statement(wechat_account_id, query)
+        if cursor:
+            last_at, last_id = decode_cursor(cursor)
+            if last_at is None:
+                # 没有消息的会话排在最后，只按ID继续
+                stmt = stmt.where(Conversation.last_message_at.is_(None), Conversation.id < last_id)
+            else:
+                stmt = stmt.where(or_(
+                    tuple_(Conversation.last_message_at, Conversation.id) < tuple_(last_at, last_id),
+                    Conversation.last_message_at.is_(None)
+                ))
+        return stmt.limit(limit + 1)
+    
+    @staticmethod
+    def _to_conversation_public(conv: Conversation, avatar: Optional[str]) -> ConversationPublic:
+        return ConversationPublic(
+            id=conv.id,
+            wechat_bot_id=conv.wechat_bot_id,
+            external_id=conv.external_id,
+            type=conv.type,
+            topic=conv.topic,
+            avatar=avatar,
+            last_message=conv.last_message_summary,
+            last_message_summary=conv.last_message_summary,
+            last_message_at=conv.last_message_at,
+            created_at=conv.created_at,
+            updated_at=conv.updated_at
+        )
+    
+    @staticmethod
+    def _to_conversation_page(rows: List[Any], limit: int) -> Dict[str, Any]:
+        """把 _conversation_page_statement 的结果转换为分页响应"""
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        next_cursor = None
+        if has_more:
+            last_conv = rows[-1][0]
+            next_cursor = encode_cursor(last_conv.last_message_at, last_conv.id)
+        
+        return {
+            "conversations": [
+                ConversationService._to_conversation_public(conv, avatar) for conv, avatar in rows
+            ],
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
     
     @staticmethod
     def get_conversations(
@@ -135,138 +198,494 @@ class ConversationService:
     ) -> List[ConversationPublic]:
         """获取会话列表"""
         with Session(engine) as session:
-            # 构建查询
-            stmt = select(Conversation).where(
-                Conversation.wechat_bot_id == wechat_account_id
+            stmt = ConversationService._conversation_list_statement(wechat_account_id, query)
+            return [
+                ConversationService._to_conversation_public(conv, avatar)
+                for conv, avatar in session.exec(stmt).all()
+            ]
+    
+    @staticmethod
+    def get_conversations_page(
+        wechat_account_id: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        query: Optional[str] = None,
+        current_user_id: UUID = None
+    ) -> Dict[str, Any]:
+        """
+        按游标分页获取会话列表
+        
+        Args:
+            limit: 每页条数
+            cursor: 上一页返回的 next_cursor，为空时取第一页
+        
+        Returns:
+            {"conversations": [...], "next_cursor": 下一页游标或None, "has_more": 是否还有更多}
+        """
+        with Session(engine) as session:
+            stmt = ConversationService._conversation_page_statement(wechat_account_id, limit, cursor, query)
+            return ConversationService._to_conversation_page(session.exec(stmt).all(), limit)
+    
+    @staticmethod
+    def _sender_tags_statement(contact_ids: List[int]):
+        """一条 IN 查询取回一组联系人的标签"""
+        return (
+            select(contact_tags_table.c.contact_id, Tag)
+            .join(Tag, Tag.id == contact_tags_table.c.tag_id)
+            .where(contact_tags_table.c.contact_id.in_(contact_ids))
+            .order_by(contact_tags_table.c.contact_id, Tag.id)
+        )
+    
+    @staticmethod
+    def _build_senders(contacts: Dict[int, Contact], tag_rows: List[Any]) -> Dict[int, ContactPublic]:
+        """由联系人和 _sender_tags_statement 的结果构建 联系人ID -> ContactPublic"""
+        tags_by_contact: Dict[int, List[TagPublic]] = {contact_id: [] for contact_id in contacts}
+        for contact_id, tag in tag_rows:
+            tags_by_contact[contact_id].append(TagPublic(
+                id=tag.id,
+                name=tag.name,
+                owner_id=tag.owner_id,
+                created_at=tag.created_at,
+                updated_at=tag.updated_at
+            ))
+        
+        return {
+            contact_id: ContactPublic(
+                id=contact.id,
+                wxid=contact.wxid,
+                wx_name=contact.wx_name,
+                remark_name=contact.remark_name,
+                avatar=contact.avatar,
+                group_name=contact.group_name,
+                notes=contact.notes,
+                tags=tags_by_contact[contact_id],
+                created_at=contact.created_at,
+                updated_at=contact.updated_at
             )
-            
-            # 应用搜索条件
-            if query:
-                stmt = stmt.where(
-                    Conversation.topic.ilike(f"%{query}%")
-                )
-            
-            # 按最后消息时间排序
-            stmt = stmt.order_by(Conversation.last_message_at.desc())
-            
-            conversations = session.exec(stmt).all()
-            
-            # 转换为响应模型
-            result = []
-            for conv in conversations:
-                # 获取会话头像（私聊用对方头像，群聊暂时为空）
-                avatar = None
-                if conv.type == ConversationType.PRIVATE:
-                    # 获取私聊的参与者
-                    participant = session.exec(
-                        text("""
-                            SELECT c.* FROM contacts c 
-                            JOIN conversation_participants cp ON c.id = cp.contact_id 
-                            WHERE cp.conversation_id = :conv_id 
-                            LIMIT 1
-                        """),
-                        {"conv_id": conv.id}
-                    ).first()
-                    if participant:
-                        avatar = participant.avatar
-                
-                result.append(ConversationPublic(
-                    id=conv.id,
-                    wechat_bot_id=conv.wechat_bot_id,
-                    external_id=conv.external_id,
-                    type=conv.type,
-                    topic=conv.topic,
-                    avatar=avatar,
-                    last_message=conv.last_message_summary,
-                    last_message_summary=conv.last_message_summary,
-                    last_message_at=conv.last_message_at,
-                    created_at=conv.created_at,
-                    updated_at=conv.updated_at
-                ))
-            
-            return result
+            for contact_id, contact in contacts.items()
+        }
+    
+    @staticmethod
+    def _hydrate_senders(session: Session, senders: List[Contact]) -> Dict[int, ContactPublic]:
+        """
+        为一页消息的发送者构建响应模型
+        
+        每个不同的发送者只构建一次，所有发送者的标签用一条 IN 查询取回
+        
+        Returns:
+            联系人ID -> ContactPublic
+        """
+        contacts = {contact.id: contact for contact in senders}
+        if not contacts:
+            return {}
+        tag_rows = session.exec(ConversationService._sender_tags_statement(list(contacts))).all()
+        return ConversationService._build_senders(contacts, tag_rows)
+    
+    @staticmethod
+    def _build_message_page(
+        messages: List[Message],
+        senders: Dict[int, ContactPublic],
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """
+        把消息转换为响应模型，保持传入顺序
+        
+        Returns:
+            compact 为 False：{"messages": [MessagePublic]}，每条消息内嵌完整的发送者
+            compact 为 True：{"messages": [MessageCompactPublic], "senders": {联系人ID: ContactPublic}}
+        """
+        if compact:
+            return {
+                "messages": [
+                    MessageCompactPublic(
+                        id=msg.id,
+                        conversation_id=msg.conversation_id,
+                        sender_id=msg.sender_id,
+                        external_message_id=msg.external_message_id,
+                        type=msg.type,
+                        content=msg.content,
+                        created_at=msg.created_at
+                    )
+                    for msg in messages
+                ],
+                "senders": senders
+            }
+        return {"messages": [
+            MessagePublic(
+                id=msg.id,
+                conversation_id=msg.conversation_id,
+                sender_id=msg.sender_id,
+                sender=senders[msg.sender_id],
+                external_message_id=msg.external_message_id,
+                type=msg.type,
+                content=msg.content,
+                created_at=msg.created_at
+            )
+            for msg in messages
+        ]}
+    
+    @staticmethod
+    def _to_message_page(session: Session, messages: List[Message], compact: bool = False) -> Dict[str, Any]:
+        """把消息（已预加载发送者）转换为响应模型，格式见 _build_message_page"""
+        senders = ConversationService._hydrate_senders(session, [msg.sender for msg in messages])
+        return ConversationService._build_message_page(messages, senders, compact)
+    
+    @staticmethod
+    def _message_count_statement(conversation_id: int):
+        return select(func.count(Message.id)).where(Message.conversation_id == conversation_id)
+    
+    @staticmethod
+    def _message_offset_statement(conversation_id: int, offset: int, page_size: int):
+        """按页码分页的消息查询（包含发送者信息），最新的在前"""
+        return (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .options(selectinload(Message.sender))
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .offset(offset)
+            .limit(page_size)
+        )
+    
+    @staticmethod
+    def _message_anchor_statement(conversation_id: int, anchor_id: int):
+        """游标消息的排序键 (created_at, id)"""
+        return select(Message.created_at, Message.id).where(
+            Message.id == anchor_id,
+            Message.conversation_id == conversation_id
+        )
+    
+    @staticmethod
+    def _message_keyset_statement(
+        conversation_id: int,
+        anchor: Optional[Any],
+        after: bool,
+        limit: int
+    ):
+        """
+        按 (created_at, id) 游标的消息查询，多取一条用于判断 has_more
+        
+        after 为 True 时取游标之后的消息（正序），否则取游标之前的消息（倒序）；
+        anchor 为 None 时不加游标条件
+        """
+        stmt = (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .options(selectinload(Message.sender))
+        )
+        if anchor is not None:
+            if after:
+                stmt = stmt.where(tuple_(Message.created_at, Message.id) > tuple_(*anchor))
+            else:
+                stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(*anchor))
+        
+        if after:
+            stmt = stmt.order_by(Message.created_at.asc(), Message.id.asc())
+        else:
+            stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+        return stmt.limit(limit + 1)
+    
+    @staticmethod
+    def _trim_keyset_page(messages: List[Message], limit: int, after: bool):
+        """去掉多取的一条并统一为时间正序，返回 (消息列表, has_more)"""
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if not after:
+            messages.reverse()
+        return messages, has_more
     
     @staticmethod
     def get_messages(
         conversation_id: int,
         page: int = 1,
         page_size: int = 20,
-        current_user_id: UUID = None
+        current_user_id: UUID = None,
+        compact: bool = False
     ) -> Dict[str, Any]:
-        """获取会话消息列表"""
+        """获取会话消息列表（按页码分页；compact 见 _build_message_page）"""
         with Session(engine) as session:
             # 计算偏移量
             offset = (page - 1) * page_size
             
             # 查询消息总数
-            total = session.exec(
-                select(func.count(Message.id)).where(
-                    Message.conversation_id == conversation_id
-                )
-            ).one()
+            total = session.exec(ConversationService._message_count_statement(conversation_id)).one()
             
-            # 查询消息列表（包含发送者信息）
-            stmt = (
-                select(Message)
-                .where(Message.conversation_id == conversation_id)
-                .options(selectinload(Message.sender))
-                .order_by(Message.created_at.desc())
-                .offset(offset)
-                .limit(page_size)
-            )
+            messages = session.exec(
+                ConversationService._message_offset_statement(conversation_id, offset, page_size)
+            ).all()
             
-            messages = session.exec(stmt).all()
+            return {
+                # 反转顺序，让最新的消息在底部
+                **ConversationService._to_message_page(session, list(reversed(messages)), compact),
+                "total": total,
+                "has_more": offset + len(messages) < total
+            }
+    
+    @staticmethod
+    def get_messages_keyset(
+        conversation_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 20,
+        current_user_id: UUID = None,
+        compact: bool = False
+    ) -> Dict[str, Any]:
+        """
+        按消息ID游标获取会话消息（不统计总数，翻页代价与所在位置无关；compact 见 _build_message_page）
+        
+        按 (created_at, id) 排序：
+        - before_id：该消息之前（更早）的 limit 条，has_more 表示是否还有更早的消息
+        - after_id：该消息之后（更新）的 limit 条，has_more 表示是否还有更新的消息
+        - 都不传：最新的 limit 条
+        返回的消息始终按时间正序排列
+        """
+        if before_id is not None and after_id is not None:
+            raise ValueError("before_id 与 after_id 不能同时指定")
+        
+        with Session(engine) as session:
+            anchor = None
+            anchor_id = before_id if before_id is not None else after_id
+            if anchor_id is not None:
+                anchor = session.exec(
+                    ConversationService._message_anchor_statement(conversation_id, anchor_id)
+                ).first()
+                if not anchor:
+                    raise ValueError("消息不存在")
             
-            # 转换为响应模型
-            message_list = []
-            for msg in reversed(messages):  # 反转顺序，让最新的消息在底部
-                # 获取发送者的标签
-                sender_tags = session.exec(
-                    text("""
-                        SELECT t.* FROM tags t 
-                        JOIN contact_tags ct ON t.id = ct.tag_id 
-                        WHERE ct.contact_id = :contact_id
-                    """),
-                    {"contact_id": msg.sender.id}
-                ).all()
-                
-                tags_public = [TagPublic(
-                    id=tag.id,
-                    name=tag.name,
-                    owner_id=tag.owner_id,
-                    created_at=tag.created_at,
-                    updated_at=tag.updated_at
-                ) for tag in sender_tags]
-                
-                sender_public = ContactPublic(
-                    id=msg.sender.id,
-                    wxid=msg.sender.wxid,
-                    wx_name=msg.sender.wx_name,
-                    remark_name=msg.sender.remark_name,
-                    avatar=msg.sender.avatar,
-                    group_name=msg.sender.group_name,
-                    notes=msg.sender.notes,
-                    tags=tags_public,
-                    created_at=msg.sender.created_at,
-                    updated_at=msg.sender.updated_at
-                )
-                
-                message_list.append(MessagePublic(
-                    id=msg.id,
-                    conversation_id=msg.conversation_id,
-                    sender_id=msg.sender_id,
-                    sender=sender_public,
-                    external_message_id=msg.external_message_id,
-                    type=msg.type,
-                    content=msg.content,
-                    created_at=msg.created_at
-                ))
+            after = after_id is not None
+            messages, has_more = ConversationService._trim_keyset_page(
+                list(session.exec(
+                    ConversationService._message_keyset_statement(conversation_id, anchor, after, limit)
+                ).all()),
+                limit,
+                after
+            )
             
             return {
-                "messages": message_list,
-                "total": total
+                **ConversationService._to_message_page(session, messages, compact),
+                "has_more": has_more
             }
     
+    @staticmethod
+    def _contact_search_statement(wechat_account_id: int, query: str, limit: int):
+        """
+        搜索机器人会话中出现过的联系人（备注名、昵称或其拼音包含关键词）
+        
+        名称以关键词开头的排在前面，其次名称较短的；同时带出该联系人与机器人的私聊会话ID
+        """
+        participants = conversation_participants_table
+        private_conversation = (
+            select(Conversation.id)
+            .join(participants, participants.c.conversation_id == Conversation.id)
+            .where(
+                participants.c.contact_id == Contact.id,
+                Conversation.wechat_bot_id == wechat_account_id,
+                Conversation.type == ConversationType.PRIVATE
+            )
+            .limit(1)
+            .correlate(Contact)
+            .scalar_subquery()
+        )
+        in_bot_conversations = (
+            select(participants.c.contact_id)
+            .join(Conversation, Conversation.id == participants.c.conversation_id)
+            .where(
+                participants.c.contact_id == Contact.id,
+                Conversation.wechat_bot_id == wechat_account_id
+            )
+            .correlate(Contact)
+            .exists()
+        )
+        prefix_rank = case(
+            (or_(search.starts_with(Contact.remark_name, query), search.starts_with(Contact.wx_name, query)), 0),
+            else_=1
+        )
+        return (
+            select(Contact, private_conversation.label("conversation_id"))
+            .where(
+                or_(
+                    search.contains(Contact.remark_name, query),
+                    search.contains(Contact.wx_name, query),
+                    search.contains(Contact.name_pinyin, query)
+                ),
+                in_bot_conversations
+            )
+            .order_by(
+                prefix_rank,
+                func.length(func.coalesce(Contact.remark_name, Contact.wx_name)),
+                Contact.id
+            )
+            .limit(limit)
+        )
+    
+    @staticmethod
+    def _to_contact_search_hit(contact: Contact, conversation_id: Optional[int]) -> ContactSearchHit:
+        return ContactSearchHit(
+            id=contact.id,
+            wxid=contact.wxid,
+            wx_name=contact.wx_name,
+            remark_name=contact.remark_name,
+            avatar=contact.avatar,
+            conversation_id=conversation_id
+        )
+    
+    @staticmethod
+    def search_conversations(wechat_account_id: int, query: str, limit: int = 10) -> Dict[str, Any]:
+        """
+        边输入边搜索：按标题匹配会话，按备注名/昵称匹配联系人（均支持拼音和首字母）
+        
+        Returns:
+            {"conversations": [ConversationPublic], "contacts": [ContactSearchHit]}，各最多 limit 条
+        """
+        query = query.strip()
+        if not query:
+            raise ValueError("搜索关键词不能为空")
+        
+        with Session(engine) as session:
+            conversation_rows = session.exec(
+                ConversationService._conversation_list_statement(wechat_account_id, query).limit(limit)
+            ).all()
+            contact_rows = session.exec(
+                ConversationService._contact_search_statement(wechat_account_id, query, limit)
+            ).all()
+            return {
+                "conversations": [
+                    ConversationService._to_conversation_public(conv, avatar) for conv, avatar in conversation_rows
+                ],
+                "contacts": [
+                    ConversationService._to_contact_search_hit(contact, conversation_id)
+                    for contact, conversation_id in contact_rows
+                ]
+            }
+    
+    @staticmethod
+    def _message_search_terms(
+        query: str,
+        bot_ids: List[int],
+        conversation_id: Optional[int] = None,
+        sender_id: Optional[int] = None
+    ) -> List[str]:
+        """
+        拆分并校验消息搜索关键词
+        
+        关键词都不足 3 个字时 pg_trgm 索引用不上，只允许在单个机器人、会话或发送者范围内搜索
+        """
+        terms = search.split_terms(query)
+        if not terms:
+            raise ValueError("搜索关键词不能为空")
+        scoped = conversation_id is not None or sender_id is not None or len(bot_ids) == 1
+        if search.requires_scope(terms) and not scoped:
+            raise ValueError(
+                f"关键词至少 {search.MIN_INDEXED_TERM_LENGTH} 个字，或先选择机器人/会话再搜索更短的关键词"
+            )
+        return terms
+    
+    @staticmethod
+    def _message_search_statement(
+        bot_ids: List[int],
+        terms: List[str],
+        limit: int,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[int] = None,
+        sender_id: Optional[int] = None,
+        start_at: Optional[datetime] = None,
+        end_at: Optional[datetime] = None
+    ):
+        """
+        消息全文搜索查询，按 (created_at, id) 倒序游标分页，多取一条用于判断 has_more
+        
+        关键词条件由 idx_messages_content_trgm（pg_trgm）加速
+        """
+        stmt = (
+            select(
+                Message.id,
+                Message.conversation_id,
+                Message.sender_id,
+                Message.type,
+                Message.content,
+                Message.created_at,
+                Conversation.wechat_bot_id,
+                Conversation.topic,
+                Contact.remark_name,
+                Contact.wx_name
+            )
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .join(Contact, Contact.id == Message.sender_id)
+            .where(
+                Conversation.wechat_bot_id.in_(bot_ids),
+                search.contains_all(Message.content, terms)
+            )
+        )
+        if conversation_id is not None:
+            stmt = stmt.where(Message.conversation_id == conversation_id)
+        if sender_id is not None:
+            stmt = stmt.where(Message.sender_id == sender_id)
+        if start_at is not None:
+            stmt = stmt.where(Message.created_at >= start_at)
+        if end_at is not None:
+            stmt = stmt.where(Message.created_at < end_at)
+        if cursor:
+            last_at, last_id = decode_cursor(cursor)
+            stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(last_at, last_id))
+        
+        return stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+    
+    @staticmethod
+    def _to_search_page(rows: List[Any], terms: List[str], limit: int) -> Dict[str, Any]:
+        """把 _message_search_statement 的结果转换为带高亮片段的分页响应"""
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        hits = []
+        for row in rows:
+            snippet, highlights = search.highlight(row.content or "", terms)
+            hits.append(MessageSearchHit(
+                id=row.id,
+                conversation_id=row.conversation_id,
+                wechat_bot_id=row.wechat_bot_id,
+                conversation_topic=row.topic,
+                sender_id=row.sender_id,
+                sender_name=row.remark_name or row.wx_name,
+                type=row.type,
+                created_at=row.created_at,
+                snippet=snippet,
+                highlights=highlights
+            ))
+        
+        return {
+            "hits": hits,
+            "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+            "has_more": has_more
+        }
+    
+    @staticmethod
+    def search_messages(
+        bot_ids: List[int],
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[int] = None,
+        sender_id: Optional[int] = None,
+        start_at: Optional[datetime] = None,
+        end_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        在指定机器人的消息中搜索关键词（空格分隔的多个关键词需全部命中）
+        
+        Args:
+            bot_ids: 可搜索的机器人ID（调用方负责权限检查）
+            start_at / end_at: 消息时间范围 [start_at, end_at)
+        
+        Returns:
+            {"hits": [MessageSearchHit], "next_cursor": 下一页游标或None, "has_more": 是否还有更多}
+        """
+        terms = ConversationService._message_search_terms(query, bot_ids, conversation_id, sender_id)
+        
+        with Session(engine) as session:
+            stmt = ConversationService._message_search_statement(
+                bot_ids, terms, limit, cursor, conversation_id, sender_id, start_at, end_at
+            )
+            return ConversationService._to_search_page(session.exec(stmt).all(), terms, limit)
+    
     @staticmethod
     def get_conversation_details(
         conversation_id: int,
@@ -404,8 +823,21 @@ class ConversationService:
                 contact.wx_name = update_data.wx_name
             if update_data.remark_name is not None:
                 contact.remark_name = update_data.remark_name
+            if update_data.wx_name is not None or update_data.remark_name is not None:
+                contact.name_pinyin = search.pinyin_keys(contact.remark_name, contact.wx_name)
             if update_data.avatar is not None:
                 contact.avatar = update_data.avatar
+                # 会话列表中显示私聊对方的头像
+                bot_ids = session.exec(
+                    select(Conversation.wechat_bot_id)
+                    .join(
+                        conversation_participants_table,
+                        conversation_participants_table.c.conversation_id == Conversation.id
+                    )
+                    .where(conversation_participants_table.c.contact_id == contact.id)
+                    .distinct()
+                ).all()
+                change_versions.bump(session, bot_ids, change_versions.CONVERSATIONS)
             if update_data.group_name is not None:
                 contact.group_name = update_data.group_name
             if update_data.notes is not None:
@@ -433,6 +865,7 @@ class ConversationService:
             contact.updated_at = datetime.utcnow()
             session.commit()
             session.refresh(contact)
+            identity_caches.invalidate_contact(contact.wxid)
             
             # 获取更新后的标签
             contact_tags = session.exec(
@@ -607,3 +1040,12 @@ class ConversationService:
                 )
                 for tag in tags
             ]
+
+
+# 异步上报模式（MESSAGE_INGEST_MODE=queue）使用的进程内写入队列
+message_ingest_queue = IngestQueue(
+    writer=ConversationService.process_message_reports,
+    max_size=settings.MESSAGE_INGEST_QUEUE_SIZE,
+    batch_size=settings.MESSAGE_INGEST_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_INGEST_FLUSH_INTERVAL,
+)
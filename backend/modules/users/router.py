@@ -7,6 +7,7 @@ from typing import Any
 from fastapi import APIRouter, HTTPException
 
 from app.core.config import settings
+from app.core.responses import FastJSONResponse
 from app.utils import generate_new_account_email, send_email
 from modules.auth.deps import SessionDep, CurrentUser, AdminUser
 from modules.auth.models import Message
@@ -20,7 +21,7 @@ from modules.users.service import (
     update_user, delete_user, check_user_permissions
 )
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], default_response_class=FastJSONResponse)
 
 
 @router.get("/", response_model=UsersPublic)
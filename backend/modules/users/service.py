@@ -5,7 +5,9 @@ from typing import Any
 from sqlmodel import Session, select, func, delete
 
 from modules.auth.service import get_password_hash
+from modules.conversations.identity_cache import identity_caches
 from modules.users.models import User, UserCreate, UserUpdate, UserRole
+from modules.wechat_accounts import change_versions
 from modules.wechat_accounts.models import (
     WechatBot, BotConfig, BotMonitoredChat, BotKnowledgeBase, 
     BotAlertRecipient, BotEscalationRecipient
@@ -33,6 +35,10 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
         extra_data["hashed_password"] = hashed_password
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
+    if "full_name" in user_data or "username" in user_data:
+        # 机器人详情中带有所有者名称
+        bot_ids = session.exec(select(WechatBot.id).where(WechatBot.owner_id == db_user.id)).all()
+        change_versions.bump(session, bot_ids, change_versions.CONFIG)
     session.commit()
     session.refresh(db_user)
     return db_user
@@ -119,6 +125,10 @@ def delete_user(*, session: Session, user: User) -> None:
     session.delete(user)
     session.commit()
 
+    # 5. 清除已删除机器人的上报身份缓存
+    for bot in user_bots:
+        identity_caches.invalidate_bot(wxid=bot.wxid, bot_id=bot.id)
+
 
 def check_user_permissions(
     *, 
@@ -0,0 +1,63 @@
+"""
+机器人数据版本与条件请求
+
+每个机器人有两个单调递增的版本号：会话数据版本（消息写入、联系人头像变化）
+和配置版本（基本信息、配置、登录状态变化）。版本号与数据在同一事务中递增，
+读接口用版本号生成 ETag，客户端带 If-None-Match 且版本未变时直接返回 304，
+只需一次主键查询，不再执行完整的列表/配置查询。
+"""
+import hashlib
+from typing import Iterable, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+
+from .models import BotChangeVersion
+
+CONVERSATIONS = "conversations_version"
+CONFIG = "config_version"
+
+
+def bump(session: Session, bot_ids: Iterable[int], scope: str) -> None:
+    """在当前事务中递增机器人的版本号（按ID排序加锁，避免并发写入互相死锁）"""
+    ids = sorted(set(bot_ids))
+    if not ids:
+        return
+    column = BotChangeVersion.__table__.c[scope]
+    session.exec(
+        pg_insert(BotChangeVersion)
+        .values([{"bot_id": bot_id, scope: 1} for bot_id in ids])
+        .on_conflict_do_update(index_elements=["bot_id"], set_={scope: column + 1})
+    )
+
+
+def version_statement(bot_id: int, scope: str):
+    return select(BotChangeVersion.__table__.c[scope]).where(BotChangeVersion.bot_id == bot_id)
+
+
+def get_version(session: Session, bot_id: int, scope: str) -> int:
+    """当前版本号，从未变化过的机器人为 0"""
+    return session.exec(version_statement(bot_id, scope)).first() or 0
+
+
+def make_etag(scope: str, bot_id: int, version: int, *variant: object) -> str:
+    """
+    生成弱 ETag
+
+    variant 为影响响应内容的请求参数（如搜索词、分页游标），不同参数得到不同的 ETag
+    """
+    tag = f"{scope.split('_')[0]}-{bot_id}-{version}"
+    if variant:
+        tag += "-" + hashlib.sha1(repr(variant).encode("utf-8")).hexdigest()[:12]
+    return f'W/"{tag}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（弱比较，支持多个值和 *）"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.removeprefix("W/") == opaque for candidate in candidates)
@@ -274,6 +274,19 @@ class BotEscalationRecipient(SQLModel, table=True):
     created_at: datetime = SQLField(default_factory=datetime.utcnow)
 
 
+class BotChangeVersion(SQLModel, table=True):
+    """机器人数据版本表：会话数据或配置变化时递增，用于生成 ETag"""
+    __tablename__ = "bot_change_versions"
+    
+    bot_id: int = SQLField(
+        sa_column=Column(BigInteger, ForeignKey("wechat_bots.id", ondelete="CASCADE"), primary_key=True)
+    )
+    # 会话列表相关数据（消息写入、联系人头像等）的版本
+    conversations_version: int = SQLField(default=0, sa_column=Column(BigInteger, nullable=False, default=0))
+    # 机器人基本信息与配置的版本
+    config_version: int = SQLField(default=0, sa_column=Column(BigInteger, nullable=False, default=0))
+
+
 # 请求/响应模型
 class WechatBotCreate(BaseModel):
     """创建微信机器人请求模型"""
@@ -1,12 +1,13 @@
 """
 微信账号管理模块的路由
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlmodel import Session, select
 from sqlalchemy import func
 
 from app.api.deps import get_current_active_user, SessionDep
+from app.core.responses import FastJSONResponse
 from modules.users.models import User
 from .models import (
     WechatBotCreate, WechatBotUpdate, WechatBotPublic, WechatBotsPublic,
@@ -14,10 +15,12 @@ from .models import (
     LoginResponse, OperationResponse, WechatBot
 )
 from .service import WechatAccountService
+from . import change_versions
 
 router = APIRouter(
     prefix="/wechat-accounts",
     tags=["wechat-accounts"],
+    default_response_class=FastJSONResponse,
 )
 
 
@@ -91,11 +94,17 @@ def get_wechat_account(
     *,
     db: SessionDep,
     current_user: User = Depends(get_current_active_user),
-    bot_id: int
+    bot_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     获取单个机器人完整配置
+    
+    响应带 ETag（随机器人配置版本变化），请求带 If-None-Match 且配置未变时返回 304
     """
+    # 先读版本再读数据：返回的数据不会比 ETag 对应的版本旧
+    version = change_versions.get_version(db, bot_id, change_versions.CONFIG)
     bot = WechatAccountService.get_bot_by_id(db, bot_id, current_user)
     if not bot:
         raise HTTPException(
@@ -103,6 +112,11 @@ def get_wechat_account(
             detail="机器人不存在"
         )
     
+    etag = change_versions.make_etag(change_versions.CONFIG, bot_id, version)
+    if change_versions.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
     # 获取配置
     config = WechatAccountService.get_bot_config(db, bot_id, current_user)
     
@@ -259,6 +273,7 @@ def logout_wechat_account(
     # 更新状态
     bot.status = "logged_out"
     db.add(bot)
+    change_versions.bump(db, [bot.id], change_versions.CONFIG)
     db.commit()
     
     return OperationResponse(
@@ -8,6 +8,8 @@ from fastapi import HTTPException, status
 
 from modules.users.models import User
 from modules.auth.service import get_password_hash, verify_password
+from modules.conversations.identity_cache import identity_caches
+from . import change_versions
 from .models import (
     WechatBot, WechatBotCreate, WechatBotUpdate,
     BotConfig, BotConfigUpdate,
@@ -156,6 +158,7 @@ class WechatAccountService:
         if not bot:
             return None
         
+        old_wxid = bot.wxid
         update_data = bot_update.dict(exclude_unset=True)
         # 处理密码更新
         if 'password' in update_data and update_data['password']:
@@ -166,8 +169,11 @@ class WechatAccountService:
             setattr(bot, key, value)
         
         db.add(bot)
+        change_versions.bump(db, [bot.id], change_versions.CONFIG)
         db.commit()
         db.refresh(bot)
+        if bot.wxid != old_wxid:
+            identity_caches.invalidate_bot(wxid=old_wxid)
         return bot
     
     @staticmethod
@@ -181,8 +187,10 @@ class WechatAccountService:
         if not bot:
             return False
         
+        bot_wxid = bot.wxid
         db.delete(bot)
         db.commit()
+        identity_caches.invalidate_bot(wxid=bot_wxid, bot_id=bot_id)
         return True
     
     @staticmethod
@@ -228,7 +236,7 @@ class WechatAccountService:
             setattr(config, key, value)
         
         db.add(config)
-        db.commit()
+        db.flush()
         
         # 更新关联数据
         if config_update.monitored_chats is not None:
@@ -243,6 +251,9 @@ class WechatAccountService:
         if config_update.escalation_recipients is not None:
             WechatAccountService._update_escalation_recipients(db, bot_id, config_update.escalation_recipients)
         
+        # 配置、关联数据与版本号在同一事务中提交，读到新版本号的请求一定能读到新配置
+        change_versions.bump(db, [bot_id], change_versions.CONFIG)
+        db.commit()
         db.refresh(config)
         return config
     
@@ -264,7 +275,7 @@ class WechatAccountService:
             )
             db.add(chat)
         
-        db.commit()
+        db.flush()
     
     @staticmethod
     def _update_knowledge_bases(db: Session, bot_id: int, kbs: List[KnowledgeBaseInfo]):
@@ -284,7 +295,7 @@ class WechatAccountService:
             )
             db.add(kb)
         
-        db.commit()
+        db.flush()
     
     @staticmethod
     def _update_alert_recipients(db: Session, bot_id: int, recipients: List[RecipientInfo]):
@@ -303,7 +314,7 @@ class WechatAccountService:
             )
             db.add(recipient)
         
-        db.commit()
+        db.flush()
     
     @staticmethod
     def _update_escalation_recipients(db: Session, bot_id: int, recipients: List[RecipientInfo]):
@@ -322,7 +333,7 @@ class WechatAccountService:
             )
             db.add(recipient)
         
-        db.commit()
+        db.flush()
     
     @staticmethod
     def get_bot_monitored_chats(db: Session, bot_id: int) -> List[MonitoredChatInfo]:
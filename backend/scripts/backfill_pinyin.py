@@ -0,0 +1,62 @@
+"""
+回填会话标题和联系人名称的拼音检索键
+
+新写入的会话和联系人由应用生成拼音检索键；安装 pypinyin 之前已存在的数据
+用本脚本按主键分批回填。可重复执行。
+
+用法（在 backend 目录下）:
+    python -m scripts.backfill_pinyin --batch-size 1000
+"""
+import argparse
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from modules.conversations import search
+from modules.conversations.models import Contact, Conversation
+
+
+def backfill(model, columns, key_column, batch_size):
+    """按主键分批读取名称列，计算拼音检索键并批量更新，返回更新的行数"""
+    updated = 0
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(model.id, key_column, *columns)
+                .where(model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            last_id = rows[-1][0]
+
+            params = []
+            for row_id, current, *names in rows:
+                keys = search.pinyin_keys(*names)
+                if keys != current:
+                    params.append({"id": row_id, key_column.key: keys})
+            if params:
+                session.exec(update(model), params=params)
+                session.commit()
+                updated += len(params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填拼音检索键")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的行数")
+    args = parser.parse_args()
+
+    if not search.pinyin_enabled():
+        raise SystemExit("未安装 pypinyin，请先执行 uv sync --extra pinyin")
+
+    conversations = backfill(Conversation, [Conversation.topic], Conversation.topic_pinyin, args.batch_size)
+    contacts = backfill(Contact, [Contact.remark_name, Contact.wx_name], Contact.name_pinyin, args.batch_size)
+    print(f"会话: 更新 {conversations} 行")
+    print(f"联系人: 更新 {contacts} 行")
+
+
+if __name__ == "__main__":
+    main()
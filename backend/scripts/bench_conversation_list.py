@@ -0,0 +1,94 @@
+"""
+会话列表查询次数与耗时基准
+
+向指定机器人写入不同数量的私聊会话，统计获取会话列表执行的SQL条数和耗时，
+验证查询次数不随会话数量增长。
+
+用法（在 backend 目录下）:
+    python -m scripts.bench_conversation_list --bot-wxid test_bot_001 --sizes 10 100 1000
+"""
+import argparse
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from modules.conversations import ingest
+from modules.conversations.models import MessageReportRequest
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts.models import WechatBot
+
+
+@contextmanager
+def count_statements():
+    """统计代码块内执行的SQL条数"""
+    counter = {"statements": 0}
+
+    def before_cursor_execute(*_):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed_private_conversations(bot_wxid, run_id, start, count):
+    """写入 count 个私聊会话，每个会话一条消息"""
+    reports = [
+        MessageReportRequest(
+            bot_id=bot_wxid,
+            conversation_id=f"wxid_bench_{run_id}_{i}",
+            conversation_topic=f"压测好友{i}",
+            conversation_type="private",
+            sender={"id": f"wxid_bench_{run_id}_{i}", "name": f"压测好友{i}"},
+            message={"id": f"bench_{run_id}_{i}", "type": "text", "content": "你好", "timestamp": int(time.time()) + i},
+        )
+        for i in range(start, start + count)
+    ]
+    with Session(engine) as session:
+        for offset in range(0, len(reports), 500):
+            ingest.process_reports(session, reports[offset:offset + 500])
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话列表查询次数与耗时基准")
+    parser.add_argument("--bot-wxid", default="test_bot_001", help="数据库中已存在的机器人wxid")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="逐步增加到的会话数量")
+    parser.add_argument("--page-size", type=int, default=50, help="游标分页每页条数")
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        bot = session.exec(select(WechatBot).where(WechatBot.wxid == args.bot_wxid)).first()
+    if not bot:
+        raise SystemExit(f"机器人 {args.bot_wxid} 不存在")
+
+    run_id = int(time.time())
+    seeded = 0
+    print(f"{'新增会话':>8} {'列表条数':>8} {'全量SQL':>8} {'全量耗时':>10} {'分页SQL':>8} {'分页耗时':>10}")
+    for size in sorted(args.sizes):
+        seed_private_conversations(args.bot_wxid, run_id, seeded, size - seeded)
+        seeded = size
+
+        with count_statements() as full:
+            start = time.perf_counter()
+            conversations = ConversationService.get_conversations(bot.id)
+            full_elapsed = time.perf_counter() - start
+
+        with count_statements() as page:
+            start = time.perf_counter()
+            ConversationService.get_conversations_page(bot.id, limit=args.page_size)
+            page_elapsed = time.perf_counter() - start
+
+        print(
+            f"{size:>8} {len(conversations):>8} {full['statements']:>8} {full_elapsed * 1000:>8.1f}ms"
+            f" {page['statements']:>8} {page_elapsed * 1000:>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+消息上报吞吐量对比脚本：逐条上报 vs 批量上报
+
+用法:
+    python scripts/bench_message_report.py --token <AUTH_TOKEN> --bot-wxid test_bot_001 --count 500
+"""
+import argparse
+import random
+import time
+
+import requests
+
+API_BASE_URL = "http://localhost:8000/api/v1/conversations"
+
+
+def build_reports(bot_wxid, count, group_size, run_id):
+    """构造一个活跃群聊中的连续消息"""
+    members = [{"id": f"wxid_bench_{run_id}_{i}", "name": f"成员{i}"} for i in range(group_size)]
+    reports = []
+    for i in range(count):
+        sender = random.choice(members)
+        reports.append({
+            "bot_id": bot_wxid,
+            "conversation_id": f"bench_{run_id}@chatroom",
+            "conversation_topic": f"压测群{run_id}",
+            "conversation_type": "group",
+            "sender": sender,
+            "message": {
+                "id": f"bench_{run_id}_{i}",
+                "type": "text",
+                "content": f"压测消息 {i}",
+                "timestamp": int(time.time()),
+            },
+            "participants": members,
+        })
+    return reports
+
+
+def run_single(session, headers, reports):
+    start = time.perf_counter()
+    for report in reports:
+        result = session.post(f"{API_BASE_URL}/internal/message/report", json=report, headers=headers).json()
+        assert result["error"] == 0, result["message"]
+    return time.perf_counter() - start
+
+
+def run_batch(session, headers, reports, batch_size):
+    start = time.perf_counter()
+    for offset in range(0, len(reports), batch_size):
+        body = {"reports": reports[offset:offset + batch_size]}
+        result = session.post(f"{API_BASE_URL}/internal/message/report/batch", json=body, headers=headers).json()
+        assert result["error"] == 0, result["message"]
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息上报吞吐量对比")
+    parser.add_argument("--token", required=True, help="认证令牌")
+    parser.add_argument("--bot-wxid", default="test_bot_001", help="数据库中已存在的机器人wxid")
+    parser.add_argument("--count", type=int, default=500, help="每种方式上报的消息数")
+    parser.add_argument("--group-size", type=int, default=50, help="群成员数量")
+    parser.add_argument("--batch-size", type=int, default=100, help="批量上报每批条数")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"}
+    run_id = int(time.time())
+    with requests.Session() as session:
+        single = run_single(session, headers, build_reports(args.bot_wxid, args.count, args.group_size, f"{run_id}s"))
+        batch = run_batch(session, headers, build_reports(args.bot_wxid, args.count, args.group_size, f"{run_id}b"), args.batch_size)
+
+    print(f"逐条上报: {args.count / single:.1f} 条/秒 ({single:.2f}s)")
+    print(f"批量上报: {args.count / batch:.1f} 条/秒 ({batch:.2f}s)")
+    print(f"提升: {single / batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
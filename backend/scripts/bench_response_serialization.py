@@ -0,0 +1,129 @@
+"""
+消息列表响应的序列化耗时基准
+
+用内存中构造的消息（不连接数据库）对比两种序列化方式，按每 1000 条消息统计耗时：
+- 原方式：逐条 model_dump() 并手动 isoformat，返回字典后由 FastAPI 按
+  Dict[str, Any] 校验、转换，再用标准库 json 编码
+- 快速方式：app.core.responses 的 dump_models 整页转换，orjson 编码
+
+两种方式的输出会先做一致性校验。
+
+用法（在 backend 目录下）:
+    python -m scripts.bench_response_serialization --messages 1000 --repeat 50
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from pydantic import TypeAdapter
+
+from app.core.responses import dump_model_map, dump_models, envelope
+from modules.conversations.models import (
+    ContactPublic,
+    MessageCompactPublic,
+    MessagePublic,
+    MessageType,
+    TagPublic,
+)
+
+_envelope_adapter = TypeAdapter(Dict[str, Any])
+
+
+def build_messages(count, senders):
+    """构造 count 条消息，发送者在 senders 个联系人中轮换"""
+    now = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    contacts = [
+        ContactPublic(
+            id=i,
+            wxid=f"wxid_bench_{i}",
+            wx_name=f"压测联系人{i}",
+            avatar=f"https://example.com/avatar/{i}.png",
+            tags=[TagPublic(id=i, name="意向客户", created_at=now, updated_at=now)],
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(senders)
+    ]
+    messages = [
+        MessagePublic(
+            id=i,
+            conversation_id=1,
+            sender_id=contacts[i % senders].id,
+            external_message_id=f"bench_{i}",
+            type=MessageType.TEXT,
+            content=f"第{i}条消息：请问这款产品的价格是多少？",
+            created_at=now + timedelta(seconds=i),
+            sender=contacts[i % senders],
+        )
+        for i in range(count)
+    ]
+    return messages, {contact.id: contact for contact in contacts}
+
+
+def legacy_render(messages, senders=None):
+    """原方式：逐条转换 + FastAPI 返回值转换 + 标准库 json"""
+    messages_dict = []
+    for msg in messages:
+        msg_dict = msg.model_dump()
+        if msg_dict.get("created_at"):
+            msg_dict["created_at"] = msg_dict["created_at"].isoformat()
+        messages_dict.append(msg_dict)
+    body = {"messages": messages_dict, "has_more": False}
+    if senders is not None:
+        body["senders"] = {
+            str(contact_id): sender.model_dump(mode="json") for contact_id, sender in senders.items()
+        }
+    content = _envelope_adapter.dump_python(
+        _envelope_adapter.validate_python({"error": 0, "body": body, "message": "成功"}), mode="json"
+    )
+    # 与 starlette JSONResponse.render 相同的编码参数
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def fast_render(messages, senders=None):
+    """快速方式：整页转换 + orjson"""
+    body = {"messages": dump_models(messages), "has_more": False}
+    if senders is not None:
+        body["senders"] = dump_model_map(senders)
+    return envelope(body).body
+
+
+def measure(render, repeat, *args):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息列表响应的序列化耗时基准")
+    parser.add_argument("--messages", type=int, default=1000, help="每次序列化的消息条数")
+    parser.add_argument("--senders", type=int, default=20, help="发送者数量")
+    parser.add_argument("--repeat", type=int, default=50, help="每种方式重复次数")
+    args = parser.parse_args()
+
+    messages, senders = build_messages(args.messages, args.senders)
+    compact = [MessageCompactPublic(**msg.model_dump(exclude={"sender"})) for msg in messages]
+    cases = [("完整格式", (messages,)), ("精简格式", (compact, senders))]
+
+    per_thousand = 1000 / args.messages
+    print(f"{'格式':<8} {'原方式/千条':>12} {'快速方式/千条':>14} {'加速':>6} {'响应大小':>10}")
+    for name, case_args in cases:
+        legacy_body = legacy_render(*case_args)
+        fast_body = fast_render(*case_args)
+        if json.loads(legacy_body) != json.loads(fast_body):
+            raise SystemExit(f"{name}：两种方式的输出不一致")
+
+        fast_render(*case_args)  # 预热 TypeAdapter 缓存
+        legacy = measure(legacy_render, args.repeat, *case_args) * per_thousand
+        fast = measure(fast_render, args.repeat, *case_args) * per_thousand
+        print(
+            f"{name:<8} {legacy * 1000:>10.2f}ms {fast * 1000:>12.2f}ms"
+            f" {legacy / fast:>5.1f}x {len(fast_body):>9}B"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+会话/消息列表并发压测：同步会话 vs 线程池 vs 异步会话
+
+在进程内用 asyncio 同时发起 concurrency 个会话列表和消息列表请求（两者各半），
+分别以三种方式访问数据库，统计每个请求的延迟分位数：
+- blocking：在协程中直接调用同步服务（改造前 async 路由的行为，查询阻塞事件循环）
+- threadpool：run_in_threadpool 调用同步服务
+- async：AsyncConversationService（异步引擎）
+
+也可以传入 --base-url 和 --token 对运行中的服务发起 HTTP 压测。
+
+用法（在 backend 目录下）:
+    python -m scripts.load_test_conversations --bot-wxid test_bot_001 --concurrency 200 --rounds 5
+    python -m scripts.load_test_conversations --bot-wxid test_bot_001 \\
+        --base-url http://localhost:8000/api/v1/conversations --token <AUTH_TOKEN>
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+
+from app.core.db import async_engine, engine
+from modules.conversations.async_service import AsyncConversationService
+from modules.conversations.models import Conversation
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts.models import WechatBot
+
+
+def load_targets(bot_wxid):
+    """取机器人ID和它最近活跃的会话ID"""
+    with Session(engine) as session:
+        bot = session.exec(select(WechatBot).where(WechatBot.wxid == bot_wxid)).first()
+        if not bot:
+            raise SystemExit(f"机器人 {bot_wxid} 不存在")
+        conversation_ids = session.exec(
+            select(Conversation.id)
+            .where(Conversation.wechat_bot_id == bot.id)
+            .order_by(Conversation.last_message_at.desc().nulls_last())
+            .limit(20)
+        ).all()
+        if not conversation_ids:
+            raise SystemExit(f"机器人 {bot_wxid} 没有会话，请先上报消息")
+        return bot.id, list(conversation_ids)
+
+
+def build_calls(mode, bot_id, conversation_ids, concurrency, page_size):
+    """构造 concurrency 个请求，会话列表和消息列表交替"""
+    calls = []
+    for i in range(concurrency):
+        if i % 2 == 0:
+            sync_fn, async_fn = ConversationService.get_conversations_page, AsyncConversationService.get_conversations_page
+            kwargs = {"wechat_account_id": bot_id, "limit": page_size}
+        else:
+            sync_fn, async_fn = ConversationService.get_messages, AsyncConversationService.get_messages
+            kwargs = {"conversation_id": conversation_ids[i % len(conversation_ids)], "page_size": page_size}
+
+        if mode == "blocking":
+            async def call(fn=sync_fn, kwargs=kwargs):
+                return fn(**kwargs)
+        elif mode == "threadpool":
+            async def call(fn=sync_fn, kwargs=kwargs):
+                return await run_in_threadpool(fn, **kwargs)
+        else:
+            async def call(fn=async_fn, kwargs=kwargs):
+                return await fn(**kwargs)
+        calls.append(call)
+    return calls
+
+
+def build_http_calls(client, base_url, headers, bot_id, conversation_ids, concurrency, page_size):
+    calls = []
+    for i in range(concurrency):
+        if i % 2 == 0:
+            url, body = f"{base_url}/list", {"wechat_account_id": bot_id, "limit": page_size}
+        else:
+            url = f"{base_url}/messages/list"
+            body = {"conversation_id": conversation_ids[i % len(conversation_ids)], "page_size": page_size}
+
+        async def call(url=url, body=body):
+            result = (await client.post(url, json=body, headers=headers)).json()
+            assert result["error"] == 0, result["message"]
+            return result
+        calls.append(call)
+    return calls
+
+
+async def timed(call):
+    start = time.perf_counter()
+    await call()
+    return time.perf_counter() - start
+
+
+async def run_rounds(make_calls, rounds):
+    latencies = []
+    for _ in range(rounds):
+        latencies.extend(await asyncio.gather(*(timed(call) for call in make_calls())))
+    return latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(name, latencies):
+    print(
+        f"{name:<12} 请求数={len(latencies):<6} "
+        f"p50={percentile(latencies, 50) * 1000:8.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.1f}ms "
+        f"max={max(latencies) * 1000:8.1f}ms "
+        f"mean={statistics.mean(latencies) * 1000:8.1f}ms"
+    )
+
+
+async def main_async(args):
+    bot_id, conversation_ids = load_targets(args.bot_wxid)
+
+    if args.base_url:
+        headers = {"Authorization": f"Bearer {args.token}"}
+        async with httpx.AsyncClient(timeout=60) as client:
+            latencies = await run_rounds(
+                lambda: build_http_calls(client, args.base_url, headers, bot_id, conversation_ids,
+                                         args.concurrency, args.page_size),
+                args.rounds
+            )
+        report("http", latencies)
+        return
+
+    try:
+        for mode in args.modes:
+            # 预热连接池，不计入结果
+            await run_rounds(lambda mode=mode: build_calls(mode, bot_id, conversation_ids, 10, args.page_size), 1)
+            latencies = await run_rounds(
+                lambda mode=mode: build_calls(mode, bot_id, conversation_ids, args.concurrency, args.page_size),
+                args.rounds
+            )
+            report(mode, latencies)
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话/消息列表并发压测")
+    parser.add_argument("--bot-wxid", default="test_bot_001", help="数据库中已存在且有会话的机器人wxid")
+    parser.add_argument("--concurrency", type=int, default=200, help="同时发起的请求数")
+    parser.add_argument("--rounds", type=int, default=5, help="轮数")
+    parser.add_argument("--page-size", type=int, default=20, help="每页条数")
+    parser.add_argument("--modes", nargs="+", default=["blocking", "threadpool", "async"],
+                        choices=["blocking", "threadpool", "async"], help="进程内压测的访问方式")
+    parser.add_argument("--base-url", help="对运行中的服务压测，例如 http://localhost:8000/api/v1/conversations")
+    parser.add_argument("--token", help="HTTP 压测使用的认证令牌")
+    args = parser.parse_args()
+    if args.base_url and not args.token:
+        parser.error("--base-url 需要同时传入 --token")
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@
 
 SET client_encoding = 'UTF8';
 
+-- 子串搜索使用的三元组索引扩展
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ====================================================================
 -- 枚举类型定义
 -- ====================================================================
@@ -47,6 +50,7 @@ CREATE TABLE contacts (
     avatar VARCHAR(1024), -- 头像链接
     group_name VARCHAR(255), -- 所属分组
     notes TEXT, -- 运营人员添加的内部备注
+    name_pinyin TEXT, -- 备注名和昵称的拼音检索键 (全拼|首字母)
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -70,9 +74,11 @@ CREATE TABLE conversations (
     topic VARCHAR(255), -- 会话标题 (对方昵称或群名称)
     last_message_summary TEXT, -- 最后一条消息的摘要
     last_message_at TIMESTAMP WITH TIME ZONE,
+    participants_hash VARCHAR(64), -- 最近一次写入的群成员名单指纹
+    topic_pinyin TEXT, -- 标题的拼音检索键 (全拼|首字母)
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE (wechat_bot_id, external_id)
+    CONSTRAINT uq_conversations_bot_external UNIQUE (wechat_bot_id, external_id)
 );
 
 -- 5. 会话参与者关联表 (多对多)
@@ -93,7 +99,9 @@ CREATE TABLE messages (
     external_message_id VARCHAR(255), -- 来自微信的原始消息ID
     type message_type_enum NOT NULL,
     content TEXT, -- 消息内容 (文本、图片URL、文件URL等)
-    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+    content_hash VARCHAR(64), -- 无原始消息ID时用于去重的内容指纹
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    CONSTRAINT uq_messages_conversation_external UNIQUE (conversation_id, external_message_id)
 );
 
 -- 7. 联系人记忆表
@@ -119,6 +127,7 @@ CREATE INDEX idx_tags_owner_id ON tags (owner_id);
 -- contacts表索引
 CREATE INDEX idx_contacts_wxid ON contacts (wxid);
 CREATE INDEX idx_contacts_wx_name ON contacts (wx_name);
+CREATE INDEX idx_contacts_name_trgm ON contacts USING gin (wx_name gin_trgm_ops, remark_name gin_trgm_ops, name_pinyin gin_trgm_ops); -- 联系人搜索
 
 -- contact_tags表索引
 CREATE INDEX idx_contact_tags_contact_id ON contact_tags (contact_id);
@@ -128,7 +137,8 @@ CREATE INDEX idx_contact_tags_tag_id ON contact_tags (tag_id);
 CREATE INDEX idx_conversations_wechat_bot_id ON conversations (wechat_bot_id);
 CREATE INDEX idx_conversations_external_id ON conversations (external_id);
 CREATE INDEX idx_conversations_last_message_at ON conversations (last_message_at DESC);
-CREATE INDEX idx_conversations_topic ON conversations (topic); -- 用于搜索
+CREATE INDEX idx_conversations_bot_last_message ON conversations (wechat_bot_id, last_message_at DESC NULLS LAST, id DESC); -- 会话列表游标分页
+CREATE INDEX idx_conversations_topic_trgm ON conversations USING gin (topic gin_trgm_ops, topic_pinyin gin_trgm_ops); -- 会话搜索
 
 -- conversation_participants表索引
 CREATE INDEX idx_conversation_participants_conversation_id ON conversation_participants (conversation_id);
@@ -138,7 +148,10 @@ CREATE INDEX idx_conversation_participants_contact_id ON conversation_participan
 CREATE INDEX idx_messages_conversation_id ON messages (conversation_id);
 CREATE INDEX idx_messages_sender_id ON messages (sender_id);
 CREATE INDEX idx_messages_created_at ON messages (created_at DESC);
+CREATE INDEX idx_messages_conversation_created_id ON messages (conversation_id, created_at, id); -- 消息列表游标分页
 CREATE INDEX idx_messages_type ON messages (type);
+CREATE INDEX idx_messages_content_hash ON messages (conversation_id, content_hash) WHERE external_message_id IS NULL;
+CREATE INDEX idx_messages_content_trgm ON messages USING gin (content gin_trgm_ops); -- 消息内容搜索
 
 -- contact_memories表索引
 CREATE INDEX idx_contact_memories_contact_id ON contact_memories (contact_id);
@@ -170,6 +170,14 @@ CREATE TABLE bot_escalation_recipients (
     UNIQUE (bot_id, user_id)
 );
 
+-- 7. 机器人数据版本表 (用于 ETag 条件请求)
+DROP TABLE IF EXISTS bot_change_versions CASCADE;
+CREATE TABLE bot_change_versions (
+    bot_id BIGINT PRIMARY KEY REFERENCES wechat_bots(id) ON DELETE CASCADE,
+    conversations_version BIGINT NOT NULL DEFAULT 0, -- 会话列表相关数据的版本
+    config_version BIGINT NOT NULL DEFAULT 0 -- 机器人基本信息与配置的版本
+);
+
 
 -- ====================================================================
 -- 索引定义
@@ -233,6 +241,9 @@ COMMENT ON COLUMN bot_alert_recipients.user_id IS '接收提醒的用户ID, 关
 COMMENT ON TABLE bot_escalation_recipients IS '机器人触发人工接管后的接管人列表';
 COMMENT ON COLUMN bot_escalation_recipients.user_id IS '接管人用户ID, 关联users.id';
 
+-- bot_change_versions
+COMMENT ON TABLE bot_change_versions IS '机器人数据版本，数据变化时在同一事务中递增，读接口据此生成 ETag';
+
 -- ====================================================================
 -- 脚本执行完成
 -- ==================================================================== 
\ No newline at end of file
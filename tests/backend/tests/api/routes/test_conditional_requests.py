@@ -0,0 +1,128 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.models import MessageReportRequest
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts import change_versions
+
+
+def test_etag_matches() -> None:
+    etag = change_versions.make_etag(change_versions.CONFIG, 1, 3)
+
+    assert change_versions.etag_matches(etag, etag)
+    assert change_versions.etag_matches(etag.removeprefix("W/"), etag)
+    assert change_versions.etag_matches(f'"other", {etag}', etag)
+    assert change_versions.etag_matches("*", etag)
+    assert not change_versions.etag_matches(None, etag)
+    assert not change_versions.etag_matches(change_versions.make_etag(change_versions.CONFIG, 1, 4), etag)
+
+
+def test_make_etag_varies_with_request_parameters() -> None:
+    scope = change_versions.CONVERSATIONS
+
+    assert change_versions.make_etag(scope, 1, 3, "a", None) != change_versions.make_etag(scope, 1, 3, "b", None)
+    assert change_versions.make_etag(scope, 1, 3, "a", None) == change_versions.make_etag(scope, 1, 3, "a", None)
+
+
+def test_bump_increments_per_bot(db: Session) -> None:
+    bot = create_random_bot(db)
+    assert change_versions.get_version(db, bot.id, change_versions.CONVERSATIONS) == 0
+
+    change_versions.bump(db, [bot.id, bot.id], change_versions.CONVERSATIONS)
+    change_versions.bump(db, [bot.id], change_versions.CONVERSATIONS)
+    db.commit()
+
+    assert change_versions.get_version(db, bot.id, change_versions.CONVERSATIONS) == 2
+    assert change_versions.get_version(db, bot.id, change_versions.CONFIG) == 0
+
+
+def test_bot_config_not_modified_until_changed(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    bot = create_random_bot(db)
+    url = f"{settings.API_V1_STR}/wechat-accounts/{bot.id}"
+
+    first = client.get(url, headers=superuser_token_headers)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+
+    cached = client.get(url, headers={**superuser_token_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    client.post(f"{url}/logout", headers=superuser_token_headers)
+    changed = client.get(url, headers={**superuser_token_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_conversation_list_not_modified_until_ingestion(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    bot = create_random_bot(db)
+    url = f"{settings.API_V1_STR}/conversations/list"
+    params = {"wechat_account_id": bot.id}
+
+    first = client.get(url, params=params, headers=superuser_token_headers)
+    etag = first.headers["ETag"]
+    assert first.json()["body"]["conversations"] == []
+
+    cached = client.get(url, params=params, headers={**superuser_token_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    other_query = client.get(
+        url, params={**params, "query": "x"}, headers={**superuser_token_headers, "If-None-Match": etag}
+    )
+    assert other_query.status_code == 200
+
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(bot, "friend", "friend", conversation_type="private"))
+    ])
+    changed = client.get(url, params=params, headers={**superuser_token_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()["body"]["conversations"]) == 1
+
+
+def test_conversation_list_post_is_not_conditional(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    bot = create_random_bot(db)
+    url = f"{settings.API_V1_STR}/conversations/list"
+    etag = client.get(url, params={"wechat_account_id": bot.id}, headers=superuser_token_headers).headers["ETag"]
+
+    response = client.post(
+        url, json={"wechat_account_id": bot.id}, headers={**superuser_token_headers, "If-None-Match": etag}
+    )
+
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+def test_conversation_list_etag_requires_access(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    bot = create_random_bot(db)
+    etag = change_versions.make_etag(change_versions.CONVERSATIONS, bot.id, 0, None, None, None)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/conversations/list",
+        params={"wechat_account_id": bot.id},
+        headers={**normal_user_token_headers, "If-None-Match": etag},
+    )
+
+    assert response.status_code == 403
+
+
+def test_duplicate_report_keeps_conversation_list_version(db: Session) -> None:
+    bot = create_random_bot(db)
+    report = MessageReportRequest(**build_report(bot, "friend", "friend", message_id="m1"))
+
+    ConversationService.process_message_reports([report])
+    version = change_versions.get_version(db, bot.id, change_versions.CONVERSATIONS)
+    ConversationService.process_message_reports([report])
+
+    db.expire_all()
+    assert change_versions.get_version(db, bot.id, change_versions.CONVERSATIONS) == version == 1
@@ -0,0 +1,31 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.service import message_ingest_queue
+
+
+def test_queued_batch_with_invalid_report_is_rejected(
+    client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "MESSAGE_INGEST_MODE", "queue")
+    bot = create_random_bot(db)
+    reports = [build_report(bot, "friend", "friend", message_id=f"m{i}") for i in range(3)]
+    reports[1]["message"]["type"] = "sticker"
+    del reports[2]["message"]["timestamp"]
+    accepted = message_ingest_queue.stats()["accepted"]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/conversations/internal/message/report/batch",
+        json={"reports": reports},
+        headers={"Authorization": "Bearer bot"},
+    )
+
+    assert response.status_code == 422
+    assert response.json()["body"]["rejected"] == [
+        {"index": 1, "reason": "未知的消息类型 sticker"},
+        {"index": 2, "reason": "缺少消息时间戳"},
+    ]
+    assert message_ingest_queue.stats()["accepted"] == accepted
@@ -0,0 +1,62 @@
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.responses import dump_model_map, dump_models, envelope
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.models import ContactPublic, MessageReportRequest
+from modules.conversations.service import ConversationService
+
+
+def make_contact(contact_id: int) -> ContactPublic:
+    now = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    return ContactPublic(id=contact_id, wxid=f"wxid_{contact_id}", wx_name="张三", created_at=now, updated_at=now)
+
+
+def test_dump_models_matches_model_dump() -> None:
+    contacts = [make_contact(1), make_contact(2)]
+
+    assert dump_models(contacts) == [contact.model_dump() for contact in contacts]
+    assert dump_models([]) == []
+
+
+def test_envelope_encodes_like_json_response() -> None:
+    contact = make_contact(7)
+    response = envelope({"senders": dump_model_map({7: contact}), "contact": contact}, headers={"ETag": "x"})
+
+    content = json.loads(response.body)
+    assert content["error"] == 0 and content["message"] == "成功"
+    assert content["body"]["senders"]["7"]["created_at"] == "2024-01-01T12:00:00.123456"
+    assert content["body"]["contact"] == contact.model_dump(mode="json")
+    assert response.headers["ETag"] == "x"
+    assert "张三".encode() in response.body
+
+
+def test_message_list_api_keeps_wire_format(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    bot = create_random_bot(db)
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(bot, "friend", "friend", conversation_type="private", message_id="m1"))
+    ])
+    conversations = client.post(
+        f"{settings.API_V1_STR}/conversations/list",
+        json={"wechat_account_id": bot.id},
+        headers=superuser_token_headers,
+    ).json()["body"]["conversations"]
+
+    response = client.post(
+        f"{settings.API_V1_STR}/conversations/messages/list",
+        json={"conversation_id": conversations[0]["id"], "compact": True},
+        headers=superuser_token_headers,
+    )
+
+    body = response.json()["body"]
+    message = body["messages"][0]
+    assert response.headers["content-type"] == "application/json"
+    assert message["type"] == "text"
+    assert message["created_at"] == datetime.fromtimestamp(1700000000).isoformat()
+    assert list(body["senders"]) == [str(message["sender_id"])]
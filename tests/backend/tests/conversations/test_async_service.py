@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from sqlmodel import Session, select
+
+from app.tests.utils.db import run_async
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.async_service import AsyncConversationService
+from modules.conversations.models import Conversation, MessageReportRequest
+from modules.conversations.service import ConversationService
+
+
+def seed_conversation(db: Session, count: int) -> Conversation:
+    bot = create_random_bot(db)
+    friend = f"wxid_{random_lower_string()}"
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(
+            bot, friend, friend, conversation_type="private",
+            message_id=f"m{i}", content=f"消息{i}", timestamp=1700000000 + i
+        ))
+        for i in range(count)
+    ])
+    return db.exec(select(Conversation).where(Conversation.external_id == friend)).one()
+
+
+def test_async_conversations_match_sync(db: Session) -> None:
+    conversation = seed_conversation(db, 3)
+    bot_id = conversation.wechat_bot_id
+
+    assert run_async(AsyncConversationService.get_conversations(bot_id)) == \
+        ConversationService.get_conversations(bot_id)
+    assert run_async(AsyncConversationService.get_conversations_page(bot_id, limit=1)) == \
+        ConversationService.get_conversations_page(bot_id, limit=1)
+
+
+def test_async_messages_match_sync(db: Session) -> None:
+    conversation = seed_conversation(db, 5)
+
+    for compact in (False, True):
+        assert run_async(AsyncConversationService.get_messages(
+            conversation.id, page=1, page_size=3, compact=compact
+        )) == ConversationService.get_messages(conversation.id, page=1, page_size=3, compact=compact)
+
+    latest = ConversationService.get_messages_keyset(conversation.id, limit=2)
+    assert run_async(AsyncConversationService.get_messages_keyset(conversation.id, limit=2)) == latest
+
+    before_id = latest["messages"][0].id
+    assert run_async(AsyncConversationService.get_messages_keyset(
+        conversation.id, before_id=before_id, limit=2
+    )) == ConversationService.get_messages_keyset(conversation.id, before_id=before_id, limit=2)
+
+
+def test_async_keyset_rejects_unknown_anchor(db: Session) -> None:
+    conversation = seed_conversation(db, 1)
+
+    with pytest.raises(ValueError, match="消息不存在"):
+        run_async(AsyncConversationService.get_messages_keyset(conversation.id, before_id=-1))
+
+
+def test_concurrent_requests_share_the_event_loop(db: Session) -> None:
+    conversation = seed_conversation(db, 5)
+
+    async def load() -> list:
+        return await asyncio.gather(*(
+            AsyncConversationService.get_messages_keyset(conversation.id, limit=5)
+            for _ in range(20)
+        ))
+
+    results = run_async(load())
+    assert all(len(result["messages"]) == 5 for result in results)
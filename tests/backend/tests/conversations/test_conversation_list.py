@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import update
+from sqlmodel import Session
+
+from app.tests.utils.db import count_statements
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.models import Contact, MessageReportRequest
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts.models import WechatBot
+
+
+def seed_conversations(db: Session, bot: WechatBot, count: int, start: int = 0) -> None:
+    friends = [f"wxid_{random_lower_string()}" for _ in range(count)]
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(
+            bot, friend, friend, conversation_type="private", timestamp=1700000000 + (start + i) // 2
+        ))
+        for i, friend in enumerate(friends)
+    ])
+    for friend in friends:
+        db.exec(update(Contact).where(Contact.wxid == friend).values(avatar=f"https://avatar/{friend}"))
+    db.commit()
+
+
+def test_conversation_list_query_count_is_constant(db: Session) -> None:
+    bot = create_random_bot(db)
+    counts = []
+    seeded = 0
+    for size in (3, 30):
+        seed_conversations(db, bot, size - seeded, start=seeded)
+        seeded = size
+        with count_statements() as counter:
+            conversations = ConversationService.get_conversations(bot.id)
+        assert len(conversations) == size
+        assert all(conv.avatar == f"https://avatar/{conv.external_id}" for conv in conversations)
+        counts.append(counter["statements"])
+
+    assert counts[0] == counts[1] == 1
+
+
+def test_private_conversation_avatar_comes_from_participant(db: Session) -> None:
+    bot = create_random_bot(db)
+    friend = f"wxid_{random_lower_string()}"
+    ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, friend, friend, conversation_type="private"))
+    )
+    db.exec(update(Contact).where(Contact.wxid == friend).values(avatar="https://avatar/friend.png"))
+    db.commit()
+
+    [conversation] = ConversationService.get_conversations(bot.id)
+    assert conversation.avatar == "https://avatar/friend.png"
+
+
+def test_keyset_pages_cover_list_in_order_without_gaps(db: Session) -> None:
+    bot = create_random_bot(db)
+    # 时间戳两两相同，检验 (last_message_at, id) 作为排序键时不会重复或遗漏
+    seed_conversations(db, bot, 25)
+    expected = [conv.id for conv in ConversationService.get_conversations(bot.id)]
+
+    seen = []
+    cursor = None
+    while True:
+        with count_statements() as counter:
+            page = ConversationService.get_conversations_page(bot.id, limit=10, cursor=cursor)
+        assert counter["statements"] == 1
+        seen.extend(conv.id for conv in page["conversations"])
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            break
+        cursor = page["next_cursor"]
+
+    assert seen == expected
+    assert len(seen) == 25
+
+
+def test_invalid_cursor_is_rejected(db: Session) -> None:
+    bot = create_random_bot(db)
+    with pytest.raises(ValueError):
+        ConversationService.get_conversations_page(bot.id, limit=10, cursor="not-a-cursor")
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.fanout import (
+    MAX_PAYLOAD_BYTES,
+    PostgresListener,
+    decode_payload,
+    encode_payload,
+    listener_conninfo,
+)
+from modules.conversations.live import live_hub
+from modules.conversations.models import MessageReportRequest
+from modules.conversations.service import ConversationService
+
+
+def test_payload_roundtrip() -> None:
+    live_event = {"type": "message", "data": {"id": 1, "content": "你好"}}
+    assert decode_payload(encode_payload(7, live_event)) == (7, live_event)
+
+
+def test_oversized_content_is_truncated_to_fit_notify_limit() -> None:
+    live_event = {"type": "message", "data": {"id": 1, "content": "长" * 5000}}
+    payload = encode_payload(7, live_event)
+
+    assert len(payload.encode("utf-8")) <= MAX_PAYLOAD_BYTES
+    _, decoded = decode_payload(payload)
+    assert decoded["data"]["truncated"] is True
+    assert 0 < len(decoded["data"]["content"]) < 5000
+
+
+def test_event_that_cannot_fit_is_dropped() -> None:
+    live_event = {"type": "conversation", "data": {"topic": "群" * 5000}}
+    assert encode_payload(7, live_event) is None
+
+
+def test_commit_notifies_listening_workers(db: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    channel = f"test_live_{random_lower_string()[:16]}"
+    monkeypatch.setattr(settings, "LIVE_FANOUT", "postgres")
+    monkeypatch.setattr(settings, "LIVE_FANOUT_CHANNEL", channel)
+
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+    report = MessageReportRequest(
+        **build_report(bot, conv_external_id, sender, conversation_type="private", content="跨进程")
+    )
+
+    async def scenario() -> None:
+        subscription = live_hub.subscribe([bot.id])
+        listener = PostgresListener(listener_conninfo(), channel, live_hub, poll_interval=0.1)
+        listener.start()
+        try:
+            await asyncio.sleep(0.5)
+            await asyncio.to_thread(ConversationService.process_message_report, report)
+
+            message = await subscription.next_event(5)
+            conversation = await subscription.next_event(5)
+            assert message["type"] == "message"
+            assert message["data"]["content"] == "跨进程"
+            assert conversation["type"] == "conversation"
+            # 本进程也只通过通知收到一次
+            await asyncio.sleep(0.3)
+            assert subscription.queue.empty()
+            assert listener.received == 2
+        finally:
+            listener.stop()
+            live_hub.unsubscribe(subscription)
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations import ingest
+from modules.conversations.identity_cache import LRUCache, identity_caches
+from modules.conversations.models import Conversation, MessageReportRequest
+from modules.conversations.service import ConversationService
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "c", "d"]) == {"a": 1, "c": 3}
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 3, "misses": 2, "hit_rate": 0.6}
+
+
+def test_lru_cache_pop_where_matches_key_and_value() -> None:
+    cache = LRUCache(max_size=10)
+    cache.put((1, "a"), 10)
+    cache.put((1, "b"), 11)
+    cache.put((2, "a"), 12)
+
+    assert cache.pop_where(lambda key, _: key[0] == 1) == 2
+    assert cache.pop_where(lambda _, value: value == 12) == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_repeated_reports_hit_identity_caches(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+
+    ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, conv_external_id, sender, conversation_type="private"))
+    )
+    conversation = db.exec(
+        select(Conversation).where(Conversation.external_id == conv_external_id)
+    ).one()
+    assert identity_caches.bots.get(bot.wxid) == bot.id
+    assert identity_caches.contacts.get(sender)[1] == sender
+    assert identity_caches.conversations.get((bot.id, conv_external_id)) == (conversation.id, None)
+
+    before = identity_caches.stats()
+    ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, conv_external_id, sender, conversation_type="private"))
+    )
+    after = identity_caches.stats()
+    for name in ("bots", "contacts", "conversations"):
+        assert after[name]["hits"] == before[name]["hits"] + 1
+        assert after[name]["misses"] == before[name]["misses"]
+
+
+def test_rolled_back_ingest_does_not_populate_caches(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+
+    with Session(engine) as session:
+        ingest.process_reports(
+            session,
+            [MessageReportRequest(**build_report(bot, conv_external_id, sender, conversation_type="private"))],
+        )
+        session.rollback()
+
+    assert identity_caches.contacts.get(sender) is None
+    assert identity_caches.conversations.get((bot.id, conv_external_id)) is None
+
+
+def test_deleting_bot_invalidates_its_cached_conversations() -> None:
+    identity_caches.bots.put("wxid_deleted_bot", -1)
+    identity_caches.conversations.put((-1, "wxid_friend"), (-10, None))
+    identity_caches.conversations.put((-2, "wxid_friend"), (-20, None))
+
+    identity_caches.invalidate_bot(wxid="wxid_deleted_bot", bot_id=-1)
+
+    assert identity_caches.bots.get("wxid_deleted_bot") is None
+    assert identity_caches.conversations.get((-1, "wxid_friend")) is None
+    assert identity_caches.conversations.get((-2, "wxid_friend")) == (-20, None)
+
+
+def test_stale_cache_from_another_worker_is_reresolved(db: Session) -> None:
+    # 另一个 worker 删除了机器人，本进程的缓存仍指向已删除的ID
+    bot = create_random_bot(db)
+    bot_wxid, bot_id = bot.wxid, bot.id
+    report = MessageReportRequest(**build_report(bot, "wxid_friend", "wxid_friend"))
+    db.delete(bot)
+    db.commit()
+    identity_caches.bots.put(bot_wxid, bot_id)
+
+    result = ConversationService.process_message_reports([report])
+
+    assert result["received"] == 0
+    assert result["rejected"] == [{"index": 0, "reason": f"机器人 {bot_wxid} 不存在"}]
+    assert identity_caches.bots.get(bot_wxid) is None
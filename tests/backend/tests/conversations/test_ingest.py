@@ -0,0 +1,271 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, func, select
+
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.models import (
+    Contact,
+    Conversation,
+    Message,
+    MessageReportRequest,
+)
+from modules.conversations import ingest
+from modules.conversations.ingest import roster_hash
+from modules.conversations.service import ConversationService
+
+
+def count_participants(db: Session, conversation_id: int) -> int:
+    return db.exec(
+        text("SELECT count(*) FROM conversation_participants WHERE conversation_id = :conv_id"),
+        params={"conv_id": conversation_id},
+    ).one()[0]
+
+
+def test_report_creates_contact_conversation_and_message(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"{random_lower_string()}@chatroom"
+    sender = f"wxid_{random_lower_string()}"
+    members = [{"id": f"wxid_{random_lower_string()}", "name": "member"} for _ in range(3)]
+
+    result = ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, conv_external_id, sender, participants=members))
+    )
+    assert result == {"status": "received"}
+
+    conversation = db.exec(
+        select(Conversation).where(Conversation.external_id == conv_external_id)
+    ).one()
+    assert conversation.last_message_summary == f"{sender}: 你好"
+    assert count_participants(db, conversation.id) == 4
+    assert db.exec(
+        select(func.count(Message.id)).where(Message.conversation_id == conversation.id)
+    ).one() == 1
+
+
+def test_report_for_unknown_bot_is_rejected() -> None:
+    data = {
+        "bot_id": f"missing_{random_lower_string()}",
+        "conversation_id": "c",
+        "conversation_topic": "t",
+        "conversation_type": "private",
+        "sender": {"id": "s", "name": "s"},
+        "message": {"id": "m", "type": "text", "content": "x", "timestamp": 1700000000},
+    }
+    with pytest.raises(ValueError):
+        ConversationService.process_message_report(MessageReportRequest(**data))
+
+
+def test_parallel_reports_for_new_conversation_do_not_duplicate(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"{random_lower_string()}@chatroom"
+    shared_sender = f"wxid_{random_lower_string()}"
+    members = [{"id": f"wxid_{random_lower_string()}", "name": "member"} for _ in range(20)]
+    reports = [
+        MessageReportRequest(
+            **build_report(bot, conv_external_id, shared_sender, participants=members, content=f"msg {i}")
+        )
+        for i in range(16)
+    ]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(ConversationService.process_message_report, reports))
+
+    assert all(result == {"status": "received"} for result in results)
+    conversations = db.exec(
+        select(Conversation).where(
+            Conversation.wechat_bot_id == bot.id,
+            Conversation.external_id == conv_external_id,
+        )
+    ).all()
+    assert len(conversations) == 1
+    assert db.exec(
+        select(func.count(Contact.id)).where(Contact.wxid == shared_sender)
+    ).one() == 1
+    assert count_participants(db, conversations[0].id) == 21
+    assert db.exec(
+        select(func.count(Message.id)).where(Message.conversation_id == conversations[0].id)
+    ).one() == 16
+
+
+def test_batch_report(db: Session) -> None:
+    bot = create_random_bot(db)
+    sender = f"wxid_{random_lower_string()}"
+    reports = [
+        MessageReportRequest(**build_report(bot, f"private_{i}_{random_lower_string()}", sender, conversation_type="private", timestamp=1700000000 + i))
+        for i in range(5)
+    ]
+    reports.append(MessageReportRequest(**{**build_report(bot, "x", sender), "bot_id": "missing_bot"}))
+
+    result = ConversationService.process_message_reports(reports)
+
+    assert result["received"] == 5
+    assert result["rejected"] == [{"index": 5, "reason": "机器人 missing_bot 不存在"}]
+    assert db.exec(
+        select(func.count(Conversation.id)).where(Conversation.wechat_bot_id == bot.id)
+    ).one() == 5
+
+
+
+def test_invalid_reports_are_rejected_by_index(db: Session) -> None:
+    bot = create_random_bot(db)
+    sender = f"wxid_{random_lower_string()}"
+
+    def report(i: int, **message) -> MessageReportRequest:
+        data = build_report(bot, f"private_{i}_{random_lower_string()}", sender, conversation_type="private")
+        data["message"].update(message)
+        return MessageReportRequest(**data)
+
+    no_timestamp = report(2)
+    no_timestamp.message.pop("timestamp")
+    no_sender = report(3)
+    no_sender.sender.pop("id")
+    reports = [report(0), report(1, type="sticker"), no_timestamp, no_sender, report(4)]
+
+    result = ConversationService.process_message_reports(reports)
+
+    assert result["received"] == 2
+    assert [item["index"] for item in result["rejected"]] == [1, 2, 3]
+    assert result["rejected"][0]["reason"] == "未知的消息类型 sticker"
+    assert db.exec(
+        select(func.count(Conversation.id)).where(Conversation.wechat_bot_id == bot.id)
+    ).one() == 2
+
+
+def test_large_rosters_are_written_in_chunks(db: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    # 每段最多 2 行联系人（5 列）、5 行参与者（2 列），验证分段写入不丢行
+    monkeypatch.setattr(ingest, "MAX_BIND_PARAMS", 10)
+    bot = create_random_bot(db)
+    conv_external_id = f"{random_lower_string()}@chatroom"
+    members = [{"id": f"wxid_{random_lower_string()}", "name": f"m{i}"} for i in range(11)]
+
+    result = ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(bot, conv_external_id, members[0]["id"], participants=members))
+    ])
+
+    assert result["received"] == 1
+    conversation = db.exec(select(Conversation).where(Conversation.external_id == conv_external_id)).one()
+    assert count_participants(db, conversation.id) == 11
+
+
+def test_roster_hash_ignores_order_and_duplicates() -> None:
+    members = [{"id": "wxid_a", "name": "a"}, {"id": "wxid_b", "name": "b"}]
+    assert roster_hash(members) == roster_hash(list(reversed(members)) + members[:1])
+    assert roster_hash(members) != roster_hash(members[:1])
+
+
+def test_unchanged_roster_skips_participant_sync(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"{random_lower_string()}@chatroom"
+    members = [{"id": f"wxid_{random_lower_string()}", "name": "member"} for _ in range(5)]
+    sender = members[0]["id"]
+
+    ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, conv_external_id, sender, participants=members))
+    )
+    conversation = db.exec(
+        select(Conversation).where(Conversation.external_id == conv_external_id)
+    ).one()
+    assert conversation.participants_hash == roster_hash(members)
+    assert count_participants(db, conversation.id) == 5
+
+    # 删除一个非发送者成员：名单未变化时不会被重新写入
+    removed = db.exec(select(Contact).where(Contact.wxid == members[-1]["id"])).one()
+    db.exec(
+        text("DELETE FROM conversation_participants WHERE conversation_id = :conv_id AND contact_id = :contact_id"),
+        params={"conv_id": conversation.id, "contact_id": removed.id},
+    )
+    db.commit()
+    ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, conv_external_id, sender, participants=list(reversed(members))))
+    )
+    assert count_participants(db, conversation.id) == 4
+
+    # 名单变化后重新同步成员并更新指纹
+    members.append({"id": f"wxid_{random_lower_string()}", "name": "newcomer"})
+    ConversationService.process_message_report(
+        MessageReportRequest(**build_report(bot, conv_external_id, sender, participants=members))
+    )
+    db.refresh(conversation)
+    assert conversation.participants_hash == roster_hash(members)
+    assert count_participants(db, conversation.id) == 6
+
+
+def count_messages(db: Session, external_id: str) -> int:
+    return db.exec(
+        select(func.count(Message.id))
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(Conversation.external_id == external_id)
+    ).one()
+
+
+def test_retried_report_is_a_noop(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+    first = build_report(bot, conv_external_id, sender, conversation_type="private", message_id="m1", content="新消息", timestamp=1700000100)
+    older = build_report(bot, conv_external_id, sender, conversation_type="private", message_id="m0", content="旧消息", timestamp=1700000000)
+
+    ConversationService.process_message_report(MessageReportRequest(**older))
+    ConversationService.process_message_report(MessageReportRequest(**first))
+    result = ConversationService.process_message_reports(
+        [MessageReportRequest(**older), MessageReportRequest(**first), MessageReportRequest(**older)]
+    )
+
+    assert result["received"] == 0
+    assert result["duplicates"] == 3
+    assert count_messages(db, conv_external_id) == 2
+    conversation = db.exec(
+        select(Conversation).where(Conversation.external_id == conv_external_id)
+    ).one()
+    assert conversation.last_message_summary == f"{sender}: 新消息"
+
+
+
+def test_older_batch_does_not_move_last_message_backward(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+
+    def report(content: str, timestamp: int) -> MessageReportRequest:
+        return MessageReportRequest(**build_report(
+            bot, conv_external_id, sender, conversation_type="private",
+            message_id=random_lower_string(), content=content, timestamp=timestamp
+        ))
+
+    ConversationService.process_message_reports([report("新消息", 1700000100)])
+    result = ConversationService.process_message_reports([report("旧消息", 1700000000)])
+
+    assert result["received"] == 1
+    conversation = db.exec(select(Conversation).where(Conversation.external_id == conv_external_id)).one()
+    db.refresh(conversation)
+    assert conversation.last_message_summary == f"{sender}: 新消息"
+    assert conversation.last_message_at == datetime.fromtimestamp(1700000100)
+    assert count_messages(db, conv_external_id) == 2
+
+
+def test_reports_without_message_id_dedupe_within_window(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+
+    def report(content: str, timestamp: int) -> MessageReportRequest:
+        data = build_report(bot, conv_external_id, sender, conversation_type="private", content=content, timestamp=timestamp)
+        data["message"].pop("id")
+        return MessageReportRequest(**data)
+
+    result = ConversationService.process_message_reports(
+        [report("在吗", 1700000000), report("在吗", 1700000030), report("你好", 1700000030)]
+    )
+    assert result["received"] == 2
+    assert result["duplicates"] == 1
+
+    ConversationService.process_message_report(report("在吗", 1700000060))
+    assert count_messages(db, conv_external_id) == 2
+
+    # 超出时间窗口的相同内容视为新消息
+    ConversationService.process_message_report(report("在吗", 1700001000))
+    assert count_messages(db, conv_external_id) == 3
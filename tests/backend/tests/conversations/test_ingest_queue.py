@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from modules.conversations.ingest_queue import IngestQueue, IngestQueueFull
+from modules.conversations.models import MessageReportRequest
+
+
+def make_report(i: int) -> MessageReportRequest:
+    return MessageReportRequest(
+        bot_id="wxid_bot",
+        conversation_id="wxid_friend",
+        conversation_topic="friend",
+        conversation_type="private",
+        sender={"id": "wxid_friend", "name": "friend"},
+        message={"id": f"m{i}", "type": "text", "content": str(i), "timestamp": 1700000000 + i},
+    )
+
+
+class RecordingWriter:
+    def __init__(self, block: threading.Event | None = None, failures: int = 0, poison: str | None = None):
+        self.batches: list[list[MessageReportRequest]] = []
+        self.block = block
+        self.failures = failures
+        self.poison = poison
+
+    def __call__(self, reports: list[MessageReportRequest]) -> dict:
+        if self.block is not None:
+            self.block.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("db down")
+        if any(r.message["id"] == self.poison for r in reports):
+            raise ValueError("bad report")
+        self.batches.append(list(reports))
+        return {"received": len(reports), "duplicates": 0, "rejected": []}
+
+
+def test_reports_are_written_in_batches() -> None:
+    writer = RecordingWriter()
+    queue = IngestQueue(writer, max_size=100, batch_size=10, flush_interval=0.5)
+    queue.submit([make_report(i) for i in range(25)])
+
+    assert queue.join(timeout=5)
+    queue.stop()
+
+    assert [len(batch) for batch in writer.batches] == [10, 10, 5]
+    assert [r.message["id"] for batch in writer.batches for r in batch] == [f"m{i}" for i in range(25)]
+    assert queue.stats()["written"] == 25
+
+
+def test_full_queue_rejects_whole_submission_with_retry_after() -> None:
+    release = threading.Event()
+    writer = RecordingWriter(block=release)
+    queue = IngestQueue(writer, max_size=5, batch_size=5, flush_interval=0)
+    queue.submit([make_report(i) for i in range(3)])
+
+    with pytest.raises(IngestQueueFull) as exc:
+        queue.submit([make_report(i) for i in range(3, 9)])
+    assert exc.value.retry_after >= 1
+    assert queue.stats()["throttled"] == 6
+
+    release.set()
+    assert queue.join(timeout=5)
+    queue.stop()
+    assert sum(len(batch) for batch in writer.batches) == 3
+
+
+def test_failed_batch_is_retried() -> None:
+    writer = RecordingWriter(failures=1)
+    queue = IngestQueue(writer, max_size=10, batch_size=10, flush_interval=0, max_retries=3)
+    queue.submit([make_report(0)])
+
+    assert queue.join(timeout=5)
+    queue.stop()
+    assert len(writer.batches) == 1
+    assert queue.stats()["failed"] == 0
+
+
+def test_failing_report_is_isolated_from_its_batch() -> None:
+    writer = RecordingWriter(poison="m2")
+    queue = IngestQueue(writer, max_size=10, batch_size=10, flush_interval=0.5, max_retries=2)
+    queue.submit([make_report(i) for i in range(5)])
+
+    assert queue.join(timeout=10)
+    queue.stop()
+    assert sorted(r.message["id"] for batch in writer.batches for r in batch) == ["m0", "m1", "m3", "m4"]
+    assert queue.stats()["written"] == 4
+    assert queue.stats()["failed"] == 1
+
+
+def test_stop_flushes_pending_reports() -> None:
+    writer = RecordingWriter()
+    queue = IngestQueue(writer, max_size=100, batch_size=50, flush_interval=30)
+    queue.submit([make_report(i) for i in range(7)])
+
+    queue.stop(timeout=5)
+    assert sum(len(batch) for batch in writer.batches) == 7
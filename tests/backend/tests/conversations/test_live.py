@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations import ingest
+from modules.conversations.live import RESYNC_EVENT, LiveHub, live_hub
+from modules.conversations.models import MessageReportRequest
+from modules.conversations.service import ConversationService
+
+
+def test_publish_routes_events_by_bot_and_across_threads() -> None:
+    async def scenario() -> None:
+        hub = LiveHub()
+        sub_a = hub.subscribe([1])
+        sub_ab = hub.subscribe([1, 2])
+
+        publisher = threading.Thread(target=hub.publish, args=(2, {"type": "message", "data": {"id": 2}}))
+        publisher.start()
+        publisher.join()
+        hub.publish(1, {"type": "message", "data": {"id": 1}})
+
+        assert (await sub_ab.next_event(1))["data"] == {"id": 2}
+        assert (await sub_ab.next_event(1))["data"] == {"id": 1}
+        assert (await sub_a.next_event(1))["data"] == {"id": 1}
+        assert sub_a.queue.empty()
+
+        hub.unsubscribe(sub_a)
+        hub.unsubscribe(sub_ab)
+        assert hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_lagging_subscriber_receives_resync() -> None:
+    async def scenario() -> None:
+        hub = LiveHub(max_queue=2)
+        sub = hub.subscribe([1])
+        for i in range(5):
+            hub.publish(1, {"type": "message", "data": {"id": i}})
+        await asyncio.sleep(0)
+
+        assert await sub.next_event(1) == RESYNC_EVENT
+        hub.publish(1, {"type": "message", "data": {"id": 99}})
+        assert (await sub.next_event(1))["data"] == {"id": 99}
+
+    asyncio.run(scenario())
+
+
+def test_ingest_publishes_after_commit_only(db: Session) -> None:
+    bot = create_random_bot(db)
+    conv_external_id = f"wxid_{random_lower_string()}"
+    sender = f"wxid_{random_lower_string()}"
+
+    def report(content: str) -> MessageReportRequest:
+        return MessageReportRequest(
+            **build_report(bot, conv_external_id, sender, conversation_type="private", content=content)
+        )
+
+    async def scenario() -> None:
+        sub = live_hub.subscribe([bot.id])
+        try:
+            def rolled_back() -> None:
+                with Session(engine) as session:
+                    ingest.process_reports(session, [report("回滚")])
+                    session.rollback()
+
+            await asyncio.to_thread(rolled_back)
+            await asyncio.to_thread(ConversationService.process_message_report, report("提交"))
+
+            message = await sub.next_event(5)
+            conversation = await sub.next_event(5)
+            assert message["type"] == "message"
+            assert message["data"]["content"] == "提交"
+            assert message["data"]["sender"]["wxid"] == sender
+            assert conversation["type"] == "conversation"
+            assert conversation["data"]["last_message_summary"] == f"{sender}: 提交"
+            assert sub.queue.empty()
+        finally:
+            live_hub.unsubscribe(sub)
+
+    asyncio.run(scenario())
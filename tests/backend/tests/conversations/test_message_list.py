@@ -0,0 +1,134 @@
+import pytest
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from app.tests.utils.db import count_statements
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations.models import (
+    Contact,
+    Conversation,
+    MessageReportRequest,
+    Tag,
+    contact_tags_table,
+)
+from modules.conversations.service import ConversationService
+
+
+def seed_messages(db: Session, count: int) -> int:
+    """写入一个私聊会话的 count 条消息（时间戳两两相同），返回会话ID"""
+    bot = create_random_bot(db)
+    friend = f"wxid_{random_lower_string()}"
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(
+            bot, friend, friend, conversation_type="private",
+            message_id=f"m{i}", content=f"消息{i}", timestamp=1700000000 + i // 2
+        ))
+        for i in range(count)
+    ])
+    return db.exec(select(Conversation.id).where(Conversation.external_id == friend)).one()
+
+
+def test_page_api_still_returns_total(db: Session) -> None:
+    conversation_id = seed_messages(db, 5)
+    result = ConversationService.get_messages(conversation_id, page=1, page_size=3)
+
+    assert result["total"] == 5
+    assert result["has_more"] is True
+    assert [m.content for m in result["messages"]] == ["消息2", "消息3", "消息4"]
+
+
+def test_before_id_walks_history_without_gaps(db: Session) -> None:
+    conversation_id = seed_messages(db, 23)
+    page = ConversationService.get_messages_keyset(conversation_id, limit=10)
+    contents = [m.content for m in page["messages"]]
+
+    while page["has_more"]:
+        page = ConversationService.get_messages_keyset(
+            conversation_id, before_id=page["messages"][0].id, limit=10
+        )
+        contents = [m.content for m in page["messages"]] + contents
+
+    assert contents == [f"消息{i}" for i in range(23)]
+
+
+def test_after_id_returns_newer_messages(db: Session) -> None:
+    conversation_id = seed_messages(db, 6)
+    oldest = ConversationService.get_messages(conversation_id, page=2, page_size=3)["messages"]
+
+    page = ConversationService.get_messages_keyset(conversation_id, after_id=oldest[0].id, limit=3)
+    assert [m.content for m in page["messages"]] == ["消息1", "消息2", "消息3"]
+    assert page["has_more"] is True
+
+    page = ConversationService.get_messages_keyset(conversation_id, after_id=page["messages"][-1].id, limit=3)
+    assert [m.content for m in page["messages"]] == ["消息4", "消息5"]
+    assert page["has_more"] is False
+
+
+def test_keyset_rejects_unknown_anchor(db: Session) -> None:
+    conversation_id = seed_messages(db, 1)
+    with pytest.raises(ValueError):
+        ConversationService.get_messages_keyset(conversation_id, before_id=-1)
+    with pytest.raises(ValueError):
+        ConversationService.get_messages_keyset(conversation_id, before_id=1, after_id=2)
+
+
+def test_senders_are_hydrated_once_per_page(db: Session) -> None:
+    bot = create_random_bot(db)
+    group = f"{random_lower_string()}@chatroom"
+    alice, bob = f"wxid_{random_lower_string()}", f"wxid_{random_lower_string()}"
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(bot, group, alice if i % 2 else bob, timestamp=1700000000 + i))
+        for i in range(20)
+    ])
+    conversation_id = db.exec(select(Conversation.id).where(Conversation.external_id == group)).one()
+
+    vip = Tag(name=f"vip_{random_lower_string()}")
+    new = Tag(name=f"new_{random_lower_string()}")
+    db.add(vip)
+    db.add(new)
+    db.commit()
+    alice_id = db.exec(select(Contact.id).where(Contact.wxid == alice)).one()
+    db.exec(insert(contact_tags_table).values([
+        {"contact_id": alice_id, "tag_id": vip.id},
+        {"contact_id": alice_id, "tag_id": new.id},
+    ]))
+    db.commit()
+
+    with count_statements() as counter:
+        page = ConversationService.get_messages_keyset(conversation_id, limit=20)
+    # 消息、发送者、发送者标签各一条
+    assert counter["statements"] == 3
+
+    messages = page["messages"]
+    assert len(messages) == 20
+    for message in messages:
+        expected = {vip.name, new.name} if message.sender.wxid == alice else set()
+        assert {tag.name for tag in message.sender.tags} == expected
+    assert len({id(message.sender) for message in messages}) == 2
+
+
+def test_compact_page_lists_each_sender_once(db: Session) -> None:
+    bot = create_random_bot(db)
+    group = f"{random_lower_string()}@chatroom"
+    members = [f"wxid_{random_lower_string()}" for _ in range(3)]
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(bot, group, members[i % 3], timestamp=1700000000 + i))
+        for i in range(12)
+    ])
+    conversation_id = db.exec(select(Conversation.id).where(Conversation.external_id == group)).one()
+
+    full = ConversationService.get_messages(conversation_id, page=1, page_size=12)
+    compact = ConversationService.get_messages(conversation_id, page=1, page_size=12, compact=True)
+
+    assert compact["total"] == full["total"] == 12
+    assert [m.id for m in compact["messages"]] == [m.id for m in full["messages"]]
+    assert set(compact["senders"]) == {m.sender_id for m in compact["messages"]}
+    assert len(compact["senders"]) == 3
+    for full_message, compact_message in zip(full["messages"], compact["messages"], strict=True):
+        assert compact["senders"][compact_message.sender_id] == full_message.sender
+        assert "sender" not in compact_message.model_dump()
+
+    keyset = ConversationService.get_messages_keyset(conversation_id, limit=5, compact=True)
+    assert len(keyset["messages"]) == 5
+    assert set(keyset["senders"]) == {m.sender_id for m in keyset["messages"]}
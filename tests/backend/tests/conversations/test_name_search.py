@@ -0,0 +1,117 @@
+import pytest
+from sqlmodel import Session, select
+
+from app.tests.utils.db import run_async
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations import search
+from modules.conversations.async_service import AsyncConversationService
+from modules.conversations.models import Contact, ContactUpdate, Conversation, MessageReportRequest
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts.models import WechatBot
+
+
+def report(bot: WechatBot, conversation_id: str, sender_wxid: str, sender_name: str, **kwargs) -> MessageReportRequest:
+    data = build_report(bot, conversation_id, sender_wxid, **kwargs)
+    data["sender"]["name"] = sender_name
+    return MessageReportRequest(**data)
+
+
+def seed(db: Session) -> tuple[WechatBot, str, str]:
+    """一个与“张三”的私聊和一个“产品交流群”，返回 (机器人, 张三的wxid, 群ID)"""
+    bot = create_random_bot(db)
+    suffix = random_lower_string()[:8]
+    zhangsan = f"wxid_zs_{suffix}"
+    group = f"{suffix}@chatroom"
+    private = report(bot, zhangsan, zhangsan, "张三", conversation_type="private")
+    grouped = report(bot, group, f"wxid_ls_{suffix}", "李四丰")
+    grouped.conversation_topic = f"产品交流群{suffix}"
+    ConversationService.process_message_reports([private, grouped])
+    return bot, zhangsan, group
+
+
+def test_search_conversations_by_topic_substring(db: Session) -> None:
+    bot, _, group = seed(db)
+
+    result = ConversationService.search_conversations(bot.id, "交流")
+
+    assert [conv.external_id for conv in result["conversations"]] == [group]
+
+
+def test_search_contacts_links_private_conversation(db: Session) -> None:
+    bot, zhangsan, _ = seed(db)
+    private_id = db.exec(select(Conversation.id).where(Conversation.external_id == zhangsan)).one()
+
+    result = ConversationService.search_conversations(bot.id, "张")
+
+    assert [(hit.wxid, hit.conversation_id) for hit in result["contacts"]] == [(zhangsan, private_id)]
+
+
+def test_search_contacts_without_private_conversation(db: Session) -> None:
+    bot, _, _ = seed(db)
+
+    hits = ConversationService.search_conversations(bot.id, "四丰")["contacts"]
+
+    assert [hit.wx_name for hit in hits] == ["李四丰"]
+    assert hits[0].conversation_id is None
+
+
+def test_search_is_scoped_to_bot(db: Session) -> None:
+    seed(db)
+    other_bot = create_random_bot(db)
+
+    result = ConversationService.search_conversations(other_bot.id, "张三")
+
+    assert result == {"conversations": [], "contacts": []}
+
+
+def test_search_prefers_prefix_matches(db: Session) -> None:
+    bot, zhangsan, _ = seed(db)
+    contact_id = db.exec(select(Contact.id).where(Contact.wxid == zhangsan)).one()
+    ConversationService.update_contact(contact_id, ContactUpdate(remark_name="老张三"))
+    ConversationService.process_message_reports([
+        report(bot, f"{random_lower_string()}@chatroom", f"wxid_{random_lower_string()}", "张三丰")
+    ])
+
+    names = [hit.remark_name or hit.wx_name for hit in ConversationService.search_conversations(bot.id, "张三")["contacts"]]
+
+    assert names == ["张三丰", "老张三"]
+
+
+def test_search_rejects_blank_query() -> None:
+    with pytest.raises(ValueError):
+        ConversationService.search_conversations(1, "  ")
+
+
+def test_async_search_matches_sync(db: Session) -> None:
+    bot, _, _ = seed(db)
+
+    assert run_async(AsyncConversationService.search_conversations(bot.id, "张")) == \
+        ConversationService.search_conversations(bot.id, "张")
+
+
+def test_pinyin_keys() -> None:
+    pytest.importorskip("pypinyin")
+
+    assert search.pinyin_keys("张三", "Zhang San") == "zhangsan|zs"
+    assert search.pinyin_keys(None, "abc") is None
+
+
+def test_search_by_pinyin_and_initials(db: Session) -> None:
+    pytest.importorskip("pypinyin")
+    bot, zhangsan, group = seed(db)
+
+    assert [hit.wxid for hit in ConversationService.search_conversations(bot.id, "zhangsan")["contacts"]] == [zhangsan]
+    assert [hit.wxid for hit in ConversationService.search_conversations(bot.id, "ZS")["contacts"]] == [zhangsan]
+    assert [conv.external_id for conv in ConversationService.search_conversations(bot.id, "cpjl")["conversations"]] == [group]
+
+
+def test_update_contact_refreshes_pinyin(db: Session) -> None:
+    pytest.importorskip("pypinyin")
+    _, zhangsan, _ = seed(db)
+    contact_id = db.exec(select(Contact.id).where(Contact.wxid == zhangsan)).one()
+
+    ConversationService.update_contact(contact_id, ContactUpdate(remark_name="王五"))
+
+    db.expire_all()
+    assert db.get(Contact, contact_id).name_pinyin == "wangwu|ww|zhangsan|zs"
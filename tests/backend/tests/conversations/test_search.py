@@ -0,0 +1,156 @@
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, select
+
+from app.tests.utils.db import run_async
+from app.tests.utils.utils import random_lower_string
+from app.tests.utils.wechat_bot import build_report, create_random_bot
+from modules.conversations import search
+from modules.conversations.async_service import AsyncConversationService
+from modules.conversations.models import Contact, MessageReportRequest
+from modules.conversations.service import ConversationService
+from modules.wechat_accounts.models import WechatBot
+
+
+def test_split_terms_dedupes_and_drops_blanks() -> None:
+    assert search.split_terms("  价格 优惠  价格 ") == ["价格", "优惠"]
+    assert search.split_terms("   ") == []
+
+
+def test_escape_like_treats_wildcards_literally() -> None:
+    assert search.escape_like("50%_off\\") == "50\\%\\_off\\\\"
+
+
+def test_highlight_marks_every_hit_in_snippet() -> None:
+    snippet, highlights = search.highlight("请问这款产品的价格是多少？有优惠吗", ["价格", "优惠"])
+
+    assert snippet == "请问这款产品的价格是多少？有优惠吗"
+    assert [snippet[start:end] for start, end in highlights] == ["价格", "优惠"]
+
+
+def test_highlight_trims_long_text_around_first_hit() -> None:
+    text = "前" * 100 + "关键词" + "后" * 100
+    snippet, highlights = search.highlight(text, ["关键词"], context=5)
+
+    assert snippet.startswith(search.ELLIPSIS) and snippet.endswith(search.ELLIPSIS)
+    assert [snippet[start:end] for start, end in highlights] == ["关键词"]
+
+
+def test_highlight_is_case_insensitive_and_merges_overlaps() -> None:
+    snippet, highlights = search.highlight("Hello WORLD", ["world", "orl"])
+
+    assert highlights == [[6, 11]]
+
+
+def seed(db: Session) -> tuple[WechatBot, str]:
+    bot = create_random_bot(db)
+    group = f"{random_lower_string()}@chatroom"
+    messages = [
+        ("alice", "这款产品的价格是多少"),
+        ("bob", "价格可以再优惠一点吗"),
+        ("alice", "今天天气不错"),
+        ("bob", "满100减50%_活动"),
+    ]
+    ConversationService.process_message_reports([
+        MessageReportRequest(**build_report(
+            bot, group, f"{sender}_{group}", message_id=f"m{i}", content=content,
+            timestamp=1700000000 + i * 3600
+        ))
+        for i, (sender, content) in enumerate(messages)
+    ])
+    return bot, group
+
+
+def test_search_messages_matches_chinese_substrings(db: Session) -> None:
+    bot, _ = seed(db)
+
+    result = ConversationService.search_messages([bot.id], "价格")
+
+    assert [hit.snippet for hit in result["hits"]] == ["价格可以再优惠一点吗", "这款产品的价格是多少"]
+    assert result["has_more"] is False
+    hit = result["hits"][0]
+    assert hit.snippet[hit.highlights[0][0]:hit.highlights[0][1]] == "价格"
+
+
+def test_search_messages_requires_all_terms(db: Session) -> None:
+    bot, _ = seed(db)
+
+    result = ConversationService.search_messages([bot.id], "价格 优惠")
+
+    assert [hit.snippet for hit in result["hits"]] == ["价格可以再优惠一点吗"]
+
+
+def test_search_messages_matches_wildcards_literally(db: Session) -> None:
+    bot, _ = seed(db)
+
+    assert [hit.snippet for hit in ConversationService.search_messages([bot.id], "50%_")["hits"]] == \
+        ["满100减50%_活动"]
+    assert ConversationService.search_messages([bot.id], "5_%")["hits"] == []
+
+
+def test_search_messages_filters(db: Session) -> None:
+    bot, group = seed(db)
+    other_bot, _ = seed(db)
+    alice_id = db.exec(select(Contact.id).where(Contact.wxid == f"alice_{group}")).one()
+
+    by_sender = ConversationService.search_messages([bot.id], "价格", sender_id=alice_id)
+    assert [hit.snippet for hit in by_sender["hits"]] == ["这款产品的价格是多少"]
+
+    by_date = ConversationService.search_messages(
+        [bot.id], "价格", end_at=datetime.fromtimestamp(1700000000 + 3600)
+    )
+    assert [hit.snippet for hit in by_date["hits"]] == ["这款产品的价格是多少"]
+
+    assert all(hit.wechat_bot_id == bot.id for hit in by_sender["hits"])
+    assert len(ConversationService.search_messages([bot.id, other_bot.id], "50%_")["hits"]) == 2
+
+
+def test_search_messages_paginates_with_cursor(db: Session) -> None:
+    bot, _ = seed(db)
+
+    first = ConversationService.search_messages([bot.id], "价格", limit=1)
+    second = ConversationService.search_messages([bot.id], "价格", limit=1, cursor=first["next_cursor"])
+
+    assert first["has_more"] is True
+    assert second["has_more"] is False
+    assert [hit.snippet for hit in first["hits"] + second["hits"]] == ["价格可以再优惠一点吗", "这款产品的价格是多少"]
+
+
+def test_search_messages_rejects_blank_query() -> None:
+    with pytest.raises(ValueError):
+        ConversationService.search_messages([1], "   ")
+
+
+def test_requires_scope_only_when_no_term_is_indexable() -> None:
+    assert search.requires_scope(["价格"])
+    assert search.requires_scope(["价", "优惠"])
+    assert not search.requires_scope(["价格", "优惠券"])
+
+
+def test_short_terms_require_a_scope(db: Session) -> None:
+    bot, _ = seed(db)
+    other_bot, _ = seed(db)
+    conversation_id = ConversationService.search_messages([bot.id], "价格")["hits"][0].conversation_id
+
+    # 跨机器人搜索 2 个字的关键词用不上三元组索引，拒绝
+    with pytest.raises(ValueError, match="至少 3 个字"):
+        ConversationService.search_messages([bot.id, other_bot.id], "价格")
+    with pytest.raises(ValueError, match="至少 3 个字"):
+        run_async(AsyncConversationService.search_messages([bot.id, other_bot.id], "价格"))
+
+    # 限定到会话后允许
+    in_conversation = ConversationService.search_messages(
+        [bot.id, other_bot.id], "价格", conversation_id=conversation_id
+    )
+    assert [hit.snippet for hit in in_conversation["hits"]] == ["价格可以再优惠一点吗", "这款产品的价格是多少"]
+
+    # 只要有一个关键词能用上索引就不需要限定范围
+    assert len(ConversationService.search_messages([bot.id, other_bot.id], "价格 价格是")["hits"]) == 2
+
+
+def test_async_search_matches_sync(db: Session) -> None:
+    bot, _ = seed(db)
+
+    assert run_async(AsyncConversationService.search_messages([bot.id], "价格")) == \
+        ConversationService.search_messages([bot.id], "价格")
@@ -0,0 +1,37 @@
+import asyncio
+from collections.abc import Coroutine, Generator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+from sqlalchemy import event
+
+from app.core.db import async_engine, engine
+
+T = TypeVar("T")
+
+
+@contextmanager
+def count_statements() -> Generator[dict[str, int], None, None]:
+    """统计代码块内通过 engine 执行的SQL条数"""
+    counter = {"statements": 0}
+
+    def before_cursor_execute(*_) -> None:
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """在新的事件循环中运行协程，结束后关闭绑定在该循环上的异步连接"""
+
+    async def run() -> T:
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run())
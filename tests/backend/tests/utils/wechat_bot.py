@@ -0,0 +1,58 @@
+import random
+import string
+
+from sqlmodel import Session
+
+from app import crud
+from app.models import User, UserCreate
+from app.tests.utils.utils import random_lower_string
+from modules.wechat_accounts.models import WechatBot
+
+
+def create_random_owner(db: Session) -> User:
+    phone = "1000" + "".join(random.choices(string.digits, k=7))
+    user_in = UserCreate(
+        username=random_lower_string()[:20], phone=phone, password=random_lower_string()
+    )
+    return crud.create_user(session=db, user_create=user_in)
+
+
+def create_random_bot(db: Session) -> WechatBot:
+    owner = create_random_owner(db)
+    bot = WechatBot(
+        name=random_lower_string(),
+        owner_id=owner.id,
+        wxid=f"wxid_{random_lower_string()}",
+        hashed_password=random_lower_string(),
+    )
+    db.add(bot)
+    db.commit()
+    db.refresh(bot)
+    return bot
+
+
+def build_report(
+    bot: WechatBot,
+    conversation_id: str,
+    sender_wxid: str,
+    *,
+    conversation_type: str = "group",
+    participants: list[dict[str, str]] | None = None,
+    message_id: str | None = None,
+    content: str = "你好",
+    timestamp: int = 1700000000,
+) -> dict:
+    return {
+        "bot_id": bot.wxid,
+        "conversation_id": conversation_id,
+        "conversation_topic": f"topic {conversation_id}",
+        "conversation_type": conversation_type,
+        "sender": {"id": sender_wxid, "name": sender_wxid},
+        "message": {
+            "id": message_id or random_lower_string(),
+            "type": "text",
+            "content": content,
+            "timestamp": timestamp,
+        },
+        "participants": participants,
+    }
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+from wxbot.async_runtime import AsyncBotRuntime
+from wxbot.send_scheduler import SendScheduler
+
+
+class FakeBot:
+    def __init__(self, ai_delay: float) -> None:
+        self.config = {"loop_interval": 0.01}
+        self.ai_delay = ai_delay
+        self.sent: list[tuple[str, str]] = []
+        self.send_threads: set[int] = set()
+        self.send_scheduler = SendScheduler()
+
+    def dispatch_reply(self, chat_id, sender, content, switch_chat=True):
+        raise AssertionError("should be replaced by the runtime")
+
+    def generate_reply_chunks(self, content, sender, chat_id):
+        time.sleep(self.ai_delay)
+        yield f"re:{content}"
+
+    def queue_reply(self, chat_id, reply, sender, switch_chat=True):
+        self.send_scheduler.enqueue(chat_id, reply, sender, switch_chat)
+
+    def flush_outbox(self):
+        return self.send_scheduler.drain(self.send_reply)
+
+    def send_reply(self, chat_id, ai_response, sender, switch_chat=True):
+        self.send_threads.add(threading.get_ident())
+        self.sent.append((chat_id, ai_response))
+        return True
+
+
+def run_replies(runtime: AsyncBotRuntime, replies: list[tuple[str, str]]) -> float:
+    async def scenario() -> float:
+        runtime.start()
+        start = time.perf_counter()
+        for chat_id, content in replies:
+            runtime.submit_reply(chat_id, "alice", content)
+        await runtime.drain()
+        runtime.dispatcher.shutdown()
+        return time.perf_counter() - start
+
+    return asyncio.run(scenario())
+
+
+def test_replies_run_concurrently() -> None:
+    bot = FakeBot(ai_delay=0.2)
+    runtime = AsyncBotRuntime(bot, num_workers=10, log=lambda _: None)
+    elapsed = run_replies(runtime, [(f"chat{i}", f"q{i}") for i in range(10)])
+    assert len(bot.sent) == 10
+    # 10 serial calls would take 2s
+    assert elapsed < 1.5
+    # sends happen on the event loop thread only
+    assert bot.send_threads == {threading.get_ident()}
+
+
+def test_replies_within_a_chat_stay_ordered() -> None:
+    bot = FakeBot(ai_delay=0.01)
+    runtime = AsyncBotRuntime(bot, num_workers=4, log=lambda _: None)
+    run_replies(runtime, [("chat", f"q{i}") for i in range(10)])
+    # consecutive replies may be coalesced into one message, order is kept
+    assert {chat_id for chat_id, _ in bot.sent} == {"chat"}
+    assert "\n".join(reply for _, reply in bot.sent).split("\n") == [f"re:q{i}" for i in range(10)]
+
+
+def test_run_restores_dispatch_on_cancel() -> None:
+    bot = FakeBot(ai_delay=0)
+    polls = []
+
+    def all_listen_mode(last_time):
+        polls.append(last_time)
+        if len(polls) == 1:
+            bot.dispatch_reply("chat", "bob", "hello")
+        return last_time
+
+    bot.AllListen_mode = all_listen_mode
+    original = bot.dispatch_reply
+    runtime = AsyncBotRuntime(bot, log=lambda _: None)
+
+    async def scenario() -> None:
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+    assert len(polls) > 1
+    assert bot.sent == [("chat", "re:hello")]
+    assert bot.dispatch_reply == original
+
+
+def test_stream_chunks_are_sent_in_order() -> None:
+    bot = FakeBot(ai_delay=0)
+
+    def generate_reply_chunks(content, sender, chat_id):
+        yield "first"
+        time.sleep(0.05)
+        yield "rest"
+
+    bot.generate_reply_chunks = generate_reply_chunks
+    runtime = AsyncBotRuntime(bot, log=lambda _: None)
+    run_replies(runtime, [("chat", "q")])
+    assert bot.sent[0] == ("chat", "first")
+    assert "\n".join(reply for _, reply in bot.sent) == "first\nrest"
+    assert bot.send_threads == {threading.get_ident()}
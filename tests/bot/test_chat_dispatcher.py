@@ -0,0 +1,73 @@
+import threading
+import time
+
+from wxbot.chat_dispatcher import ChatDispatcher
+
+
+def quiet(_: str) -> None:
+    pass
+
+
+def test_chats_run_in_parallel_and_stay_ordered() -> None:
+    dispatcher = ChatDispatcher(num_workers=4, log=quiet)
+    results: dict[str, list[int]] = {}
+    lock = threading.Lock()
+
+    def make_job(chat_id: str, seq: int):
+        def job() -> None:
+            time.sleep(0.01)
+            with lock:
+                results.setdefault(chat_id, []).append(seq)
+        return job
+
+    chats = [f"chat{i}" for i in range(8)]
+    start = time.perf_counter()
+    for seq in range(5):
+        for chat_id in chats:
+            assert dispatcher.submit(chat_id, make_job(chat_id, seq))
+    assert dispatcher.join(timeout=5)
+    elapsed = time.perf_counter() - start
+    dispatcher.shutdown()
+
+    assert all(results[chat_id] == list(range(5)) for chat_id in chats)
+    # 40 jobs of 10ms run serially would take 0.4s
+    assert elapsed < 0.35
+
+
+def test_queue_depth_limit_drops_and_counts() -> None:
+    dispatcher = ChatDispatcher(num_workers=1, max_queue_per_chat=2, log=quiet)
+    release = threading.Event()
+    assert dispatcher.submit("busy", release.wait)
+    assert dispatcher.submit("busy", lambda: None)
+    assert not dispatcher.submit("busy", lambda: None)
+    assert dispatcher.pending("busy") == 2
+    release.set()
+    assert dispatcher.join(timeout=5)
+    dispatcher.shutdown()
+
+    stats = dispatcher.stats()["busy"]
+    assert stats["submitted"] == 2
+    assert stats["processed"] == 2
+    assert stats["dropped"] == 1
+    assert stats["max_pending"] == 2
+    assert stats["pending"] == 0
+
+
+def test_failed_jobs_are_counted() -> None:
+    dispatcher = ChatDispatcher(num_workers=2, log=quiet)
+
+    def boom() -> None:
+        raise RuntimeError("boom")
+
+    dispatcher.submit("chat", boom)
+    dispatcher.submit("chat", lambda: None)
+    assert dispatcher.join(timeout=5)
+    dispatcher.shutdown()
+    stats = dispatcher.stats()["chat"]
+    assert (stats["failed"], stats["processed"]) == (1, 1)
+
+
+def test_shard_is_stable() -> None:
+    dispatcher = ChatDispatcher(num_workers=3, log=quiet)
+    assert dispatcher.shard("群聊A") == dispatcher.shard("群聊A")
+    dispatcher.shutdown()
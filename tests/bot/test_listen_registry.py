@@ -0,0 +1,82 @@
+import time
+
+from wxbot.listen_registry import ListenRegistry
+
+
+def test_add_touch_and_lookup() -> None:
+    registry = ListenRegistry()
+    registry.add("A", 10)
+    assert "A" in registry
+    assert "B" not in registry
+    assert registry.touch_if_listened("A", 20)
+    assert not registry.touch_if_listened("B", 20)
+    assert registry.last_active("A") == 20
+    assert len(registry) == 1
+
+
+def test_expired_uses_latest_activity() -> None:
+    registry = ListenRegistry()
+    registry.add("A", 0)
+    registry.add("B", 5)
+    registry.touch("A", 50)
+    assert registry.expired(now=100, timeout=90) == ["B"]
+    # not removed until the caller confirms
+    assert registry.expired(now=100, timeout=90) == ["B"]
+    registry.remove("B")
+    assert registry.expired(now=100, timeout=90) == []
+    assert registry.expired(now=140, timeout=90) == ["A"]
+
+
+def test_readded_chat_is_not_expired_by_stale_entry() -> None:
+    registry = ListenRegistry()
+    registry.add("A", 0)
+    registry.remove("A")
+    registry.add("A", 100)
+    assert registry.expired(now=150, timeout=90) == []
+
+
+def test_heap_stays_bounded_under_frequent_touches() -> None:
+    registry = ListenRegistry()
+    for i in range(10_000):
+        registry.touch("A", i)
+    assert len(registry._heap) <= 2 * len(registry) + 64
+
+
+
+def test_same_timestamp_touches_expire_once() -> None:
+    registry = ListenRegistry()
+    registry.add("a", 0)
+    registry.touch_if_listened("a", 5)
+    registry.touch_if_listened("a", 5)
+    assert registry.expired(now=100, timeout=90) == ["a"]
+
+
+def test_readd_with_same_timestamp_expires_once() -> None:
+    registry = ListenRegistry()
+    registry.add("a", 5)
+    registry.remove("a")
+    registry.add("a", 5)
+    assert registry.expired(now=100, timeout=90) == ["a"]
+    assert registry.expired(now=100, timeout=90) == ["a"]
+
+
+def _loop_cost(chat_count: int, rounds: int = 2000) -> float:
+    registry = ListenRegistry()
+    now = 0.0
+    for i in range(chat_count):
+        registry.add(f"chat{i}", now)
+    start = time.perf_counter()
+    for i in range(rounds):
+        now += 0.001
+        chat_id = f"chat{i % chat_count}"
+        assert chat_id in registry
+        registry.touch(chat_id, now)
+        registry.expired(now, timeout=180)
+    return (time.perf_counter() - start) / rounds
+
+
+def test_benchmark_loop_cost_with_thousands_of_chats() -> None:
+    small = min(_loop_cost(10) for _ in range(3))
+    large = min(_loop_cost(10_000) for _ in range(3))
+    # lookup, touch and expiry check per loop iteration stay O(log n)
+    assert large < small * 5
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+
+from wxbot.message_cursor import MessageCursor
+
+
+def make_history(size: int) -> list[list[str]]:
+    return [[f"user{i % 7}", f"msg {i}"] for i in range(size)]
+
+
+def test_first_advance_falls_back_to_full_scan() -> None:
+    cursor = MessageCursor()
+    history = make_history(5)
+    assert cursor.advance("chat", history) is None
+    assert cursor.has_cursor("chat")
+
+
+def test_advance_returns_only_new_records() -> None:
+    cursor = MessageCursor()
+    history = make_history(10)
+    cursor.advance("chat", history)
+    history += [["alice", "new 1"], ["bob", "new 2"]]
+    assert cursor.advance("chat", history) == [["alice", "new 1"], ["bob", "new 2"]]
+    assert cursor.advance("chat", history) == []
+
+
+def test_duplicate_contents_use_multi_record_anchor() -> None:
+    cursor = MessageCursor(anchor_size=3)
+    history = [["a", "1"], ["b", "ok"], ["a", "ok"]]
+    cursor.advance("chat", history)
+    history += [["a", "ok"]]
+    assert cursor.advance("chat", history) == [["a", "ok"]]
+
+
+def test_message_ids_take_precedence() -> None:
+    cursor = MessageCursor()
+    old = [SimpleNamespace(id="1", sender="a", content="hi"), SimpleNamespace(id="2", sender="a", content="hi")]
+    cursor.advance("chat", old)
+    new = SimpleNamespace(id="3", sender="a", content="hi")
+    assert cursor.advance("chat", old + [new]) == [new]
+
+
+def test_lost_anchor_resets_cursor() -> None:
+    cursor = MessageCursor()
+    cursor.advance("chat", make_history(10))
+    assert cursor.advance("chat", [["x", "other window"]]) is None
+    assert cursor.advance("chat", [["x", "other window"], ["y", "next"]]) == [["y", "next"]]
+
+
+def test_cursors_are_per_chat() -> None:
+    cursor = MessageCursor()
+    cursor.advance("a", make_history(3))
+    assert not cursor.has_cursor("b")
+    cursor.reset("a")
+    assert not cursor.has_cursor("a")
+
+
+def _per_event_cost(history_size: int, events: int = 200) -> float:
+    cursor = MessageCursor()
+    history = make_history(history_size)
+    cursor.advance("chat", history)
+    start = time.perf_counter()
+    for i in range(events):
+        history.append(["alice", f"event {i}"])
+        assert cursor.advance("chat", history) == [["alice", f"event {i}"]]
+    return (time.perf_counter() - start) / events
+
+
+def test_benchmark_per_event_cost_is_independent_of_history() -> None:
+    small = min(_per_event_cost(100) for _ in range(3))
+    large = min(_per_event_cost(100_000) for _ in range(3))
+    # history grows 1000x, per-event cost must stay in the same order of magnitude
+    assert large < small * 5
@@ -0,0 +1,97 @@
+from wxbot.reply_cache import ReplyCache, config_fingerprint, normalize_question
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_normalize_question() -> None:
+    assert normalize_question(" 价格是多少？ ") == "价格是多少"
+    assert normalize_question("价格是多少?") == normalize_question("价格，是多少！")
+    assert normalize_question("ＡＢＣ 优惠") == "abc优惠"
+    assert normalize_question("") == ""
+
+
+def test_hit_and_miss_counters() -> None:
+    cache = ReplyCache()
+    assert cache.get("bot", "价格是多少") is None
+    cache.put("bot", "价格是多少", "199元")
+    assert cache.get("bot", "价格是多少？") == "199元"
+    assert cache.get("other-bot", "价格是多少") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 1)
+    assert stats["hit_rate"] == round(1 / 3, 4)
+
+
+def test_ttl_expiry() -> None:
+    clock = FakeClock()
+    cache = ReplyCache(ttl=10, clock=clock)
+    cache.put("bot", "q", "a")
+    clock.now = 9
+    assert cache.get("bot", "q") == "a"
+    clock.now = 10
+    assert cache.get("bot", "q") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction() -> None:
+    cache = ReplyCache(max_entries=2)
+    cache.put("bot", "a", "1")
+    cache.put("bot", "b", "2")
+    cache.get("bot", "a")
+    cache.put("bot", "c", "3")
+    assert cache.get("bot", "b") is None
+    assert cache.get("bot", "a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_per_bot_configuration() -> None:
+    clock = FakeClock()
+    cache = ReplyCache(ttl=100, clock=clock)
+    cache.configure("short", ttl=1)
+    cache.configure("off", enabled=False)
+    cache.put("short", "q", "a")
+    cache.put("off", "q", "a")
+    cache.put("default", "q", "a")
+    clock.now = 5
+    assert cache.get("short", "q") is None
+    assert cache.get("off", "q") is None
+    assert cache.get("default", "q") == "a"
+
+
+def test_config_version_change_invalidates_bot() -> None:
+    cache = ReplyCache()
+    cache.set_config_version("bot", "v1")
+    cache.put("bot", "q", "a")
+    cache.put("other", "q", "a")
+    cache.set_config_version("bot", "v1")
+    assert cache.get("bot", "q") == "a"
+    cache.set_config_version("bot", "v2")
+    assert cache.get("bot", "q") is None
+    assert cache.get("other", "q") == "a"
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
+
+
+def test_prompt_change_misses_cache() -> None:
+    cache = ReplyCache()
+    cache.set_config_version("bot", config_fingerprint("你是客服", [2, 1]))
+    cache.put("bot", "价格是多少", "199元")
+    # 知识库顺序不同视为同一配置
+    cache.set_config_version("bot", config_fingerprint("你是客服", [1, 2]))
+    assert cache.get("bot", "价格是多少") == "199元"
+    cache.set_config_version("bot", config_fingerprint("你是销售", [1, 2]))
+    assert cache.get("bot", "价格是多少") is None
+    cache.put("bot", "价格是多少", "限时优惠 99 元")
+    cache.set_config_version("bot", config_fingerprint("你是销售", [1]))
+    assert cache.get("bot", "价格是多少") is None
+
+
+def test_disabled_cache() -> None:
+    cache = ReplyCache(max_entries=0)
+    cache.put("bot", "q", "a")
+    assert cache.get("bot", "q") is None
@@ -0,0 +1,31 @@
+from wxbot.reply_stream import ReplyChunker
+
+
+def feed_all(chunker: ReplyChunker, deltas: list[str]) -> list[str]:
+    chunks = [chunk for chunk in (chunker.feed(delta) for delta in deltas) if chunk]
+    rest = chunker.finish()
+    return chunks + ([rest] if rest else [])
+
+
+def test_first_sentence_is_emitted_early() -> None:
+    chunker = ReplyChunker(min_length=4)
+    assert chunker.feed("您好，这款产品") is None
+    assert chunker.feed("的价格是199元。") is None  # may still be followed by punctuation
+    assert chunker.feed("目前") == "您好，这款产品的价格是199元。"
+    assert chunker.feed("有优惠活动。\n\n欢迎咨询") is None
+    assert chunker.finish() == "目前有优惠活动。\n欢迎咨询"
+
+
+def test_paragraph_break_ends_first_chunk() -> None:
+    chunks = feed_all(ReplyChunker(min_length=2), ["第一段内容\n\n", "第二段"])
+    assert chunks == ["第一段内容", "第二段"]
+
+
+def test_short_prefix_is_not_split() -> None:
+    chunks = feed_all(ReplyChunker(min_length=8), ["好的。", "这款产品的价格是199元。", "谢谢"])
+    assert chunks == ["好的。这款产品的价格是199元。", "谢谢"]
+
+
+def test_answer_without_boundary_is_sent_once() -> None:
+    assert feed_all(ReplyChunker(), ["一段", "没有标点的回复"]) == ["一段没有标点的回复"]
+    assert feed_all(ReplyChunker(), []) == []
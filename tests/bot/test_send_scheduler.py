@@ -0,0 +1,80 @@
+from wxbot.send_scheduler import SendScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str, bool]] = []
+
+    def __call__(self, chat_id, reply, sender, switch_chat):
+        self.calls.append((chat_id, reply, switch_chat))
+        return True
+
+
+def test_token_bucket_refills() -> None:
+    clock = FakeClock()
+    bucket = TokenBucket(2, clock)
+    for _ in range(2):
+        assert bucket.available()
+        bucket.take()
+    assert not bucket.available()
+    clock.now = 30
+    assert bucket.available()
+    assert TokenBucket(None, clock).available()
+
+
+def test_consecutive_replies_to_same_chat_are_coalesced() -> None:
+    scheduler = SendScheduler()
+    send = Recorder()
+    scheduler.enqueue("A", "a1", "u1", switch_chat=False)
+    scheduler.enqueue("B", "b1", "u2")
+    scheduler.enqueue("A", "a2", "u3")
+    scheduler.enqueue("A", "  ", "u3")
+    assert scheduler.drain(send) == 2
+    # grouped by chat: one window switch per chat per drain
+    assert send.calls == [("A", "a1\na2", True), ("B", "b1", True)]
+    stats = scheduler.stats()
+    assert (stats["enqueued"], stats["sent"], stats["coalesced"], stats["pending"]) == (3, 2, 1, 0)
+
+
+def test_bot_rate_limit_defers_sends() -> None:
+    clock = FakeClock()
+    scheduler = SendScheduler(max_replies_per_minute=2, clock=clock)
+    send = Recorder()
+    for chat_id in "ABC":
+        scheduler.enqueue(chat_id, f"to {chat_id}", "u")
+    assert scheduler.drain(send) == 2
+    assert scheduler.pending() == 1
+    assert scheduler.drain(send) == 0
+    clock.now = 30
+    assert scheduler.drain(send) == 1
+    assert [call[0] for call in send.calls] == ["A", "B", "C"]
+
+
+def test_chat_rate_limit_does_not_block_other_chats() -> None:
+    clock = FakeClock()
+    scheduler = SendScheduler(max_replies_per_chat_per_minute=1, clock=clock)
+    send = Recorder()
+    scheduler.enqueue("A", "a1", "u")
+    scheduler.drain(send)
+    scheduler.enqueue("A", "a2", "u")
+    scheduler.enqueue("B", "b1", "u")
+    assert scheduler.drain(send) == 1
+    assert send.calls[-1][0] == "B"
+    clock.now = 60
+    assert scheduler.drain(send) == 1
+    assert send.calls[-1][:2] == ("A", "a2")
+
+
+def test_failed_send_is_counted() -> None:
+    scheduler = SendScheduler()
+    scheduler.enqueue("A", "a1", "u")
+    assert scheduler.drain(lambda *args: False) == 0
+    assert scheduler.stats()["failed"] == 1
@@ -0,0 +1,69 @@
+import random
+
+from wxbot.trigger_matcher import MENTION, WAKE_WORD, TriggerMatcher
+
+
+def naive_should_respond(message: str, mentions: list[str], wake_words: list[str]) -> tuple[bool, str]:
+    """Reference implementation: the original loop over keywords."""
+    if any(keyword in message for keyword in mentions):
+        processed = message
+        for keyword in mentions:
+            processed = processed.replace(keyword, "").strip()
+        return True, processed
+    if any(word in message for word in wake_words):
+        return True, message.strip()
+    return False, ""
+
+
+def test_mention_is_stripped() -> None:
+    matcher = TriggerMatcher(["@小助手"], ["价格"])
+    match = matcher.match("@小助手 价格是多少 ")
+    assert match is not None
+    assert match.kind == MENTION
+    assert match.trigger == "@小助手"
+    assert match.content == "价格是多少"
+
+
+def test_wake_word_keeps_message() -> None:
+    matcher = TriggerMatcher(["@小助手"], ["优惠", "价格"])
+    match = matcher.match("  有没有优惠 ")
+    assert match == (WAKE_WORD, "优惠", "有没有优惠")
+
+
+def test_no_match() -> None:
+    assert TriggerMatcher(["@bot"], ["hi"]).match("hello world") is None
+    assert TriggerMatcher().match("anything") is None
+    assert TriggerMatcher(["@bot"]).match("") is None
+
+
+def test_overlapping_patterns() -> None:
+    matcher = TriggerMatcher(["@ab", "@abc"], ["bcd", "c"])
+    assert matcher.match("x@abcd").content == "xd"
+    assert matcher.scan("xbcd")[1] == "c"
+
+
+def test_matches_reference_implementation() -> None:
+    rng = random.Random(7)
+    alphabet = "ab@c价"
+    for _ in range(300):
+        mentions = ["@" + "".join(rng.choices(alphabet, k=rng.randint(1, 3))) for _ in range(2)]
+        wake_words = ["".join(rng.choices(alphabet, k=rng.randint(1, 3))) for _ in range(3)]
+        message = "".join(rng.choices(alphabet + " ", k=rng.randint(1, 12)))
+        if not message.strip():
+            continue
+        match = TriggerMatcher(mentions, wake_words).match(message)
+        expected = naive_should_respond(message, mentions, wake_words)
+        got = (True, match.content) if match else (False, "")
+        if len(mentions) == len(set(mentions)) and not any(
+            a != b and a in b for a in mentions for b in mentions
+        ):
+            assert got == expected, (message, mentions, wake_words)
+        else:
+            assert got[0] == expected[0]
+
+
+def test_many_wake_words() -> None:
+    words = [f"关键词{i}号" for i in range(1000)]
+    matcher = TriggerMatcher(["@bot"], words)
+    assert matcher.match("请问关键词999号怎么用").trigger == "关键词999号"
+    assert matcher.match("请问关键怎么用") is None
@@ -1,5 +1,5 @@
 import { getApiUrl } from '../config'
-import { getAuthHeaders } from '../auth'
+import { getAuthHeaders, getToken } from '../auth'
 
 // 类型定义
 export interface Conversation {
@@ -27,6 +27,16 @@ export interface Message {
   created_at: string
 }
 
+// 精简格式的消息：发送者见消息页的 senders
+export type CompactMessage = Omit<Message, 'sender'>
+
+export interface CompactMessagePage {
+  messages: CompactMessage[]
+  senders: Record<string, Contact>
+  total?: number
+  has_more: boolean
+}
+
 export interface Contact {
   id: number
   wxid: string
@@ -74,6 +84,75 @@ export interface AISuggestion {
   memory_summary?: string
 }
 
+// 会话与联系人搜索：conversation_id 为与该联系人的私聊会话
+export interface ContactSearchHit {
+  id: number
+  wxid: string
+  wx_name?: string
+  remark_name?: string
+  avatar?: string
+  conversation_id: number | null
+}
+
+export interface ConversationSearchResult {
+  conversations: Conversation[]
+  contacts: ContactSearchHit[]
+}
+
+// 消息搜索命中：highlights 为 snippet 中命中的 [起, 止) 字符偏移
+export interface MessageSearchHit {
+  id: number
+  conversation_id: number
+  wechat_bot_id: number
+  conversation_topic?: string
+  sender_id: number
+  sender_name?: string
+  type: Message['type']
+  created_at: string
+  snippet: string
+  highlights: [number, number][]
+}
+
+export interface MessageSearchPage {
+  hits: MessageSearchHit[]
+  next_cursor: string | null
+  has_more: boolean
+}
+
+// 实时推送事件
+export interface LiveMessageEvent {
+  id: number
+  conversation_id: number
+  wechat_bot_id: number
+  external_message_id?: string
+  type: Message['type']
+  content?: string
+  created_at: string
+  sender: {
+    id: number
+    wxid: string
+    wx_name?: string
+  }
+}
+
+export interface LiveConversationEvent {
+  id: number
+  wechat_bot_id: number
+  external_id: string
+  type: 'private' | 'group'
+  topic?: string
+  last_message_summary: string
+  last_message_at: string
+}
+
+export interface LiveEventHandlers {
+  onMessage?: (event: LiveMessageEvent) => void
+  onConversation?: (event: LiveConversationEvent) => void
+  // 推送积压被丢弃，需要重新拉取会话和消息列表
+  onResync?: () => void
+  onError?: (event: Event) => void
+}
+
 // API响应接口
 interface ApiResponse<T> {
   error: number
@@ -102,25 +181,142 @@ async function apiCall<T>(endpoint: string, data: any): Promise<T> {
   return result.body
 }
 
+// 条件请求缓存：令牌 + URL -> 最近一次响应的 ETag 与数据
+const conditionalCache = new Map<string, { etag: string, body: unknown }>()
+
+// GET 条件请求：带上次响应的 ETag，服务端返回 304 时复用缓存的数据
+async function conditionalGet<T>(
+  endpoint: string,
+  params: Record<string, string | number | null | undefined>
+): Promise<T> {
+  const search = new URLSearchParams()
+  for (const [key, value] of Object.entries(params)) {
+    if (value !== undefined && value !== null && value !== '') {
+      search.set(key, String(value))
+    }
+  }
+  const url = `${getApiUrl(endpoint)}?${search}`
+  const cacheKey = `${getToken() ?? ''} ${url}`
+  const cached = conditionalCache.get(cacheKey)
+
+  const response = await fetch(url, {
+    method: 'GET',
+    headers: {
+      ...getAuthHeaders(),
+      ...(cached && { 'If-None-Match': cached.etag })
+    },
+    // 由这里管理缓存，避免浏览器 HTTP 缓存把 304 转换为 200
+    cache: 'no-store'
+  })
+
+  if (response.status === 304 && cached) {
+    return cached.body as T
+  }
+  if (!response.ok) {
+    throw new Error(`API call failed: ${response.statusText}`)
+  }
+
+  const result: ApiResponse<T> = await response.json()
+
+  if (result.error !== 0) {
+    throw new Error(result.message || 'API call failed')
+  }
+
+  const etag = response.headers.get('ETag')
+  if (etag) {
+    conditionalCache.set(cacheKey, { etag, body: result.body })
+  }
+  return result.body
+}
+
 // API 函数
 export const conversationsApi = {
-  // 获取会话列表
+  // 获取会话列表（会话未变化时服务端返回 304，复用上次的结果）
   async getConversations(wechatAccountId: number, query?: string) {
-    return apiCall<{ conversations: Conversation[] }>('/api/v1/conversations/list', {
+    return conditionalGet<{ conversations: Conversation[] }>('/api/v1/conversations/list', {
       wechat_account_id: wechatAccountId,
       query
     })
   },
 
+  // 按游标分页获取会话列表
+  async getConversationsPage(wechatAccountId: number, limit: number, cursor?: string | null, query?: string) {
+    return conditionalGet<{ conversations: Conversation[], next_cursor: string | null, has_more: boolean }>(
+      '/api/v1/conversations/list',
+      {
+        wechat_account_id: wechatAccountId,
+        query,
+        limit,
+        cursor
+      }
+    )
+  },
+
   // 获取消息列表
   async getMessages(conversationId: number, page: number = 1, pageSize: number = 20) {
-    return apiCall<{ messages: Message[], total: number }>('/api/v1/conversations/messages/list', {
+    return apiCall<{ messages: Message[], total: number, has_more: boolean }>('/api/v1/conversations/messages/list', {
       conversation_id: conversationId,
       page,
       page_size: pageSize
     })
   },
 
+  // 按消息ID游标获取消息：beforeId 加载更早的历史，afterId 补拉更新的消息
+  async getMessagesByCursor(conversationId: number, cursor: { beforeId?: number, afterId?: number }, pageSize: number = 20) {
+    return apiCall<{ messages: Message[], has_more: boolean }>('/api/v1/conversations/messages/list', {
+      conversation_id: conversationId,
+      page_size: pageSize,
+      before_id: cursor.beforeId,
+      after_id: cursor.afterId
+    })
+  },
+
+  // 获取精简格式的消息页（发送者只在 senders 中出现一次）
+  async getCompactMessages(
+    conversationId: number,
+    options: { page?: number, beforeId?: number, afterId?: number } = {},
+    pageSize: number = 20
+  ) {
+    return apiCall<CompactMessagePage>('/api/v1/conversations/messages/list', {
+      conversation_id: conversationId,
+      page: options.page ?? 1,
+      page_size: pageSize,
+      before_id: options.beforeId,
+      after_id: options.afterId,
+      compact: true
+    })
+  },
+
+  // 边输入边搜索会话与联系人（支持拼音和首字母）
+  async searchConversations(wechatAccountId: number, query: string, limit: number = 10) {
+    return apiCall<ConversationSearchResult>('/api/v1/conversations/search', {
+      wechat_account_id: wechatAccountId,
+      query,
+      limit
+    })
+  },
+
+  // 搜索消息内容（空格分隔的多个关键词需全部命中），按时间倒序
+  async searchMessages(query: string, filters: {
+    wechatAccountId?: number
+    conversationId?: number
+    senderId?: number
+    startAt?: string
+    endAt?: string
+    cursor?: string
+  } = {}, limit: number = 20) {
+    return apiCall<MessageSearchPage>('/api/v1/conversations/messages/search', {
+      query,
+      wechat_account_id: filters.wechatAccountId,
+      conversation_id: filters.conversationId,
+      sender_id: filters.senderId,
+      start_at: filters.startAt,
+      end_at: filters.endAt,
+      cursor: filters.cursor,
+      limit
+    })
+  },
+
   // 获取会话详情
   async getConversationDetails(conversationId: number, contactId?: number) {
     return apiCall<ConversationDetail>('/api/v1/conversations/details/get', {
@@ -157,5 +353,27 @@ export const conversationsApi = {
   // 创建标签
   async createTag(name: string) {
     return apiCall<Tag>('/api/v1/conversations/tags/create', { name })
+  },
+
+  // 订阅新消息与会话摘要的实时推送（SSE），返回取消订阅函数
+  subscribeLiveEvents(wechatAccountIds: number[], handlers: LiveEventHandlers) {
+    const params = new URLSearchParams()
+    wechatAccountIds.forEach(id => params.append('wechat_account_id', String(id)))
+    const token = getToken()
+    if (token) {
+      params.set('access_token', token)
+    }
+
+    const source = new EventSource(getApiUrl(`/api/v1/conversations/stream?${params.toString()}`))
+    source.addEventListener('message', (event) => {
+      handlers.onMessage?.(JSON.parse((event as MessageEvent).data))
+    })
+    source.addEventListener('conversation', (event) => {
+      handlers.onConversation?.(JSON.parse((event as MessageEvent).data))
+    })
+    source.addEventListener('resync', () => handlers.onResync?.())
+    source.onerror = (event) => handlers.onError?.(event)
+
+    return () => source.close()
   }
 } 
\ No newline at end of file
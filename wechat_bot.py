@@ -1,8 +1,18 @@
+import asyncio
 import time
 from wxautox import WeChat
 import re
 from cozepy import Coze, TokenAuth, Message, ChatStatus, MessageContentType, ChatEventType, COZE_CN_BASE_URL
 
+from wxbot.async_runtime import AsyncBotRuntime
+from wxbot.chat_dispatcher import ChatDispatcher
+from wxbot.listen_registry import ListenRegistry
+from wxbot.message_cursor import MessageCursor
+from wxbot.reply_cache import ReplyCache, config_fingerprint
+from wxbot.reply_stream import ReplyChunker
+from wxbot.send_scheduler import SendScheduler
+from wxbot.trigger_matcher import TriggerMatcher
+
 def log(message):
     """日志输出函数"""
     current_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
@@ -12,7 +22,9 @@ class WeChatBot:
     def __init__(self):
         """初始化微信机器人"""
         self.wx = None
-        self.all_Mode_listen_list = []  # 监听列表，格式: [[chat_id, timestamp], ...]
+        self.listen_registry = ListenRegistry()  # 监听会话登记表: chat_id -> 最近消息时间
+        self.message_cursor = MessageCursor()  # 每个会话已处理消息的游标
+        self.dispatcher = None  # 同步模式下的回复工作线程池，run() 中创建
         
         # 获取用户输入的配置
         print("=== 微信机器人配置 ===")
@@ -24,6 +36,10 @@ class WeChatBot:
         wake_words = input("请输入唤醒词(多个唤醒词用-分隔，留空则只响应@消息): ")
         wake_words_list = [word.strip() for word in wake_words.split("-") if word.strip()] if wake_words.strip() else []
         
+        runtime_mode = input("请选择运行模式(sync/async，留空默认sync): ").strip().lower() or "sync"
+        stream_reply = input("是否启用流式回复，先发送第一段(y/N): ").strip().lower() == "y"
+        max_replies = input("请输入每分钟最多回复条数(留空不限制): ").strip()
+        
         # 配置参数
         self.config = {
             'listen_list': chatgroups,  # 要监听的群聊列表
@@ -33,8 +49,31 @@ class WeChatBot:
             'coze_api_token': coze_api_token,  # 扣子API Token
             'coze_bot_id': coze_bot_id,  # 扣子机器人ID
             'wake_words': wake_words_list,  # 唤醒词列表
+            'runtime_mode': runtime_mode if runtime_mode in ("sync", "async") else "sync",  # 运行模式
+            'reply_workers': 4,  # 生成回复的工作线程数（0 表示在主循环中逐条处理）
+            'max_pending_per_chat': 20,  # 每个会话最多排队的回复任务数
+            'stream_reply': stream_reply,  # 是否使用流式回复（第一段完整后立即发送）
+            'reply_cache_size': 1000,  # 回复缓存最大条数（0 表示关闭缓存）
+            'reply_cache_ttl': 600,  # 回复缓存过期时间（秒）
+            'system_prompt': None,  # 系统提示词，变化时回复缓存失效
+            'knowledge_base_ids': [],  # 关联的知识库ID，变化时回复缓存失效
+            'max_replies_per_minute': int(max_replies) if max_replies.isdigit() else None,  # 机器人每分钟最多回复条数
+            'max_replies_per_chat_per_minute': None,  # 单个会话每分钟最多回复条数
         }
         
+        # 出站消息调度：限流、合并同一会话的连续回复、按会话分组发送
+        self.send_scheduler = SendScheduler(
+            max_replies_per_minute=self.config['max_replies_per_minute'],
+            max_replies_per_chat_per_minute=self.config['max_replies_per_chat_per_minute'],
+        )
+        
+        # 常见问题回复缓存，键为 (扣子机器人ID, 归一化问题)
+        self.reply_cache = ReplyCache(
+            max_entries=self.config['reply_cache_size'],
+            ttl=self.config['reply_cache_ttl'],
+        )
+        self.invalidate_reply_cache(self.reply_config_version())
+        
         # 初始化扣子客户端
         self.coze = Coze(auth=TokenAuth(self.config['coze_api_token']), base_url=COZE_CN_BASE_URL)
         
@@ -52,6 +91,40 @@ class WeChatBot:
             except Exception as e:
                 log(f"获取微信昵称失败: {e}")
                 self.mention_keywords = []
+        
+        # 编译触发词匹配器（@提及 + 唤醒词），配置变化时需调用 refresh_trigger_matcher
+        self.trigger_matcher = None
+        self.refresh_trigger_matcher()
+    
+    def invalidate_reply_cache(self, config_version=None):
+        """
+        使回复缓存失效
+        机器人配置（系统提示词、知识库）变化时调用；传入新的配置版本时只在版本变化时清空
+        """
+        bot_id = self.config['coze_bot_id']
+        if config_version is None:
+            self.reply_cache.invalidate(bot_id)
+        else:
+            self.reply_cache.set_config_version(bot_id, config_version)
+    
+    def reply_config_version(self):
+        """影响回复内容的配置（系统提示词、知识库）对应的版本"""
+        return config_fingerprint(self.config['system_prompt'], self.config['knowledge_base_ids'])
+    
+    def update_config(self, **changes):
+        """
+        重新加载机器人配置
+        唤醒词变化时重建触发词匹配器；系统提示词或知识库变化时清空该机器人的回复缓存
+        """
+        self.config.update(changes)
+        if 'wake_words' in changes:
+            self.refresh_trigger_matcher()
+        self.invalidate_reply_cache(self.reply_config_version())
+        log(f"机器人配置已更新: {', '.join(changes)}")
+    
+    def refresh_trigger_matcher(self):
+        """根据当前@提及关键词和唤醒词重新构建匹配器"""
+        self.trigger_matcher = TriggerMatcher(self.mention_keywords, self.config['wake_words'])
     
     def init_wechat(self):
         """初始化微信连接"""
@@ -68,13 +141,15 @@ class WeChatBot:
         """检查消息中是否包含@提及方式"""
         if not message or not self.mention_keywords:
             return False
-        return any(keyword in message for keyword in self.mention_keywords)
+        mentions, _ = self.trigger_matcher.scan(message)
+        return bool(mentions)
     
     def contains_wake_words(self, message):
         """检查消息中是否包含唤醒词"""
         if not message or not self.config['wake_words']:
             return False
-        return any(wake_word in message for wake_word in self.config['wake_words'])
+        _, wake_word = self.trigger_matcher.scan(message)
+        return wake_word is not None
     
     def should_respond_to_message(self, message_content):
         """
@@ -84,19 +159,12 @@ class WeChatBot:
         if not message_content or not message_content.strip():
             return False, ""
         
-        # 检查是否被@了
-        if self.is_mentioned(message_content):
-            # 移除@提及部分，提取用户问题
-            processed_content = message_content
-            for keyword in self.mention_keywords:
-                processed_content = processed_content.replace(keyword, "").strip()
-            return True, processed_content
-        
-        # 检查是否包含唤醒词
-        if self.contains_wake_words(message_content):
-            return True, message_content.strip()
+        # 单次扫描同时检查@提及与唤醒词，@提及优先；被@时已移除@提及部分
+        trigger = self.trigger_matcher.match(message_content)
+        if trigger is None:
+            return False, ""
         
-        return False, ""
+        return True, trigger.content
     
     def new_msg_get_plus(self, chat_records):
         """
@@ -205,12 +273,14 @@ class WeChatBot:
                 # 若也没有 Time 消息，返回过滤后的所有对方消息
                 return [msg for msg in filtered if msg[0] not in ("Self", "Time")]
     
-    def next_message_handle(self):
+    def next_message_handle(self, chat_id=None):
         """处理next获取到的新消息，防止黑色流程漏洞消息"""
         try:
             all_message = self.wx.GetAllMessage()
             # print("all_message为: ",all_message)
-            new_msg = self.new_msg_get_plus(all_message)
+            # 优先只处理游标之后的新记录；首次处理或游标失效时退回全量过滤
+            new_records = self.message_cursor.advance(chat_id, all_message) if chat_id else None
+            new_msg = self.new_msg_get_plus(all_message if new_records is None else new_records)
             # print("过滤后的new_msg为: ", new_msg)
             return new_msg
         except Exception as e:
@@ -225,8 +295,8 @@ class WeChatBot:
             return False
         
         log(f"chat '{chat}' 不在监听列表，正在添加到列表")
-        self.all_Mode_listen_list.append([chat, time.time()])
-        log(f"当前监听列表: {[item[0] for item in self.all_Mode_listen_list]}")
+        self.listen_registry.add(chat, time.time())
+        log(f"当前监听会话数: {len(self.listen_registry)}")
         try:
             self.wx.AddListenChat(chat)
             log(f"成功添加 '{chat}' 到微信监听")
@@ -234,12 +304,12 @@ class WeChatBot:
         except Exception as e:
             log(f"添加监听失败 '{chat}': {e}")
             # 如果添加失败，从列表中移除
-            self.all_Mode_listen_list = [item for item in self.all_Mode_listen_list if item[0] != chat]
+            self.listen_registry.remove(chat)
             return False
     
     def is_chat_listened(self, chat):
         """判断当前会话是否已经在监听列表中"""
-        return any(listen_chat[0] == chat for listen_chat in self.all_Mode_listen_list)
+        return chat in self.listen_registry
     
     def process_message(self, chat_obj, message_data):
         """
@@ -263,20 +333,8 @@ class WeChatBot:
             if should_respond and processed_content.strip():
                 log(f"触发回复条件 - 聊天: {chat_info}, 发送者: {sender}, 处理后内容: {processed_content}")
                 
-                # 调用扣子API生成回复
-                ai_response = self.call_ai_api(processed_content, sender, chat_info)
-                
-                if ai_response and ai_response.strip():
-                    # 发送回复消息，@发送消息的人
-                    try:
-                        # 切换到对应聊天窗口并发送消息
-                        # self.wx.ChatWith(chat_info)
-                        self.wx.SendMsg(ai_response, who=chat_info)
-                        log(f"已回复 {chat_info}: {ai_response}，并@了 {sender}")
-                    except Exception as e:
-                        log(f"发送回复失败: {e}")
-                else:
-                    log(f"扣子API未返回有效回复，跳过发送")
+                # 调用扣子API生成回复并发送
+                self.dispatch_reply(chat_info, sender, processed_content, switch_chat=False)
             else:
                 log(f"消息未触发回复条件或内容为空，跳过处理")
             
@@ -308,21 +366,8 @@ class WeChatBot:
                         if should_respond:
                             log(f"触发回复条件 - 聊天: {chat_id}, 发送者: {sender}, 处理后内容: {processed_content}")
                             
-                            # 调用大模型API生成回复
-                            ai_response = self.call_ai_api(processed_content, sender, chat_id)
-                            
-                            if ai_response and ai_response.strip():
-                                # 发送回复消息，@发送消息的人
-                                try:
-                                    # 切换到对应聊天窗口
-                                    self.wx.ChatWith(chat_id)
-                                    # 发送消息，@发送消息的人
-                                    self.wx.SendMsg(ai_response, who=chat_id)
-                                    log(f"已回复 {chat_id}: {ai_response}，并@了 {sender}")
-                                except Exception as e:
-                                    log(f"发送回复失败给 {chat_id}: {e}")
-                            else:
-                                log(f"大模型未返回有效回复，跳过发送")
+                            # 调用大模型API生成回复并发送
+                            self.dispatch_reply(chat_id, sender, processed_content, switch_chat=True)
                         else:
                             log(f"消息未触发回复条件，跳过处理")
                     else:
@@ -334,11 +379,68 @@ class WeChatBot:
         except Exception as e:
             log(f"处理消息列表时出错: {e}")
     
+    def dispatch_reply(self, chat_id, sender, content, switch_chat=True):
+        """
+        分发一次回复任务（生成回复 + 发送）
+        启用工作线程池时按会话分片并发生成回复；否则直接在当前循环中生成；
+        异步模式下由 AsyncBotRuntime 替换为并发调度。
+        生成的回复统一进入出站调度器，由主循环限流发送
+        """
+        if self.dispatcher:
+            def job():
+                for chunk in self.generate_reply_chunks(content, sender, chat_id):
+                    self.queue_reply(chat_id, chunk, sender, switch_chat)
+            self.dispatcher.submit(chat_id, job)
+            return
+        for chunk in self.generate_reply_chunks(content, sender, chat_id):
+            self.queue_reply(chat_id, chunk, sender, switch_chat)
+            self.flush_outbox()
+    
+    def generate_reply_chunks(self, content, sender, chat_id):
+        """生成回复，按需要发送的顺序逐段产出"""
+        if self.config['stream_reply']:
+            yield from self.iter_ai_reply_chunks(content, sender, chat_id)
+        else:
+            yield self.call_ai_api(content, sender, chat_id)
+    
+    def queue_reply(self, chat_id, reply, sender, switch_chat=True):
+        """将回复加入出站队列（可在工作线程中调用）"""
+        if not reply or not reply.strip():
+            log(f"大模型未返回有效回复，跳过发送")
+            return
+        self.send_scheduler.enqueue(chat_id, reply, sender, switch_chat)
+    
+    def flush_outbox(self):
+        """发送出站队列中当前允许发送的回复（UI 操作只在主循环中执行）"""
+        return self.send_scheduler.drain(self.send_reply)
+    
+    def send_reply(self, chat_id, ai_response, sender, switch_chat=True):
+        """发送回复消息到指定聊天，switch_chat 为 True 时先切换聊天窗口"""
+        if not ai_response or not ai_response.strip():
+            log(f"大模型未返回有效回复，跳过发送")
+            return False
+        try:
+            if switch_chat:
+                # 切换到对应聊天窗口
+                self.wx.ChatWith(chat_id)
+            # 发送消息，@发送消息的人
+            self.wx.SendMsg(ai_response, who=chat_id)
+            log(f"已回复 {chat_id}: {ai_response}，并@了 {sender}")
+            return True
+        except Exception as e:
+            log(f"发送回复失败给 {chat_id}: {e}")
+            return False
+    
     def call_ai_api(self, content, sender, chat_id):
         """
         调用大模型API生成回复
         使用扣子API进行回复
         """
+        cached = self.reply_cache.get(self.config['coze_bot_id'], content)
+        if cached:
+            log(f"命中回复缓存: {content}")
+            return cached
+        
         try:
             # 构建消息内容
             user_question = f"{sender} 向你提问: {content}"
@@ -368,6 +470,7 @@ class WeChatBot:
                     # 删除多余的换行符
                     assistant_reply = re.sub(r"\n{2,}", "\n", assistant_reply)
                     log(f"扣子API回复成功")
+                    self.reply_cache.put(self.config['coze_bot_id'], content, assistant_reply)
                     return assistant_reply
                 else:
                     log("扣子API回复格式异常")
@@ -380,6 +483,59 @@ class WeChatBot:
             log(f"调用扣子API时出错: {e}")
             return "服务器错误，请稍后再试"
     
+    def iter_ai_reply_chunks(self, content, sender, chat_id):
+        """
+        以流式方式调用扣子API，按段产出回复
+        第一句/第一段完整后立即产出，其余内容在回复结束后作为一段产出
+        """
+        cached = self.reply_cache.get(self.config['coze_bot_id'], content)
+        if cached:
+            log(f"命中回复缓存: {content}")
+            yield cached
+            return
+        
+        chunker = ReplyChunker()
+        chunks = []
+        emitted = False
+        completed = False
+        try:
+            user_question = f"{sender} 向你提问: {content}"
+            log(f"流式调用扣子API处理消息: {user_question}")
+            
+            for event in self.coze.chat.stream(
+                bot_id=self.config['coze_bot_id'],
+                user_id=sender,  # 使用发送者名称作为用户ID
+                additional_messages=[
+                    Message.build_user_question_text(user_question),
+                ],
+            ):
+                if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA:
+                    first = chunker.feed(event.message.content)
+                    if first:
+                        emitted = True
+                        chunks.append(first)
+                        log(f"扣子API首段回复已就绪")
+                        yield first
+                elif event.event == ChatEventType.CONVERSATION_CHAT_FAILED:
+                    log(f"扣子API流式回复失败: {event.chat.last_error}")
+                    break
+                elif event.event == ChatEventType.CONVERSATION_CHAT_COMPLETED:
+                    completed = True
+            
+            rest = chunker.finish()
+            if rest:
+                emitted = True
+                chunks.append(rest)
+                yield rest
+            if completed:
+                self.reply_cache.put(self.config['coze_bot_id'], content, "\n".join(chunks))
+            log(f"扣子API流式回复完成")
+        except Exception as e:
+            log(f"流式调用扣子API时出错: {e}")
+        
+        if not emitted:
+            yield "抱歉，未能获取到回复"
+    
     def process_new_messages(self):
         """处理获取到的新消息，对好友消息进行监听及消息处理"""
         try:
@@ -392,7 +548,7 @@ class WeChatBot:
                     continue
                 
                 # 获取过滤后的消息
-                processed_new_msg_list = self.next_message_handle()
+                processed_new_msg_list = self.next_message_handle(chat_id)
                 print("processed_new_msg_list为: ",processed_new_msg_list)
                 # 检查是否在监听列表中
                 if not self.is_chat_listened(chat_id):
@@ -433,15 +589,9 @@ class WeChatBot:
                 for message_obj in message_list:
                     if chat_identifier:
                         # 更新监听列表中的时间戳
-                        updated = False
-                        for listen_chat_entry in self.all_Mode_listen_list:
-                            if listen_chat_entry[0] == chat_identifier:
-                                log(f"{chat_identifier} 对话最新消息时间已更新")
-                                listen_chat_entry[1] = time.time()
-                                updated = True
-                                break
-                        
-                        if not updated:
+                        if self.listen_registry.touch_if_listened(chat_identifier, time.time()):
+                            log(f"{chat_identifier} 对话最新消息时间已更新")
+                        else:
                             log(f"Warning: 监听列表中未找到 '{chat_identifier}'")
                     
                     # 将message_obj转换为message_data格式
@@ -466,32 +616,40 @@ class WeChatBot:
         """删除超时的监听会话"""
         chat_time_out = self.config['chat_timeout']
         
-        # 遍历副本以安全删除
-        for listen_chat_entry in self.all_Mode_listen_list[:]:
-            if time.time() - listen_chat_entry[1] >= chat_time_out:
-                chat_id_to_remove = listen_chat_entry[0]
-                log(f"{chat_id_to_remove} 对话超时，正在删除监听")
-                
-                try:
-                    self.wx.RemoveListenChat(who=chat_id_to_remove)
-                    self.all_Mode_listen_list.remove(listen_chat_entry)
-                    log(f"成功删除超时监听: {chat_id_to_remove}")
-                except Exception as e:
-                    log(f"删除监听失败 {chat_id_to_remove}: {e}")
+        # 只取出已超时的会话，无需遍历全部监听会话
+        for chat_id_to_remove in self.listen_registry.expired(time.time(), chat_time_out):
+            log(f"{chat_id_to_remove} 对话超时，正在删除监听")
+            
+            try:
+                self.wx.RemoveListenChat(who=chat_id_to_remove)
+                self.listen_registry.remove(chat_id_to_remove)
+                log(f"成功删除超时监听: {chat_id_to_remove}")
+            except Exception as e:
+                log(f"删除监听失败 {chat_id_to_remove}: {e}")
     
     def AllListen_mode(self, last_time):
         """全局监听模式"""
         timeout = self.config['main_timeout']
         
+        # 发送上一轮工作线程已生成的回复
+        self.flush_outbox()
+        
         # 处理新消息
         self.process_new_messages()
         
         # 处理监听消息
         self.process_listen_messages()
         
+        # 发送本轮已生成的回复
+        self.flush_outbox()
+        
         # 检查是否需要清理超时会话
         if time.time() - last_time >= timeout:
             self.remove_timeout_listen()
+            log(f"回复缓存统计: {self.reply_cache.stats()}")
+            log(f"出站消息统计: {self.send_scheduler.stats()}")
+            if self.dispatcher:
+                log(f"会话任务统计: {self.dispatcher.stats()}")
             return time.time()
         
         return last_time
@@ -511,13 +669,31 @@ class WeChatBot:
         log(f"  - 主循环超时: {self.config['main_timeout']}秒")
         log(f"  - 循环间隔: {self.config['loop_interval']}秒")
         log(f"  - 扣子机器人ID: {self.config['coze_bot_id']}")
+        log(f"  - 运行模式: {self.config['runtime_mode']}")
+        log(f"  - 回复工作线程: {self.config['reply_workers']}")
+        log(f"  - 每分钟最多回复: {self.config['max_replies_per_minute'] or '不限制'}")
         
         last_time = time.time()
         
         try:
-            while True:
-                last_time = self.AllListen_mode(last_time)
-                time.sleep(self.config['loop_interval'])
+            if self.config['runtime_mode'] == "async":
+                runtime = AsyncBotRuntime(
+                    self,
+                    num_workers=self.config['reply_workers'],
+                    max_queue_per_chat=self.config['max_pending_per_chat'],
+                    log=log,
+                )
+                asyncio.run(runtime.run())
+            else:
+                if self.config['reply_workers'] > 0:
+                    self.dispatcher = ChatDispatcher(
+                        num_workers=self.config['reply_workers'],
+                        max_queue_per_chat=self.config['max_pending_per_chat'],
+                        log=log,
+                    )
+                while True:
+                    last_time = self.AllListen_mode(last_time)
+                    time.sleep(self.config['loop_interval'])
                 
         except KeyboardInterrupt:
             log("收到中断信号，正在停止机器人...")
@@ -529,14 +705,18 @@ class WeChatBot:
     def cleanup(self):
         """清理资源"""
         log("正在清理资源...")
+        if self.dispatcher:
+            # 等待已生成的回复发送完毕
+            self.dispatcher.shutdown(timeout=30)
+            self.flush_outbox()
+            self.dispatcher = None
         try:
             # 移除所有监听
-            for listen_chat_entry in self.all_Mode_listen_list[:]:
-                chat_id = listen_chat_entry[0]
+            for chat_id in self.listen_registry:
                 self.wx.RemoveListenChat(who=chat_id)
                 log(f"已移除监听: {chat_id}")
             
-            self.all_Mode_listen_list.clear()
+            self.listen_registry.clear()
             log("资源清理完成")
         except Exception as e:
             log(f"清理资源时出错: {e}")
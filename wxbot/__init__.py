@@ -0,0 +1,6 @@
+"""
+微信机器人运行时组件
+
+wechat_bot.py 中 WeChatBot 使用的可复用组件（运行时、调度、匹配、缓存等），
+不依赖 wxautox，便于单独测试
+"""
@@ -0,0 +1,98 @@
+"""
+基于 asyncio 的事件驱动运行时
+
+UI 轮询（GetNextNewMessage / GetListenMessage）作为独立任务运行，
+大模型调用交给按会话分片的工作线程池并发执行，生成的回复进入出站队列，
+再由事件循环线程发送。
+
+说明：wxautox 基于 UI 自动化，所有 UI 操作（轮询、切换窗口、发送）必须在
+同一线程中串行执行，因此它们都在事件循环线程中完成；只有耗时的 AI 调用
+被分派到工作线程，从而一个慢回复不会阻塞其他群聊，同一群聊内的回复仍按顺序发送。
+"""
+import asyncio
+import time
+
+from wxbot.chat_dispatcher import ChatDispatcher
+
+
+class AsyncBotRuntime:
+    """WeChatBot 的异步运行时"""
+
+    def __init__(self, bot, num_workers=8, max_queue_per_chat=20, log=print):
+        """
+        Args:
+            bot: WeChatBot 实例（需提供 AllListen_mode / generate_reply_chunks / queue_reply / flush_outbox / config）
+            num_workers: 同时进行的大模型调用上限（工作线程数）
+            max_queue_per_chat: 每个会话最多排队的回复任务数
+            log: 日志函数
+        """
+        self.bot = bot
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue_per_chat = max_queue_per_chat
+        self.log = log
+        self.loop = None
+        self.dispatcher = None
+
+    def start(self):
+        """绑定当前事件循环并启动工作线程池"""
+        self.loop = asyncio.get_running_loop()
+        self.dispatcher = ChatDispatcher(
+            num_workers=self.num_workers,
+            max_queue_per_chat=self.max_queue_per_chat,
+            log=self.log,
+        )
+
+    def submit_reply(self, chat_id, sender, content, switch_chat=True):
+        """
+        替换 WeChatBot.dispatch_reply：不在轮询中等待回复，而是交给工作线程池
+        该方法在事件循环线程中（轮询任务内）被调用
+        """
+        def job():
+            for chunk in self.bot.generate_reply_chunks(content, sender, chat_id):
+                # 发送属于 UI 操作：先进入出站队列，再通知事件循环线程发送；同一会话的各段按顺序入队
+                self.bot.queue_reply(chat_id, chunk, sender, switch_chat)
+                self.loop.call_soon_threadsafe(self._flush)
+
+        return self.dispatcher.submit(chat_id, job)
+
+    def _flush(self):
+        try:
+            self.bot.flush_outbox()
+        except Exception as e:
+            self.log(f"异步回复发送出错: {e}")
+
+    async def poll_loop(self):
+        """UI 轮询任务"""
+        interval = self.bot.config['loop_interval']
+        timeout = self.bot.config.get('main_timeout', 10)
+        last_time = time.time()
+        last_stats = last_time
+        while True:
+            last_time = self.bot.AllListen_mode(last_time)
+            if time.time() - last_stats >= timeout:
+                self.log(f"会话任务统计: {self.dispatcher.stats()}")
+                last_stats = time.time()
+            # 让出事件循环，使已生成的回复可以及时发送
+            await asyncio.sleep(interval)
+
+    async def run(self):
+        """运行异步事件循环，直到被取消"""
+        self.start()
+        original_dispatch = self.bot.dispatch_reply
+        self.bot.dispatch_reply = self.submit_reply
+        try:
+            await self.poll_loop()
+        finally:
+            self.bot.dispatch_reply = original_dispatch
+            await self.drain()
+            self.dispatcher.shutdown(wait=False)
+
+    async def drain(self, timeout=30):
+        """等待尚未完成的回复任务并发送其结果"""
+        pending = self.dispatcher.pending()
+        if pending:
+            self.log(f"等待 {pending} 个回复任务完成...")
+        await asyncio.to_thread(self.dispatcher.join, timeout)
+        # 执行工作线程通过 call_soon_threadsafe 提交的发送回调
+        await asyncio.sleep(0)
+        self._flush()
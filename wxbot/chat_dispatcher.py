@@ -0,0 +1,123 @@
+"""
+按会话分片的有界工作线程池
+
+同一会话的任务总是落在同一个工作线程上，按提交顺序依次执行；
+不同会话分散到不同线程并行执行。每个会话有排队上限，超过上限的任务
+直接丢弃并计入统计，避免刷屏的群聊拖垮整个机器人。
+"""
+import queue
+import threading
+import time
+import zlib
+
+
+def _new_metrics():
+    return {
+        "submitted": 0,
+        "processed": 0,
+        "failed": 0,
+        "dropped": 0,
+        "pending": 0,
+        "max_pending": 0,
+        "wait_seconds": 0.0,
+        "run_seconds": 0.0,
+    }
+
+
+class ChatDispatcher:
+    """会话分片调度器"""
+
+    def __init__(self, num_workers=4, max_queue_per_chat=20, log=print):
+        """
+        Args:
+            num_workers: 工作线程数量
+            max_queue_per_chat: 每个会话允许排队（含执行中）的最大任务数
+            log: 日志函数
+        """
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue_per_chat = max(1, int(max_queue_per_chat))
+        self.log = log
+        self._metrics = {}  # chat_id -> 统计
+        self._pending_total = 0
+        self._cond = threading.Condition()
+        self._queues = [queue.Queue() for _ in range(self.num_workers)]
+        self._threads = []
+        for idx, work_queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._worker, args=(work_queue,), name=f"chat-worker-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def shard(self, chat_id):
+        """会话所属的工作线程编号（稳定哈希）"""
+        return zlib.crc32(str(chat_id).encode("utf-8")) % self.num_workers
+
+    def submit(self, chat_id, job):
+        """
+        提交任务
+
+        Returns:
+            True 表示已入队；会话排队已满时返回 False
+        """
+        with self._cond:
+            metrics = self._metrics.setdefault(chat_id, _new_metrics())
+            if metrics["pending"] >= self.max_queue_per_chat:
+                metrics["dropped"] += 1
+                self.log(f"会话 '{chat_id}' 待处理任务已达上限 {self.max_queue_per_chat}，丢弃该任务")
+                return False
+            metrics["submitted"] += 1
+            metrics["pending"] += 1
+            metrics["max_pending"] = max(metrics["max_pending"], metrics["pending"])
+            self._pending_total += 1
+        self._queues[self.shard(chat_id)].put((chat_id, job, time.monotonic()))
+        return True
+
+    def _worker(self, work_queue):
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            chat_id, job, queued_at = item
+            started = time.monotonic()
+            failed = False
+            try:
+                job()
+            except Exception as e:
+                failed = True
+                self.log(f"会话 '{chat_id}' 任务执行出错: {e}")
+            finished = time.monotonic()
+            with self._cond:
+                metrics = self._metrics[chat_id]
+                metrics["pending"] -= 1
+                metrics["failed" if failed else "processed"] += 1
+                metrics["wait_seconds"] += started - queued_at
+                metrics["run_seconds"] += finished - started
+                self._pending_total -= 1
+                self._cond.notify_all()
+
+    def pending(self, chat_id=None):
+        """待处理任务数（指定会话或全部）"""
+        with self._cond:
+            if chat_id is None:
+                return self._pending_total
+            metrics = self._metrics.get(chat_id)
+            return metrics["pending"] if metrics else 0
+
+    def join(self, timeout=None):
+        """等待所有已提交任务完成，返回是否全部完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending_total == 0, timeout=timeout)
+
+    def stats(self):
+        """每个会话的统计信息"""
+        with self._cond:
+            return {chat_id: dict(metrics) for chat_id, metrics in self._metrics.items()}
+
+    def shutdown(self, wait=True, timeout=None):
+        """停止工作线程；wait 为 True 时先处理完已入队的任务"""
+        for work_queue in self._queues:
+            work_queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout)
@@ -0,0 +1,80 @@
+"""
+监听会话登记表
+
+用字典保存每个监听会话的最近活跃时间，再用最小堆按活跃时间排序，
+使查询/更新为 O(1)/O(log n)，超时检查只需查看堆顶，而不必每轮遍历全部会话。
+堆中的旧条目采用惰性删除：只有与字典中当前时间一致的条目才有效。
+"""
+import heapq
+
+
+class ListenRegistry:
+    """监听会话登记表"""
+
+    def __init__(self):
+        self._last_active = {}  # chat_id -> 最近活跃时间
+        self._heap = []  # [(最近活跃时间, chat_id), ...]
+
+    def __contains__(self, chat_id):
+        return chat_id in self._last_active
+
+    def __len__(self):
+        return len(self._last_active)
+
+    def __iter__(self):
+        return iter(list(self._last_active))
+
+    def add(self, chat_id, timestamp):
+        """登记会话（已存在时等同于 touch）"""
+        self.touch(chat_id, timestamp)
+
+    def touch(self, chat_id, timestamp):
+        """更新会话的最近活跃时间"""
+        if self._last_active.get(chat_id) == timestamp:
+            # 时间未变（同一时刻的多条消息），堆中已有对应条目
+            return
+        self._last_active[chat_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, chat_id))
+        self._compact()
+
+    def touch_if_listened(self, chat_id, timestamp):
+        """仅在会话已登记时更新活跃时间，返回是否已登记"""
+        if chat_id not in self._last_active:
+            return False
+        self.touch(chat_id, timestamp)
+        return True
+
+    def last_active(self, chat_id):
+        return self._last_active.get(chat_id)
+
+    def remove(self, chat_id):
+        """移除会话，堆中的条目在之后被惰性丢弃"""
+        self._last_active.pop(chat_id, None)
+
+    def clear(self):
+        self._last_active.clear()
+        self._heap.clear()
+
+    def expired(self, now, timeout):
+        """
+        返回已超时（now - 最近活跃时间 >= timeout）的会话，按活跃时间从早到晚
+        不会移除这些会话，调用方在真正取消监听成功后再调用 remove
+        """
+        deadline = now - timeout
+        expired = []
+        seen = set()
+        while self._heap and self._heap[0][0] <= deadline:
+            timestamp, chat_id = heapq.heappop(self._heap)
+            # 移除后以相同时间重新登记会留下重复条目，只保留一个
+            if self._last_active.get(chat_id) == timestamp and chat_id not in seen:
+                seen.add(chat_id)
+                expired.append((timestamp, chat_id))
+        for entry in expired:
+            heapq.heappush(self._heap, entry)
+        return [chat_id for _, chat_id in expired]
+
+    def _compact(self):
+        """旧条目过多时重建堆，避免频繁 touch 导致堆无限增长"""
+        if len(self._heap) > 2 * len(self._last_active) + 64:
+            self._heap = [(timestamp, chat_id) for chat_id, timestamp in self._last_active.items()]
+            heapq.heapify(self._heap)
@@ -0,0 +1,78 @@
+"""
+按会话维护的增量消息游标
+
+GetAllMessage 每次返回当前窗口的全部可见记录。游标在内存中记录每个会话
+最后处理到的消息指纹（锚点），下一次只从记录末尾向前扫描到锚点为止，
+因此每次事件的处理成本只与新消息数量有关，而与历史长度无关，也不会
+重复回答旧消息。
+"""
+
+
+def message_fingerprint(msg):
+    """计算消息指纹：优先使用消息ID，否则使用 (类型, 发送者, 内容)"""
+    if isinstance(msg, (list, tuple)):
+        return (msg[0], msg[1]) if len(msg) >= 2 else tuple(msg)
+    msg_id = getattr(msg, 'id', None)
+    if msg_id:
+        return ('id', msg_id)
+    return (getattr(msg, 'type', None), getattr(msg, 'sender', None), getattr(msg, 'content', None))
+
+
+class MessageCursor:
+    """每个会话的高水位游标"""
+
+    def __init__(self, anchor_size=3, max_scan=500):
+        """
+        Args:
+            anchor_size: 锚点包含的末尾消息条数，用于区分内容重复的消息
+            max_scan: 向前查找锚点的最大条数，超过视为游标失效
+        """
+        self.anchor_size = max(1, anchor_size)
+        self.max_scan = max_scan
+        self._anchors = {}  # chat_id -> tuple(指纹)
+
+    def has_cursor(self, chat_id):
+        """会话是否已有游标"""
+        return chat_id in self._anchors
+
+    def reset(self, chat_id=None):
+        """清除指定会话（或全部会话）的游标"""
+        if chat_id is None:
+            self._anchors.clear()
+        else:
+            self._anchors.pop(chat_id, None)
+
+    def mark(self, chat_id, records):
+        """将游标移动到 records 末尾"""
+        if not records:
+            return
+        tail = records[-self.anchor_size:]
+        self._anchors[chat_id] = tuple(message_fingerprint(msg) for msg in tail)
+
+    def advance(self, chat_id, records):
+        """
+        返回锚点之后的新记录并把游标移动到末尾
+
+        Returns:
+            新记录列表；如果会话没有游标或锚点已不在可见范围内，返回 None，
+            调用方应退回到全量过滤逻辑
+        """
+        anchor = self._anchors.get(chat_id)
+        position = self._find_anchor(anchor, records) if anchor else None
+        self.mark(chat_id, records)
+        if position is None:
+            return None
+        return list(records[position + 1:])
+
+    def _find_anchor(self, anchor, records):
+        """从末尾向前查找锚点，返回锚点最后一条所在的下标"""
+        size = len(anchor)
+        last = anchor[-1]
+        lowest = max(size - 1, len(records) - self.max_scan)
+        for idx in range(len(records) - 1, lowest - 1, -1):
+            if message_fingerprint(records[idx]) != last:
+                continue
+            start = idx - size + 1
+            if all(message_fingerprint(records[start + k]) == anchor[k] for k in range(size - 1)):
+                return idx
+        return None
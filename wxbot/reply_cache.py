@@ -0,0 +1,125 @@
+"""
+常见问题回复缓存
+
+以 (bot_id, 归一化问题) 为键缓存大模型回复，带 TTL 过期与 LRU 淘汰。
+每个机器人可以单独开关/设置 TTL；机器人配置（系统提示词、知识库）变化时
+通过 set_config_version 使该机器人的缓存全部失效，版本可用 config_fingerprint 计算。
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# 归一化时去掉的字符：空白与常见中英文标点
+_STRIP_PATTERN = re.compile(r"[\s\.,!?;:'\"`~，。！？；：、“”‘’（）()【】\[\]<>《》…—\-]+")
+
+
+def normalize_question(question):
+    """问题归一化：全角转半角、转小写、去除空白和标点"""
+    if not question:
+        return ""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _STRIP_PATTERN.sub("", text)
+
+
+def config_fingerprint(system_prompt=None, knowledge_base_ids=()):
+    """由系统提示词和知识库ID计算配置版本，知识库顺序不影响结果"""
+    kb_part = ",".join(sorted(str(kb_id) for kb_id in knowledge_base_ids or ()))
+    payload = f"{system_prompt or ''}\0{kb_part}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ReplyCache:
+    """线程安全的 TTL + LRU 回复缓存"""
+
+    def __init__(self, max_entries=1000, ttl=600, clock=time.monotonic):
+        """
+        Args:
+            max_entries: 最大缓存条数，超过后淘汰最久未使用的条目；0 表示关闭缓存
+            ttl: 默认过期时间（秒）
+            clock: 时间函数，便于测试
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # (bot_id, question) -> (expires_at, reply)
+        self._bot_settings = {}  # bot_id -> {"enabled": bool, "ttl": int}
+        self._config_versions = {}  # bot_id -> 配置版本
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, bot_id, enabled=True, ttl=None):
+        """设置单个机器人的缓存开关和 TTL"""
+        with self._lock:
+            self._bot_settings[bot_id] = {"enabled": enabled, "ttl": self.ttl if ttl is None else ttl}
+            if not enabled:
+                self._drop_bot(bot_id)
+
+    def _settings(self, bot_id):
+        return self._bot_settings.get(bot_id) or {"enabled": True, "ttl": self.ttl}
+
+    def get(self, bot_id, question):
+        """查询缓存，命中返回回复，否则返回 None"""
+        settings = self._settings(bot_id)
+        key = (bot_id, normalize_question(question))
+        if not self.max_entries or not settings["enabled"] or not key[1]:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, bot_id, question, reply):
+        """写入缓存"""
+        settings = self._settings(bot_id)
+        key = (bot_id, normalize_question(question))
+        if not self.max_entries or not settings["enabled"] or not key[1] or not reply:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + settings["ttl"], reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_config_version(self, bot_id, version):
+        """记录机器人配置版本，版本变化时清空该机器人的缓存"""
+        with self._lock:
+            previous = self._config_versions.get(bot_id)
+            self._config_versions[bot_id] = version
+            if previous is not None and previous != version:
+                self._drop_bot(bot_id)
+
+    def invalidate(self, bot_id=None):
+        """清空指定机器人（或全部）的缓存"""
+        with self._lock:
+            if bot_id is None:
+                self._entries.clear()
+            else:
+                self._drop_bot(bot_id)
+
+    def _drop_bot(self, bot_id):
+        for key in [key for key in self._entries if key[0] == bot_id]:
+            del self._entries[key]
+
+    def stats(self):
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
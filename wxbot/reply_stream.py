@@ -0,0 +1,69 @@
+"""
+流式回复分段
+
+把大模型流式返回的增量文本拼接起来，一旦第一句/第一段完整就立即交给
+调用方发送，其余内容在回复结束后作为一条消息发送，缩短用户感知的等待时间，
+同时避免把一条回复拆成过多的微信消息。
+"""
+import re
+
+# 句子结束标点（中英文）
+SENTENCE_END = "。！？!?；;…"
+
+
+def clean_reply(text):
+    """删除多余的换行符和首尾空白"""
+    return re.sub(r"\n{2,}", "\n", text).strip()
+
+
+class ReplyChunker:
+    """增量文本分段器：只提前切出第一段，其余内容在结束时一次性返回"""
+
+    def __init__(self, min_length=8):
+        """
+        Args:
+            min_length: 第一段的最小长度，避免只发出“好的。”这样过短的片段
+        """
+        self.min_length = min_length
+        self._buffer = ""
+        self._first_emitted = False
+
+    def feed(self, delta):
+        """追加增量文本，若第一段已完整则返回第一段，否则返回 None"""
+        if not delta:
+            return None
+        self._buffer += delta
+        if self._first_emitted:
+            return None
+        boundary = self._find_boundary()
+        if boundary is None:
+            return None
+        first = clean_reply(self._buffer[:boundary])
+        if not first:
+            return None
+        self._buffer = self._buffer[boundary:]
+        self._first_emitted = True
+        return first
+
+    def finish(self):
+        """回复结束，返回剩余的内容"""
+        rest = clean_reply(self._buffer)
+        self._buffer = ""
+        return rest
+
+    def _find_boundary(self):
+        """查找第一段的结束位置（段落换行或句末标点之后）"""
+        for idx, char in enumerate(self._buffer):
+            if char != "\n" and char not in SENTENCE_END:
+                continue
+            if len(self._buffer[:idx].strip()) < self.min_length:
+                continue
+            end = idx + 1
+            # 连续的标点/换行归入同一段
+            while end < len(self._buffer) and (self._buffer[end] == "\n" or self._buffer[end] in SENTENCE_END):
+                end += 1
+            if end == len(self._buffer):
+                # 后面可能还有连续标点，等待更多内容再切分
+                return None
+            return end
+        return None
@@ -0,0 +1,127 @@
+"""
+出站消息调度
+
+所有待发送的回复先进入调度器，由主循环（UI 线程）统一发送：
+- 按机器人和按会话的令牌桶限流（对应 BotConfig.max_replies_per_minute）
+- 同一会话连续的多条回复合并为一条发送
+- 同一轮发送按会话分组，每个会话只切换一次聊天窗口
+受限流影响暂时无法发送的回复保留在队列中，下一轮继续发送。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """令牌桶，rate_per_minute 为 None 或 0 时不限流"""
+
+    def __init__(self, rate_per_minute=None, clock=time.monotonic):
+        self.rate_per_minute = rate_per_minute
+        self._clock = clock
+        self._tokens = float(rate_per_minute or 0)
+        self._updated = clock()
+
+    @property
+    def unlimited(self):
+        return not self.rate_per_minute
+
+    def _refill(self):
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(float(self.rate_per_minute), self._tokens + elapsed * self.rate_per_minute / 60)
+
+    def available(self):
+        """当前是否有可用令牌"""
+        if self.unlimited:
+            return True
+        self._refill()
+        return self._tokens >= 1
+
+    def take(self):
+        """消耗一个令牌（调用前应先检查 available）"""
+        if not self.unlimited:
+            self._tokens -= 1
+
+
+class SendScheduler:
+    """线程安全的出站消息队列"""
+
+    def __init__(self, max_replies_per_minute=None, max_replies_per_chat_per_minute=None, clock=time.monotonic):
+        """
+        Args:
+            max_replies_per_minute: 整个机器人每分钟最多发送的消息数，None 表示不限
+            max_replies_per_chat_per_minute: 单个会话每分钟最多发送的消息数，None 表示不限
+            clock: 时间函数，便于测试
+        """
+        self.per_chat_rate = max_replies_per_chat_per_minute
+        self._clock = clock
+        self._bot_bucket = TokenBucket(max_replies_per_minute, clock)
+        self._chat_buckets = {}  # chat_id -> TokenBucket
+        self._pending = OrderedDict()  # chat_id -> [(reply, sender, switch_chat), ...]
+        self._lock = threading.Lock()
+        self.metrics = {"enqueued": 0, "sent": 0, "coalesced": 0, "deferred": 0, "failed": 0}
+
+    def enqueue(self, chat_id, reply, sender, switch_chat=True):
+        """加入待发送队列，可在任意线程调用"""
+        if not reply or not reply.strip():
+            return
+        with self._lock:
+            self._pending.setdefault(chat_id, []).append((reply, sender, switch_chat))
+            self.metrics["enqueued"] += 1
+
+    def pending(self):
+        """待发送的回复条数"""
+        with self._lock:
+            return sum(len(items) for items in self._pending.values())
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self._clock)
+        return bucket
+
+    def drain(self, send):
+        """
+        在 UI 线程中发送当前可发送的回复
+
+        Args:
+            send: 发送函数 send(chat_id, reply, sender, switch_chat) -> bool
+
+        Returns:
+            本轮实际发送的消息数
+        """
+        batches = []
+        with self._lock:
+            for chat_id in list(self._pending):
+                if not self._bot_bucket.available():
+                    break
+                chat_bucket = self._chat_bucket(chat_id)
+                if not chat_bucket.available():
+                    continue
+                items = self._pending.pop(chat_id)
+                self._bot_bucket.take()
+                chat_bucket.take()
+                self.metrics["coalesced"] += len(items) - 1
+                batches.append((
+                    chat_id,
+                    "\n".join(reply for reply, _, _ in items),
+                    items[-1][1],
+                    any(switch_chat for _, _, switch_chat in items),
+                ))
+            self.metrics["deferred"] += sum(len(items) for items in self._pending.values())
+
+        sent = 0
+        for chat_id, reply, sender, switch_chat in batches:
+            if send(chat_id, reply, sender, switch_chat) is False:
+                self.metrics["failed"] += 1
+                continue
+            sent += 1
+        with self._lock:
+            self.metrics["sent"] += sent
+        return sent
+
+    def stats(self):
+        """调度统计"""
+        with self._lock:
+            return dict(self.metrics, pending=sum(len(items) for items in self._pending.values()))
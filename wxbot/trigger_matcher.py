@@ -0,0 +1,104 @@
+"""
+唤醒词与@提及的多模式匹配器
+
+基于 Aho-Corasick 自动机，在配置变化时构建一次，之后每条消息只需扫描一遍，
+即可同时得到触发类型、触发词以及去除@提及后的问题内容，
+匹配成本与唤醒词数量无关。
+"""
+from collections import deque, namedtuple
+
+MENTION = "mention"
+WAKE_WORD = "wake_word"
+
+TriggerMatch = namedtuple("TriggerMatch", ["kind", "trigger", "content"])
+
+
+class TriggerMatcher:
+    """编译后的触发词匹配器"""
+
+    def __init__(self, mention_keywords=(), wake_words=()):
+        # 状态机：goto[state] 为字符到下一状态的映射，outputs[state] 为在该状态结束的模式
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self.mention_keywords = [word for word in mention_keywords if word]
+        self.wake_words = [word for word in wake_words if word]
+        for word in self.mention_keywords:
+            self._add(word, MENTION)
+        for word in self.wake_words:
+            self._add(word, WAKE_WORD)
+        self._build()
+
+    def __bool__(self):
+        return bool(self.mention_keywords or self.wake_words)
+
+    def _add(self, word, kind):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(word), kind, word))
+
+    def _build(self):
+        """BFS 计算失败指针，并合并后缀状态的输出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def scan(self, text):
+        """扫描文本，返回 (@提及命中区间列表, 首个唤醒词)"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        mentions = []
+        wake_word = None
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, kind, word in outputs[state]:
+                if kind == MENTION:
+                    mentions.append((end - length, end, word))
+                elif wake_word is None:
+                    wake_word = word
+        return mentions, wake_word
+
+    def match(self, message):
+        """
+        匹配单条消息
+
+        Returns:
+            TriggerMatch(kind, trigger, content)；未命中返回 None。
+            被@时 content 为去除所有@提及后的内容，唤醒词命中时为原消息去除首尾空白
+        """
+        if not message or not self:
+            return None
+        mentions, wake_word = self.scan(message)
+        if mentions:
+            # 按起始位置、长度优先选择不重叠的区间，与逐个 str.replace 的效果一致
+            mentions.sort(key=lambda span: (span[0], span[0] - span[1]))
+            parts = []
+            cursor = 0
+            for start, end, _ in mentions:
+                if start < cursor:
+                    continue
+                parts.append(message[cursor:start])
+                cursor = end
+            parts.append(message[cursor:])
+            return TriggerMatch(MENTION, mentions[0][2], "".join(parts).strip())
+        if wake_word is not None:
+            return TriggerMatch(WAKE_WORD, wake_word, message.strip())
+        return None